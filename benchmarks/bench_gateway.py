@@ -0,0 +1,237 @@
+"""Gateway client benchmark: memory and event throughput of the bot's discord client configuration.
+
+A stand-in gateway feeds synthetic payloads (READY, a GUILD_CREATE per guild, then a stream of messages, typing
+and reactions) straight into the client's event parsers, like the websocket does, and only sends the events the
+client's intents subscribe to, like discord does. The bot's lean configuration (bot.intents and
+bot.CLIENT_OPTIONS) is compared with discord.py's default intents and caches:
+- retained python memory after the guilds are loaded and after the event stream, and the cached members/messages
+- events handled per second, counting all the events the guilds produce, sent or not
+
+Run from the repo root:
+    python3 benchmarks/bench_gateway.py
+    python3 benchmarks/bench_gateway.py --guilds 2000 --members 100 --events 200000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import fixtures
+
+BOT_ID = 1
+FIRST_GUILD_ID = 10_000
+FIRST_USER_ID = 1_000_000
+
+# The events the guilds produce, with the intent needed to receive them and how often they occur
+EVENT_MIX = [
+    ("MESSAGE_CREATE", "guild_messages", 0.5),
+    ("TYPING_START", "guild_typing", 0.3),
+    ("MESSAGE_REACTION_ADD", "guild_reactions", 0.2),
+]
+
+
+class StandInGateway:
+    """Builds the gateway payloads of 'guilds' guilds with 'members' members and 'channels' text channels each."""
+
+    def __init__(self, guilds: int, members: int, channels: int = 3, seed: int = 1):
+        self.guilds = guilds
+        self.members = members
+        self.channels = channels
+        self.random = random.Random(seed)
+        self.timestamp = datetime(2024, 3, 1, tzinfo=timezone.utc).isoformat()
+        self.message_id = 10 ** 15
+
+    def get_user(self, user_id: int) -> dict:
+        return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0001", "avatar": None}
+
+    def get_member(self, user_id: int) -> dict:
+        return {"user": self.get_user(user_id), "roles": [], "joined_at": self.timestamp, "deaf": False, "mute": False}
+
+    def get_channel_id(self, guild: int, channel: int) -> int:
+        return (FIRST_GUILD_ID + guild) * 100 + channel
+
+    def get_ready(self) -> dict:
+        return {
+            "v": 8,
+            "user": {**self.get_user(BOT_ID), "bot": True},
+            "guilds": [{"id": str(FIRST_GUILD_ID + i), "unavailable": True} for i in range(self.guilds)],
+            "session_id": "stand-in",
+        }
+
+    def get_guild_create(self, guild: int) -> dict:
+        guild_id = FIRST_GUILD_ID + guild
+        members = [self.get_member(BOT_ID)] + [
+            self.get_member(FIRST_USER_ID + guild * self.members + i) for i in range(self.members)
+        ]
+        return {
+            "id": str(guild_id),
+            "name": f"guild{guild}",
+            "owner_id": str(FIRST_USER_ID),
+            "member_count": len(members),
+            "large": False,
+            "unavailable": False,
+            "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "104324673", "position": 0}],
+            "emojis": [],
+            "features": [],
+            "channels": [
+                {
+                    "id": str(self.get_channel_id(guild, channel)),
+                    "type": 0,
+                    "name": f"channel{channel}",
+                    "position": channel,
+                    "permission_overwrites": [],
+                }
+                for channel in range(self.channels)
+            ],
+            "members": members,
+            "voice_states": [],
+            "presences": [],
+        }
+
+    def get_event(self, event: str) -> dict:
+        guild = self.random.randrange(self.guilds)
+        user_id = FIRST_USER_ID + guild * self.members + self.random.randrange(self.members)
+        channel_id = str(self.get_channel_id(guild, self.random.randrange(self.channels)))
+        guild_id = str(FIRST_GUILD_ID + guild)
+        if event == "MESSAGE_CREATE":
+            self.message_id += 1
+            member = self.get_member(user_id)
+            return {
+                "id": str(self.message_id),
+                "channel_id": channel_id,
+                "guild_id": guild_id,
+                "author": member.pop("user"),
+                "member": member,
+                "content": "when is the next race?",
+                "timestamp": self.timestamp,
+                "edited_timestamp": None,
+                "tts": False,
+                "mention_everyone": False,
+                "mentions": [],
+                "mention_roles": [],
+                "attachments": [],
+                "embeds": [],
+                "pinned": False,
+                "type": 0,
+            }
+        if event == "TYPING_START":
+            return {
+                "channel_id": channel_id,
+                "guild_id": guild_id,
+                "user_id": str(user_id),
+                "timestamp": 1709251200,
+                "member": self.get_member(user_id),
+            }
+        return {
+            "user_id": str(user_id),
+            "channel_id": channel_id,
+            "guild_id": guild_id,
+            "message_id": str(self.random.randint(10 ** 15, self.message_id)),
+            "emoji": {"id": None, "name": "🏁"},
+            "member": self.get_member(user_id),
+        }
+
+    def get_events(self, count: int) -> list[tuple[str, str, dict]]:
+        """Returns the (event, needed intent, payload) of the next 'count' events the guilds produce."""
+        names = [(event, intent) for event, intent, _ in EVENT_MIX]
+        weights = [weight for _, _, weight in EVENT_MIX]
+        return [
+            (event, intent, self.get_event(event))
+            for event, intent in self.random.choices(names, weights, k=count)
+        ]
+
+
+async def drain() -> None:
+    """Runs the event loop until the tasks dispatched by the client are done."""
+    while len(asyncio.all_tasks()) > 1:
+        await asyncio.sleep(0)
+
+
+async def run_client(intents, options: dict, gateway: StandInGateway, events: list, trace: bool) -> dict:
+    """Connects a bot with the given configuration to the stand-in gateway and sends it the events.
+    With 'trace' the retained memory is measured, which slows the client down, so the throughput is measured
+    in a run without it."""
+    from discord.ext import commands
+
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0] if trace else 0
+
+    client = commands.Bot(command_prefix="&", intents=intents, guild_ready_timeout=0, **options)
+    state = client._connection
+    state.is_bot = True
+    state.parsers["READY"](gateway.get_ready())
+    await state._ready_task
+    for guild in range(gateway.guilds):
+        state.parsers["GUILD_CREATE"](gateway.get_guild_create(guild))
+    await drain()
+    gc.collect()
+    guilds_memory = tracemalloc.get_traced_memory()[0] - baseline if trace else 0
+
+    start = time.perf_counter()
+    for i, (event, intent, payload) in enumerate(events):
+        if getattr(intents, intent):
+            state.parsers[event](payload)
+        if i % 100 == 0:
+            await drain()
+    await drain()
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    result = {
+        "guilds": len(client.guilds),
+        "members": sum(len(guild.members) for guild in client.guilds),
+        "messages": len(state._messages or ()),
+        "guilds_memory": guilds_memory,
+        "memory": tracemalloc.get_traced_memory()[0] - baseline if trace else 0,
+        "events_per_second": len(events) / seconds,
+    }
+    if trace:
+        tracemalloc.stop()
+    del client, state
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=500, help="number of guilds")
+    parser.add_argument("--members", type=int, default=100, help="members in each guild's GUILD_CREATE")
+    parser.add_argument("--events", type=int, default=50_000, help="number of events the guilds produce")
+    args = parser.parse_args()
+
+    import discord
+
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)  # so the log file of the imported bot is in the temporary folder
+        try:
+            import bot
+        finally:
+            os.chdir(fixtures.REPO_ROOT)
+
+    configurations = {
+        "default": (discord.Intents.default(), {}),
+        "lean": (bot.intents, bot.CLIENT_OPTIONS),
+    }
+    gateway = StandInGateway(args.guilds, args.members)
+    events = gateway.get_events(args.events)
+
+    mb = 1024 * 1024
+    print(f"{args.guilds} guilds, {args.members} members each, {args.events} events\n")
+    print(f"{'':<10}{'guilds MB':>10}{'total MB':>10}{'members':>10}{'messages':>10}{'events/s':>12}")
+    for name, (intents, options) in configurations.items():
+        memory = asyncio.run(run_client(intents, options, gateway, events, trace=True))
+        speed = asyncio.run(run_client(intents, options, gateway, events, trace=False))
+        print(
+            f"{name:<10}{memory['guilds_memory'] / mb:>10.1f}{memory['memory'] / mb:>10.1f}"
+            f"{memory['members']:>10}{memory['messages']:>10}{speed['events_per_second']:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Image benchmark: render time and output size of the generated week images.
+
+Renders the countdown image for every week count up to --weeks and the schedule image of every race week of the
+fixture season (from its schedule index), first into an empty cache and then again from the cache, with the
+repo's default race week and no race week images. Reports the render time and file size of each kind.
+
+Run from the repo root:
+    python3 benchmarks/bench_images.py
+    python3 benchmarks/bench_images.py --weeks 20 --fail-on-limit
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import fixtures
+
+# A generated image taking longer than this to render, or larger than this, is reported
+MAX_RENDER_SECONDS = 0.5
+MAX_IMAGE_BYTES = 256 * 1024
+
+RACE_WEEK_IMAGE = os.path.join(fixtures.REPO_ROOT, "data", "race_week_image.png")
+NO_RACE_WEEK_IMAGE = os.path.join(fixtures.REPO_ROOT, "data", "no_race_week_image.png")
+
+
+def get_schedule_days() -> list:
+    """Returns the day rows of the schedule image of every race week of the fixture season, like bot.get_week_image()."""
+    import schedule_index
+    import util
+
+    with fixtures.use_fixtures():
+        schedule_index.rebuild(fixtures.SEASON_YEAR)
+    return [
+        [
+            (util.day_to_norwegian(day), [(time, f"{session.series} {session.name}") for time, session in sessions])
+            for day, sessions in schedule_index.get_event_days(event)
+        ]
+        for event in schedule_index.get_events()
+    ]
+
+
+def measure(render: Callable[[], str]) -> tuple[float, float, int]:
+    """Returns the seconds to render an image into the empty cache, the seconds to get it from the cache and its size."""
+    start = time.perf_counter()
+    filename = render()
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    render()
+    warm = time.perf_counter() - start
+    return cold, warm, os.path.getsize(filename)
+
+
+def report(kind: str, samples: list[tuple[float, float, int]]) -> list[str]:
+    """Prints the results of one kind of image, returns the limits it went over."""
+    cold = [sample[0] for sample in samples]
+    warm = [sample[1] for sample in samples]
+    sizes = [sample[2] for sample in samples]
+    print(
+        f"{kind:<10}{len(samples):>7}{statistics.median(cold) * 1000:>11.1f}{max(cold) * 1000:>11.1f}"
+        f"{statistics.median(warm) * 1000:>11.2f}{statistics.median(sizes) / 1024:>11.1f}{max(sizes) / 1024:>11.1f}"
+    )
+    over = []
+    if max(cold) > MAX_RENDER_SECONDS:
+        over.append(f"{kind} render time {max(cold) * 1000:.0f} ms (limit {MAX_RENDER_SECONDS * 1000:.0f} ms)")
+    if max(sizes) > MAX_IMAGE_BYTES:
+        over.append(f"{kind} size {max(sizes) / 1024:.0f} KB (limit {MAX_IMAGE_BYTES / 1024:.0f} KB)")
+    return over
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=10, help="render the countdown for 1 to this many weeks")
+    parser.add_argument(
+        "--fail-on-limit", action="store_true", help="exit with code 1 if an image is too slow to render or too large"
+    )
+    args = parser.parse_args()
+
+    import images
+
+    try:
+        import PIL  # noqa
+    except ImportError:
+        sys.exit("Pillow is not installed, the images are not generated")
+
+    schedule_days = get_schedule_days()
+    with tempfile.TemporaryDirectory() as folder:
+        images.IMAGE_CACHE_FOLDER = folder
+        countdown = [
+            measure(lambda: images.render_countdown_image(NO_RACE_WEEK_IMAGE, weeks))
+            for weeks in range(1, args.weeks + 1)
+        ]
+        schedule = [
+            measure(lambda: images.render_schedule_image(RACE_WEEK_IMAGE, days)) for days in schedule_days if days
+        ]
+
+    print(f"{'':<10}{'images':>7}{'median ms':>11}{'max ms':>11}{'cached ms':>11}{'median KB':>11}{'max KB':>11}")
+    over = report("countdown", countdown) + report("schedule", schedule)
+    for line in over:
+        print(f"\nOVER LIMIT: {line}")
+    if over and args.fail_on_limit:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Memory benchmark: RSS and allocations per refresh over a simulated season.
+
+Runs the season simulator (benchmarks/simulate_season.py) with tracemalloc enabled and measures around every
+refresh: the memory still allocated by python after it (retained), the peak while it ran above what was
+allocated before (transient), and the process RSS. Memory that keeps growing over the season is reported
+as a leak, it should stay flat once the first refreshes have loaded everything.
+
+Run from the repo root:
+    python3 benchmarks/bench_memory.py
+    python3 benchmarks/bench_memory.py --start 2024-05-01 --end 2024-06-30 --top 15
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator
+
+import fixtures
+import simulate_season
+
+# Retained memory growing more than this per week of the season, after warm-up, is reported as a leak
+MAX_GROWTH_PER_WEEK = 64 * 1024
+
+# Refreshes at the start of the season not counted in the steady state (imports, loading the schedule...)
+WARM_UP_REFRESHES = 5
+
+
+def get_rss_bytes() -> int:
+    """Returns the resident set size of this process, or the max rss if the current isnt available."""
+    try:
+        with open("/proc/self/statm") as infile:
+            return int(infile.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class MemoryRecorder:
+    """Measures the memory around each refresh, used as the simulator's 'measure'."""
+
+    def __init__(self):
+        # (refresh time, retained bytes, transient peak bytes, rss bytes)
+        self.samples: list[tuple[datetime, int, int, int]] = []
+
+    @contextmanager
+    def measure(self, now: datetime) -> Iterator[None]:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        yield
+        current, peak = tracemalloc.get_traced_memory()
+        self.samples.append((now, current, peak - before, get_rss_bytes()))
+
+
+def get_growth_per_week(samples: list[tuple[datetime, int, int, int]]) -> float:
+    """Returns the least squares slope of the retained memory over the season, in bytes per week."""
+    weeks = [(sample[0] - samples[0][0]).total_seconds() / (7 * 24 * 3600) for sample in samples]
+    retained = [sample[1] for sample in samples]
+    mean_weeks, mean_retained = statistics.mean(weeks), statistics.mean(retained)
+    variance = sum((w - mean_weeks) ** 2 for w in weeks)
+    if not variance:
+        return 0.0
+    return sum((w - mean_weeks) * (r - mean_retained) for w, r in zip(weeks, retained)) / variance
+
+
+def report(recorder: MemoryRecorder, snapshot: tracemalloc.Snapshot, top: int) -> float:
+    """Prints the memory report, returns the retained memory growth per week."""
+    mb = 1024 * 1024
+    first = recorder.samples[0]
+    steady = recorder.samples[WARM_UP_REFRESHES:] or recorder.samples
+    growth = get_growth_per_week(steady)
+
+    print(f"refreshes             {len(recorder.samples)}")
+    print(f"first refresh         retained {first[1] / mb:.2f} MB, transient {first[2] / mb:.2f} MB")
+    print(
+        f"steady state          retained median {statistics.median(s[1] for s in steady) / mb:.2f} MB, "
+        f"max {max(s[1] for s in steady) / mb:.2f} MB"
+    )
+    print(
+        f"per refresh           transient median {statistics.median(s[2] for s in steady) / mb:.2f} MB, "
+        f"max {max(s[2] for s in steady) / mb:.2f} MB"
+    )
+    print(
+        f"rss                   first {first[3] / mb:.1f} MB, last {recorder.samples[-1][3] / mb:.1f} MB, "
+        f"max {max(s[3] for s in recorder.samples) / mb:.1f} MB"
+    )
+    print(f"retained growth       {growth / 1024:+.1f} KB per week")
+
+    print(f"\nTop {top} retained allocations at the end of the season:")
+    for statistic in snapshot.statistics("lineno")[:top]:
+        print(f"  {statistic.size / 1024:>9.1f} KB {statistic.count:>7} blocks  {statistic.traceback[0]}")
+    return growth
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", type=date.fromisoformat, help="first day, defaults to 2 weeks before the first race")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day, defaults to the last race (the bot has no week to show after it)")
+    parser.add_argument("--top", type=int, default=10, help="number of top allocation sites to list")
+    parser.add_argument(
+        "--fail-on-growth", action="store_true", help="exit with code 1 if the retained memory keeps growing"
+    )
+    args = parser.parse_args()
+
+    race_dates = fixtures.get_race_dates()
+    start = args.start or race_dates[0] - timedelta(weeks=2)
+    end = args.end or race_dates[-1]
+
+    recorder = simulate_season.Recorder()
+    memory = MemoryRecorder()
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as folder, fixtures.use_fixtures():
+        import fastf1
+        import requests
+
+        simulate_season.setup_data_folder(folder, 1)
+        os.chdir(folder)
+        try:
+            simulate_season.run(recorder, start, end, fastf1, requests, memory.measure)
+        finally:
+            os.chdir(fixtures.REPO_ROOT)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    print(f"Simulated {start} to {end}\n")
+    growth = report(memory, snapshot, args.top)
+    if growth > MAX_GROWTH_PER_WEEK:
+        print(f"\nRETAINED MEMORY GROWS {growth / 1024:.1f} KB per week (limit {MAX_GROWTH_PER_WEEK / 1024:.0f} KB)")
+        if args.fail_on_growth:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Startup time benchmark for the bot.
+
+Measures, each in a fresh python process:
+- import: time to import bot.py (what is on the critical path before connecting to discord)
+- warm-up: time for bot.warm_up(), the heavy imports and schedule loading done in the background
+- ready (only with --connect): time from process start until the bot is ready on the discord gateway,
+  using the token in data/discord_data.json
+
+Run from the repo root:
+    python3 benchmarks/bench_startup.py [--runs 5] [--connect]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import bot
+print(time.perf_counter() - start)
+"""
+
+WARM_UP_SCRIPT = """
+import time
+import bot
+start = time.perf_counter()
+bot.warm_up()
+print(time.perf_counter() - start)
+"""
+
+READY_SCRIPT = """
+import time
+start = time.perf_counter()
+import bot
+import util
+
+@bot.bot.listen("on_ready")
+async def measure_ready():
+    print(time.perf_counter() - start)
+    await bot.bot.close()
+
+async def skip_on_ready():
+    pass
+
+bot.bot.on_ready = skip_on_ready  # dont start the status task
+bot.bot.run(util.get_json_data("bot_token"))
+"""
+
+
+def run_script(script: str) -> float:
+    """Runs the script in a new python process from the repo root, returns the seconds it printed."""
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def report(name: str, times: list[float]) -> None:
+    print(
+        f"{name:<10} median {statistics.median(times) * 1000:8.1f} ms"
+        f"   min {min(times) * 1000:8.1f} ms   max {max(times) * 1000:8.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="number of runs per measurement")
+    parser.add_argument(
+        "--connect", action="store_true", help="also measure time until ready on the discord gateway"
+    )
+    args = parser.parse_args()
+
+    report("import", [run_script(IMPORT_SCRIPT) for _ in range(args.runs)])
+    report("warm-up", [run_script(WARM_UP_SCRIPT) for _ in range(args.runs)])
+    if args.connect:
+        report("ready", [run_script(READY_SCRIPT) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""Stand-in Discord API for load testing: a local gateway and the subset of the REST api the bot uses.
+
+The REST api covers logging in, fetching channels, sending (also with an image upload), fetching, editing and
+deleting messages, the channel history and reactions. The gateway sends HELLO, READY and a GUILD_CREATE per guild,
+answers heartbeats, records presence updates and can dispatch events like MESSAGE_CREATE to the bot.
+
+Every REST request is delayed by a scripted latency and counted against a per route and channel rate limit bucket
+like discord's, answered with a 429 when it is empty. A fraction of requests can also be answered with a 429 at
+random. discord.py is pointed at the server with use_fake_discord().
+"""
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import NamedTuple, Union
+
+from aiohttp import WSMsgType, web
+
+DISCORD_EPOCH = 1420070400000
+
+# Seconds a randomly rate limited request is told to wait
+RANDOM_RETRY_AFTER = 0.5
+
+
+def json_response(data, status: int = 200, headers: Union[dict, None] = None) -> web.Response:
+    """Returns a json response with the content type discord.py expects, without a charset."""
+    return web.Response(
+        body=json.dumps(data).encode("utf-8"), status=status, headers=headers, content_type="application/json"
+    )
+
+
+class RequestRecord(NamedTuple):
+    """A handled REST request: when it arrived (loop time), its route, channel, status and the seconds it took."""
+
+    time: float
+    method: str
+    route: str
+    channel_id: Union[int, None]
+    status: int
+    duration: float
+
+
+class Bucket:
+    """A rate limit bucket, 'limit' requests per 'period' seconds from the first request of the period."""
+
+    def __init__(self, limit: int, period: float):
+        self.limit = limit
+        self.period = period
+        self.remaining = limit
+        self.reset = 0.0
+
+    def take(self, now: float) -> float:
+        """Takes a request from the bucket, returns 0 or the seconds until the bucket resets if it is empty."""
+        if now >= self.reset:
+            self.remaining, self.reset = self.limit, now + self.period
+        if self.remaining == 0:
+            return self.reset - now
+        self.remaining -= 1
+        return 0.0
+
+
+class FakeDiscord:
+    """The stand-in server. 'guilds' maps guild ids to their text channel ids, the bot user has id 'bot_id'.
+    Each REST request takes 'latency' plus up to 'jitter' seconds, routes allow 'rate_limit' (requests, seconds)
+    per channel, and 'random_429' of the requests are rate limited at random."""
+
+    def __init__(
+        self,
+        guilds: dict[int, list[int]],
+        bot_id: int,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit: tuple[int, float] = (5, 5.0),
+        random_429: float = 0.0,
+        seed: int = 1,
+    ):
+        self.guilds = guilds
+        self.channels = {channel_id: guild_id for guild_id, channels in guilds.items() for channel_id in channels}
+        self.bot_user = self.get_user(bot_id, bot=True)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.random_429 = random_429
+        self.random = random.Random(seed)
+
+        self.messages: dict[int, dict[int, dict]] = defaultdict(dict)  # channel id -> message id -> message
+        self.requests: list[RequestRecord] = []
+        self.created: list[tuple[float, dict]] = []  # (loop time, message) of every message the bot sent
+        self.presences: list[dict] = []
+        self.buckets: dict[tuple, Bucket] = {}
+        self.sockets: list[web.WebSocketResponse] = []
+        self.sequence = 0
+        self.last_id = 0
+        self.url = ""
+        self._runner = None
+
+    # Payloads
+
+    def get_user(self, user_id: int, bot: bool = False) -> dict:
+        return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0001", "avatar": None, "bot": bot}
+
+    def get_channel(self, channel_id: int) -> dict:
+        return {
+            "id": str(channel_id),
+            "type": 0,
+            "guild_id": str(self.channels[channel_id]),
+            "name": f"channel{channel_id}",
+            "position": 0,
+            "permission_overwrites": [],
+        }
+
+    def get_guild(self, guild_id: int) -> dict:
+        member = {"user": self.bot_user, "roles": [], "joined_at": self.get_timestamp(), "deaf": False, "mute": False}
+        return {
+            "id": str(guild_id),
+            "name": f"guild{guild_id}",
+            "owner_id": "0",
+            "member_count": 1,
+            "unavailable": False,
+            "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "104324673", "position": 0}],
+            "emojis": [],
+            "features": [],
+            "channels": [self.get_channel(channel_id) for channel_id in self.guilds[guild_id]],
+            "members": [member],
+            "voice_states": [],
+            "presences": [],
+        }
+
+    def get_timestamp(self) -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def new_id(self) -> int:
+        """Returns a new snowflake with the current time, so discord.py gets the right creation time."""
+        self.last_id = max(self.last_id + 1, (int(time.time() * 1000) - DISCORD_EPOCH) << 22)
+        return self.last_id
+
+    def new_message(self, channel_id: int, author: dict, content: str = "", embeds: Union[list, None] = None) -> dict:
+        return {
+            "id": str(self.new_id()),
+            "channel_id": str(channel_id),
+            "guild_id": str(self.channels[channel_id]),
+            "author": author,
+            "content": content or "",
+            "timestamp": self.get_timestamp(),
+            "edited_timestamp": None,
+            "tts": False,
+            "mention_everyone": False,
+            "mentions": [],
+            "mention_roles": [],
+            "attachments": [],
+            "embeds": embeds or [],
+            "pinned": False,
+            "type": 0,
+        }
+
+    # Gateway
+
+    async def send(self, socket: web.WebSocketResponse, op: int, data, event: Union[str, None] = None) -> None:
+        payload = {"op": op, "d": data, "s": None, "t": event}
+        if op == 0:
+            self.sequence += 1
+            payload["s"] = self.sequence
+        await socket.send_str(json.dumps(payload))
+
+    async def dispatch(self, event: str, data: dict) -> None:
+        """Sends a gateway event to all the connected clients."""
+        for socket in list(self.sockets):
+            await self.send(socket, 0, data, event)
+
+    async def send_user_message(self, channel_id: int, user_id: int, content: str) -> dict:
+        """Sends a message from a user in the channel to the bot over the gateway, returns the message."""
+        message = self.new_message(channel_id, self.get_user(user_id), content)
+        self.messages[channel_id][int(message["id"])] = message
+        member = {"roles": [], "joined_at": message["timestamp"], "deaf": False, "mute": False}
+        await self.dispatch("MESSAGE_CREATE", {**message, "member": member})
+        return message
+
+    async def gateway(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        await self.send(socket, 10, {"heartbeat_interval": 41250})
+        async for message in socket:
+            if message.type != WSMsgType.TEXT:
+                break
+            payload = json.loads(message.data)
+            if payload["op"] == 1:  # heartbeat
+                await self.send(socket, 11, None)
+            elif payload["op"] == 2:  # identify
+                self.sockets.append(socket)
+                guilds = [{"id": str(guild_id), "unavailable": True} for guild_id in self.guilds]
+                await self.send(
+                    socket, 0, {"v": 6, "user": self.bot_user, "guilds": guilds, "session_id": "fake"}, "READY"
+                )
+                for guild_id in self.guilds:
+                    await self.send(socket, 0, self.get_guild(guild_id), "GUILD_CREATE")
+            elif payload["op"] == 3:  # presence update
+                self.presences.append(payload["d"])
+        if socket in self.sockets:
+            self.sockets.remove(socket)
+        return socket
+
+    # REST
+
+    @web.middleware
+    async def scripted(self, request: web.Request, handler) -> web.StreamResponse:
+        """Delays and rate limits the REST requests and records them."""
+        if not request.path.startswith("/api/"):  # the gateway
+            return await handler(request)
+        loop = asyncio.get_event_loop()
+        began = loop.time()
+        channel_id = request.match_info.get("channel_id")
+        channel_id = int(channel_id) if channel_id else None
+        route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+        await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        key = (request.method, route, channel_id)
+        bucket = self.buckets.setdefault(key, Bucket(*self.rate_limit))
+        retry_after = bucket.take(loop.time())
+        if not retry_after and self.random.random() < self.random_429:
+            retry_after = RANDOM_RETRY_AFTER
+        if retry_after:
+            response = json_response(
+                {"message": "You are being rate limited.", "retry_after": retry_after * 1000, "global": False},
+                status=429,
+                headers={"Via": "1.1 fake", "Retry-After": str(retry_after)},
+            )
+        else:
+            response = await handler(request)
+            response.headers.update(
+                {
+                    "X-RateLimit-Limit": str(bucket.limit),
+                    "X-RateLimit-Remaining": str(bucket.remaining),
+                    "X-RateLimit-Reset": str(time.time() + bucket.reset - loop.time()),
+                    "X-RateLimit-Reset-After": f"{bucket.reset - loop.time():.3f}",
+                    "X-RateLimit-Bucket": f"{request.method}:{route}",
+                }
+            )
+        self.requests.append(
+            RequestRecord(began, request.method, route, channel_id, response.status, loop.time() - began)
+        )
+        return response
+
+    def find_message(self, request: web.Request) -> Union[dict, None]:
+        channel_id = int(request.match_info["channel_id"])
+        return self.messages[channel_id].get(int(request.match_info["message_id"]))
+
+    def not_found(self, message: str, code: int) -> web.Response:
+        return json_response({"message": message, "code": code}, status=404)
+
+    async def get_gateway(self, request: web.Request) -> web.Response:
+        gateway_url = self.url.replace("http://", "ws://") + "/gateway"
+        return json_response({"url": gateway_url, "shards": 1})
+
+    async def get_me(self, request: web.Request) -> web.Response:
+        return json_response(self.bot_user)
+
+    async def get_application(self, request: web.Request) -> web.Response:
+        return json_response(
+            {"id": self.bot_user["id"], "name": "bot", "icon": None, "description": "", "bot_public": True,
+             "bot_require_code_grant": False, "owner": self.get_user(0), "summary": "", "verify_key": ""}
+        )
+
+    async def get_channel_route(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel_id"])
+        if channel_id not in self.channels:
+            return self.not_found("Unknown Channel", 10003)
+        return json_response(self.get_channel(channel_id))
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel_id"])
+        attachments = []
+        if request.content_type.startswith("multipart/"):
+            form = await request.post()
+            payload = json.loads(form["payload_json"])
+            for field in form.values():
+                if hasattr(field, "filename"):
+                    size = len(field.file.read())
+                    attachments.append((field.filename, size))
+        else:
+            payload = await request.json()
+
+        embeds = [payload["embed"]] if payload.get("embed") else []
+        message = self.new_message(channel_id, self.bot_user, payload.get("content"), embeds)
+        for filename, size in attachments:
+            expiry = int(time.time()) + 24 * 3600
+            url = f"{self.url}/attachments/{channel_id}/{message['id']}/{filename}?ex={expiry:x}"
+            message["attachments"].append(
+                {"id": str(self.new_id()), "filename": filename, "size": size, "url": url, "proxy_url": url}
+            )
+            # Like discord, the embed shows the uploaded attachment by its cdn url
+            for embed in embeds:
+                if embed.get("image", {}).get("url") == f"attachment://{filename}":
+                    embed["image"] = {"url": url, "proxy_url": url}
+        self.messages[channel_id][int(message["id"])] = message
+        self.created.append((asyncio.get_event_loop().time(), message))
+        return json_response(message)
+
+    async def get_message(self, request: web.Request) -> web.Response:
+        message = self.find_message(request)
+        if message is None:
+            return self.not_found("Unknown Message", 10008)
+        return json_response(message)
+
+    async def edit_message(self, request: web.Request) -> web.Response:
+        message = self.find_message(request)
+        if message is None:
+            return self.not_found("Unknown Message", 10008)
+        payload = await request.json()
+        if "content" in payload:
+            message["content"] = payload["content"] or ""
+        if "embed" in payload:
+            message["embeds"] = [payload["embed"]] if payload["embed"] else []
+        message["edited_timestamp"] = self.get_timestamp()
+        return json_response(message)
+
+    async def delete_message(self, request: web.Request) -> web.Response:
+        message = self.find_message(request)
+        if message is None:
+            return self.not_found("Unknown Message", 10008)
+        del self.messages[int(message["channel_id"])][int(message["id"])]
+        return web.Response(status=204)
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info["channel_id"])
+        limit = int(request.query.get("limit", 50))
+        before = int(request.query.get("before", 0)) or None
+        messages = sorted(self.messages[channel_id].values(), key=lambda m: int(m["id"]), reverse=True)
+        if before:
+            messages = [message for message in messages if int(message["id"]) < before]
+        return json_response(messages[:limit])
+
+    async def add_reaction(self, request: web.Request) -> web.Response:
+        if self.find_message(request) is None:
+            return self.not_found("Unknown Message", 10008)
+        return web.Response(status=204)
+
+    def get_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.scripted])
+        api = "/api/v7"
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_get(f"{api}/gateway", self.get_gateway)
+        app.router.add_get(f"{api}/gateway/bot", self.get_gateway)
+        app.router.add_get(f"{api}/users/@me", self.get_me)
+        app.router.add_get(f"{api}/oauth2/applications/@me", self.get_application)
+        app.router.add_get(f"{api}/channels/{{channel_id}}", self.get_channel_route)
+        app.router.add_post(f"{api}/channels/{{channel_id}}/messages", self.create_message)
+        app.router.add_get(f"{api}/channels/{{channel_id}}/messages", self.get_history)
+        app.router.add_get(f"{api}/channels/{{channel_id}}/messages/{{message_id}}", self.get_message)
+        app.router.add_patch(f"{api}/channels/{{channel_id}}/messages/{{message_id}}", self.edit_message)
+        app.router.add_delete(f"{api}/channels/{{channel_id}}/messages/{{message_id}}", self.delete_message)
+        app.router.add_put(
+            f"{api}/channels/{{channel_id}}/messages/{{message_id}}/reactions/{{emoji}}/@me", self.add_reaction
+        )
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        """Starts the server, on a free port by default."""
+        self._runner = web.AppRunner(self.get_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        for socket in list(self.sockets):
+            await socket.close()
+        await self._runner.cleanup()
+
+
+def use_fake_discord(server: FakeDiscord) -> None:
+    """Points discord.py's REST client (and so the gateway lookup) at the stand-in server."""
+    from discord.http import Route
+
+    Route.BASE = f"{server.url}/api/v7"
@@ -0,0 +1,183 @@
+"""Offline fixtures for the benchmarks: a fixture F1 season schedule standing in for fastf1, and saved-style
+F2 results pages standing in for fiaformula2.com.
+
+use_fixtures() patches fastf1 and requests so formula1/formula2/util run against these fixtures without
+any network access, from the repo root like the bot itself.
+"""
+import os
+import sys
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Iterator
+from unittest import mock
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_FOLDER = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+
+# The benchmarks import the bot modules from the repo root
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# Fixture season: (event name, country, location, race date, format). The race date is the last day
+# of the weekend, the sessions are placed on the days before it.
+SEASON_YEAR = 2024
+SEASON = [
+    ("Bahrain Grand Prix", "Bahrain", "Sakhir", "2024-03-02", "conventional"),
+    ("Saudi Arabian Grand Prix", "Saudi Arabia", "Jeddah", "2024-03-09", "conventional"),
+    ("Australian Grand Prix", "Australia", "Melbourne", "2024-03-24", "conventional"),
+    ("Japanese Grand Prix", "Japan", "Suzuka", "2024-04-07", "conventional"),
+    ("Chinese Grand Prix", "China", "Shanghai", "2024-04-21", "sprint_qualifying"),
+    ("Miami Grand Prix", "United States", "Miami", "2024-05-05", "sprint_qualifying"),
+    ("Emilia Romagna Grand Prix", "Italy", "Imola", "2024-05-19", "conventional"),
+    ("Monaco Grand Prix", "Monaco", "Monaco", "2024-05-26", "conventional"),
+    ("Canadian Grand Prix", "Canada", "Montréal", "2024-06-09", "conventional"),
+    ("Spanish Grand Prix", "Spain", "Barcelona", "2024-06-23", "conventional"),
+    ("Austrian Grand Prix", "Austria", "Spielberg", "2024-06-30", "sprint_qualifying"),
+    ("British Grand Prix", "Great Britain", "Silverstone", "2024-07-07", "conventional"),
+    ("Hungarian Grand Prix", "Hungary", "Budapest", "2024-07-21", "conventional"),
+    ("Belgian Grand Prix", "Belgium", "Spa-Francorchamps", "2024-07-28", "conventional"),
+    ("Dutch Grand Prix", "Netherlands", "Zandvoort", "2024-08-25", "conventional"),
+    ("Italian Grand Prix", "Italy", "Monza", "2024-09-01", "conventional"),
+    ("Azerbaijan Grand Prix", "Azerbaijan", "Baku", "2024-09-15", "conventional"),
+    ("Singapore Grand Prix", "Singapore", "Marina Bay", "2024-09-22", "conventional"),
+    ("United States Grand Prix", "United States", "Austin", "2024-10-20", "sprint_qualifying"),
+    ("Mexico City Grand Prix", "Mexico", "Mexico City", "2024-10-27", "conventional"),
+    ("São Paulo Grand Prix", "Brazil", "São Paulo", "2024-11-03", "sprint_qualifying"),
+    ("Las Vegas Grand Prix", "United States", "Las Vegas", "2024-11-23", "conventional"),
+    ("Qatar Grand Prix", "Qatar", "Lusail", "2024-12-01", "sprint_qualifying"),
+    ("Abu Dhabi Grand Prix", "United Arab Emirates", "Yas Island", "2024-12-08", "conventional"),
+]
+
+# Sessions per format: (name, days before race day, UTC hour)
+SESSIONS = {
+    "conventional": [
+        ("Practice 1", 2, 11),
+        ("Practice 2", 2, 15),
+        ("Practice 3", 1, 11),
+        ("Qualifying", 1, 15),
+        ("Race", 0, 13),
+    ],
+    "sprint_qualifying": [
+        ("Practice 1", 2, 11),
+        ("Sprint Qualifying", 2, 15),
+        ("Sprint", 1, 11),
+        ("Qualifying", 1, 15),
+        ("Race", 0, 13),
+    ],
+}
+
+
+def get_season_dates() -> list[date]:
+    """Returns every date of the fixture season, from the first of january to the last race."""
+    first = date(SEASON_YEAR, 1, 1)
+    last = date.fromisoformat(SEASON[-1][3])
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def get_race_dates() -> list[date]:
+    """Returns the race dates of the fixture season."""
+    return [date.fromisoformat(event[3]) for event in SEASON]
+
+
+def build_event_schedule() -> "fastf1.events.EventSchedule":
+    """Builds a fastf1 EventSchedule of the fixture season."""
+    import pandas as pd
+    from fastf1.events import EventSchedule
+
+    rows = []
+    for round_number, (name, country, location, race_date, event_format) in enumerate(SEASON, 1):
+        race_day = datetime.fromisoformat(race_date)
+        row = {
+            "RoundNumber": round_number,
+            "Country": country,
+            "Location": location,
+            "OfficialEventName": name.upper(),
+            "EventDate": pd.Timestamp(race_day),
+            "EventName": name,
+            "EventFormat": event_format,
+            "F1ApiSupport": True,
+        }
+        for i, (session, days_before, hour) in enumerate(SESSIONS[event_format], 1):
+            start = race_day - timedelta(days=days_before) + timedelta(hours=hour)
+            row[f"Session{i}"] = session
+            row[f"Session{i}Date"] = pd.Timestamp(start, tz="UTC")
+            row[f"Session{i}DateUtc"] = pd.Timestamp(start)
+        rows.append(row)
+    return EventSchedule(pd.DataFrame(rows), year=SEASON_YEAR, force_default_cols=True)
+
+
+def get_f2_page(f2_event: list) -> str:
+    """Returns a results page like fiaformula2.com's for an f2 calendar event
+    ([round, country, circuit, date, sessions]), as the scraper expects to find it."""
+    round_number, country, circuit, date_string, sessions = f2_event
+    pins = "".join(
+        "<div class=\"pin\">" + "".join(f"<span>{part}</span>" for part in session) + "</div>"
+        for session in sessions
+    )
+    return (
+        "<html><body>"
+        f"<div class=\"country-circuit-name\">{country}</div>"
+        f"<div class=\"country-circuit\">{circuit}</div>"
+        f"<div class=\"schedule\">{round_number} | {date_string}</div>"
+        f"{pins}"
+        "</body></html>"
+    )
+
+
+def load_f2_pages() -> dict[int, bytes]:
+    """Returns the saved fixture f2 results pages mapped by race id. The pages were made with get_f2_page()
+    from the stored f2 calendar, one per race id in data/f2_race_ids.json."""
+    pages_folder = os.path.join(FIXTURES_FOLDER, "f2_pages")
+    pages = {}
+    for filename in os.listdir(pages_folder):
+        with open(os.path.join(pages_folder, filename), "rb") as infile:
+            pages[int(filename.split(".")[0])] = infile.read()
+    return pages
+
+
+class FakeResponse:
+    """Stand-in for requests.Response with the attributes the scraper uses."""
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+        self.headers = {}
+
+
+@contextmanager
+def use_fixtures() -> Iterator[None]:
+    """Patches fastf1's schedule functions to use the fixture season, and the http session used by fetch.py
+    to serve the fixture f2 pages. Runs in the repo root, the previous working directory is restored on exit."""
+    import fastf1
+    import pandas as pd
+    import requests
+
+    schedule = build_event_schedule()
+    pages = load_f2_pages()
+
+    def get_event_schedule(year, include_testing=True, **kwargs):
+        return schedule
+
+    def get_event(year, gp, **kwargs):
+        return schedule.get_event_by_round(gp)
+
+    def get_events_remaining(dt=None, include_testing=True, **kwargs):
+        return schedule[schedule["EventDate"] >= pd.Timestamp(dt)]
+
+    def get(session, url, *args, **kwargs):
+        race_id = int(url.split("raceid=")[-1])
+        if race_id in pages:
+            return FakeResponse(200, pages[race_id])
+        return FakeResponse(404, b"")
+
+    with mock.patch.object(fastf1, "get_event_schedule", get_event_schedule), mock.patch.object(
+        fastf1, "get_event", get_event
+    ), mock.patch.object(fastf1, "get_events_remaining", get_events_remaining), mock.patch.object(
+        requests.Session, "get", get
+    ):
+        previous_folder = os.getcwd()
+        os.chdir(REPO_ROOT)
+        try:
+            yield
+        finally:
+            os.chdir(previous_folder)
@@ -0,0 +1,221 @@
+"""Load test: the bot against a stand-in Discord API (benchmarks/fake_discord.py) with scripted latency and rate limits.
+
+The real bot connects to the local gateway and REST server with discord.py and runs against the fixture season
+(benchmarks/fixtures.py), so everything from the refresh to discord.py's rate limit handling is exercised.
+Scenarios:
+- post: a forced refresh posting the week embed in every channel, then a second one fetching the posted
+  messages again and editing or skipping them. Reports the posts per second and when each channel was done.
+- commands: a burst of concurrent commands from users in random channels. Reports the replies per second and
+  the latency from the command reaching the gateway to the reply reaching the REST api. Note that discord only
+  allows 5 messages per 5 seconds per channel, so more than 5 commands per channel wait for the channel's limit.
+- mixed: the commands burst during a forced refresh posting in every channel, the replies should not wait for
+  the background posts.
+Both report the requests per route with their latency and the 429s served.
+
+Run from the repo root:
+    python3 benchmarks/load_discord.py
+    python3 benchmarks/load_discord.py --channels 500 --guilds 100 --latency 0.05 --jitter 0.1 --random-429 0.02
+    python3 benchmarks/load_discord.py --scenario commands --commands 500 --command next
+    python3 benchmarks/load_discord.py --scenario mixed --channels 200 --commands 100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+
+import fake_discord
+import fixtures
+import simulate_season
+
+FIRST_GUILD_ID = 10_000
+FIRST_USER_ID = 1_000_000
+
+# Seconds to wait for the replies of the commands scenario
+REPLY_TIMEOUT = 60
+
+
+def get_percentile(values: list[float], percent: float) -> float:
+    """Returns the nearest rank percentile of the values."""
+    values = sorted(values)
+    return values[min(len(values) - 1, round(percent / 100 * (len(values) - 1)))]
+
+
+def format_latencies(values: list[float]) -> str:
+    """Returns the p50/p95/p99/max of the values in seconds, as milliseconds."""
+    if not values:
+        return f"{'-':>9}{'-':>9}{'-':>9}{'-':>9}"
+    return "".join(
+        f"{get_percentile(values, percent) * 1000:>9.1f}" for percent in (50, 95, 99, 100)
+    )
+
+
+def report_requests(requests: list[fake_discord.RequestRecord]) -> None:
+    """Prints the requests per route with their latency and 429s."""
+    routes = defaultdict(list)
+    for record in requests:
+        route = record.route.replace("/api/v7", "").replace("_id}", "}")
+        routes[f"{record.method} {route}"].append(record)
+    print(f"  {'route':<64}{'requests':>9}{'429s':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, records in sorted(routes.items()):
+        limited = sum(1 for record in records if record.status == 429)
+        print(
+            f"  {route:<64}{len(records):>9}{limited:>7}"
+            f"{format_latencies([record.duration for record in records])}"
+        )
+
+
+async def run_post(bot, server: fake_discord.FakeDiscord) -> None:
+    """Posts the week embed in every channel, then refreshes again to fetch and edit or skip the posted embeds."""
+    loop = asyncio.get_event_loop()
+    for round_ in ("post", "recheck"):
+        first_request, first_created = len(server.requests), len(server.created)
+        start = loop.time()
+        await bot.run_refresh(force_scrape=True)
+        await simulate_season.wait_for_outbound(bot)
+        seconds = loop.time() - start
+
+        requests = server.requests[first_request:]
+        done = defaultdict(float)
+        for record in requests:
+            if record.channel_id is not None:
+                done[record.channel_id] = max(done[record.channel_id], record.time + record.duration - start)
+        posts = len(server.created) - first_created
+        print(
+            f"\n{round_}: {seconds:.2f} s, {posts} posts ({posts / seconds:.1f}/s), "
+            f"{len(requests)} requests ({len(requests) / seconds:.1f}/s)"
+        )
+        print(f"  {'channel done':<64}{len(done):>9}{'':>7}{format_latencies(list(done.values()))}")
+        report_requests(requests)
+
+
+async def run_commands(bot, server: fake_discord.FakeDiscord, commands: int, command: str, seed: int) -> None:
+    """Sends a burst of concurrent commands from users in random channels and waits for the replies."""
+    loop = asyncio.get_event_loop()
+    rng = random.Random(seed)
+    channel_ids = list(server.channels)
+    first_request, first_created = len(server.requests), len(server.created)
+    sent = defaultdict(deque)  # channel id -> loop times the commands were sent, the replies are in order
+
+    async def send_command(user_id: int) -> None:
+        channel_id = rng.choice(channel_ids)
+        sent[channel_id].append(loop.time())
+        await server.send_user_message(channel_id, user_id, f"&{command}")
+
+    start = loop.time()
+    await asyncio.gather(*(send_command(FIRST_USER_ID + i) for i in range(commands)))
+    while len(server.created) - first_created < commands and loop.time() - start < REPLY_TIMEOUT:
+        await asyncio.sleep(0.01)
+    seconds = loop.time() - start
+    await simulate_season.wait_for_outbound(bot)
+
+    latencies = []
+    for created, message in server.created[first_created:]:
+        waiting = sent[int(message["channel_id"])]
+        if waiting:
+            latencies.append(created - waiting.popleft())
+    print(
+        f"\ncommands (&{command}): {seconds:.2f} s, {len(latencies)}/{commands} replies "
+        f"({len(latencies) / seconds:.1f}/s)"
+    )
+    print(f"  {'reply latency':<64}{len(latencies):>9}{'':>7}{format_latencies(latencies)}")
+    report_requests(server.requests[first_request:])
+
+
+async def run_mixed(bot, server: fake_discord.FakeDiscord, commands: int, command: str, seed: int) -> None:
+    """Sends the commands burst while a forced refresh posts the week embed in every channel."""
+    refresh = asyncio.ensure_future(bot.run_refresh(force_scrape=True))
+    await asyncio.sleep(0.5)  # let the refresh render and queue its posts first
+    await run_commands(bot, server, commands, command, seed)
+    await refresh
+    await simulate_season.wait_for_outbound(bot)
+
+
+async def skip_on_ready() -> None:
+    pass
+
+
+async def run(bot, args: argparse.Namespace) -> None:
+    """Starts the stand-in server, connects the bot to it and runs the scenarios."""
+    guilds = defaultdict(list)
+    for i in range(args.channels):
+        guilds[FIRST_GUILD_ID + i % args.guilds].append(simulate_season.FIRST_CHANNEL_ID + i)
+    server = fake_discord.FakeDiscord(
+        dict(guilds),
+        simulate_season.BOT_ID,
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit=(args.rate_limit, args.rate_period),
+        random_429=args.random_429,
+        seed=args.seed,
+    )
+    await server.start()
+    fake_discord.use_fake_discord(server)
+
+    bot.logger.setLevel(logging.WARNING)  # the bot logs every post and reply
+    bot.bot.on_ready = skip_on_ready  # dont start the status loop, the scenarios refresh themselves
+    client = asyncio.ensure_future(bot.bot.start("load-test"))
+    ready = asyncio.ensure_future(bot.bot.wait_until_ready())
+    await asyncio.wait([client, ready], return_when=asyncio.FIRST_COMPLETED)
+    try:
+        if client.done():
+            client.result()  # raises why the bot could not connect
+        if args.scenario in ("post", "all"):
+            await run_post(bot, server)
+        if args.scenario in ("commands", "all"):
+            await bot.rebuild_schedule_index()
+            await run_commands(bot, server, args.commands, args.command, args.seed)
+        if args.scenario == "mixed":
+            await run_mixed(bot, server, args.commands, args.command, args.seed)
+        print(f"\npresence updates  {len(server.presences)}")
+    finally:
+        ready.cancel()
+        await bot.bot.close()
+        await asyncio.wait([client])
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=["post", "commands", "mixed", "all"], default="all", help="scenarios to run")
+    parser.add_argument("--channels", type=int, default=100, help="number of subscribed channels")
+    parser.add_argument("--guilds", type=int, default=20, help="number of guilds the channels are spread over")
+    parser.add_argument("--commands", type=int, default=200, help="number of concurrent commands")
+    parser.add_argument("--command", default="ping", help="the command the users send, e.g. ping or next")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds each REST request takes")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this many extra seconds per request")
+    parser.add_argument("--rate-limit", type=int, default=5, help="requests per route and channel per period")
+    parser.add_argument("--rate-period", type=float, default=5.0, help="seconds of a rate limit period")
+    parser.add_argument("--random-429", type=float, default=0.0, help="fraction of requests rate limited at random")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the jitter, random 429s and command channels")
+    parser.add_argument(
+        "--date", type=datetime.fromisoformat, help="day of the refreshes, defaults to the week of the first race"
+    )
+    args = parser.parse_args()
+
+    import clock
+
+    now = args.date or datetime.combine(fixtures.get_race_dates()[0] - timedelta(days=3), datetime.min.time())
+    print(
+        f"{args.channels} channels in {args.guilds} guilds, REST latency {args.latency * 1000:.0f}"
+        f"+{args.jitter * 1000:.0f} ms, {args.rate_limit} requests per {args.rate_period:g} s, "
+        f"{args.random_429:.0%} random 429s, at {now}"
+    )
+    with tempfile.TemporaryDirectory() as folder, fixtures.use_fixtures():
+        simulate_season.setup_data_folder(folder, args.channels)
+        os.chdir(folder)
+        try:
+            import bot  # imported here so its log and state files are in the temporary folder
+
+            clock.set_now(now.replace(hour=bot.scheduled_hour, minute=bot.scheduled_minute))
+            bot.bot.loop.run_until_complete(run(bot, args))
+        finally:
+            clock.set_now(None)
+            os.chdir(fixtures.REPO_ROOT)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Offline benchmark suite for the scraping, schedule lookups and rendering.
+
+Everything runs against the fixtures in benchmarks/fixtures.py (fixture F1 season instead of live fastf1,
+saved F2 pages instead of fiaformula2.com), so the results only depend on the code and the machine.
+
+The stored baselines are absolute timings from the machine they were saved on. To compare on another machine, a
+fixed calibration workload (not using the bot code) is timed with every run, and the baselines are scaled by how
+much faster or slower it ran than when the baselines were saved. This only corrects for the overall speed, so
+regenerate the baselines with --save-baseline on the machine you compare on before trusting small changes.
+
+Run from the repo root:
+    python3 benchmarks/run_benchmarks.py                  # run and compare with the stored baselines
+    python3 benchmarks/run_benchmarks.py --save-baseline  # run and store the results as the new baselines
+    python3 benchmarks/run_benchmarks.py --only render --repeat 10
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import fixtures
+
+BASELINES_FILENAME = os.path.join(fixtures.REPO_ROOT, "benchmarks", "baselines.json")
+
+# A benchmark is reported as a regression if its median is this much slower than the baseline
+REGRESSION_THRESHOLD = 0.20
+
+# Name of the calibration workload in the baselines, see bench_calibration()
+CALIBRATION = "calibration"
+
+
+def bench_scrape_parse() -> None:
+    """formula2.scrape_calendar() over the saved f2 pages: http fetch stand-in plus BeautifulSoup parsing."""
+    import fetch
+    import formula2 as f2
+
+    fetch.clear_cache()  # measure the fetch too, not the cached pages
+    f2.scrape_calendar()
+
+
+def bench_calendar_merge() -> None:
+    """util.update_f2cal_json() merging a scraped calendar into a copy of the stored one."""
+    import fetch
+    import formula2 as f2
+    import util
+
+    fetch.clear_cache()
+    scraped = f2.scrape_calendar()
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "f2_calendar.json")
+        shutil.copy(os.path.join("data", "f2_calendar.json"), filename)
+        util.update_f2cal_json(scraped, filename)
+
+
+def bench_week_lookups() -> None:
+    """formula1.until_next_race_week() and get_week_event() for every date of the season."""
+    import formula1 as f1
+
+    for date_ in fixtures.get_season_dates():
+        try:
+            f1.until_next_race_week(date_)
+        except ValueError:  # after the last race
+            pass
+        f1.get_week_event(date_)
+
+
+def bench_render() -> None:
+    """formula1.get_all_week_info() for every race week of the season."""
+    import formula1 as f1
+
+    for race_date in fixtures.get_race_dates():
+        f1.get_all_week_info(race_date)
+
+
+def bench_calibration() -> None:
+    """Fixed pure python work independent of the bot code, measuring the speed of the machine."""
+    data = [{"name": f"session {i}", "time": f"{i % 24:02}:{i % 60:02}"} for i in range(5000)]
+    json.loads(json.dumps(sorted(data, key=lambda session: (session["time"], session["name"]))))
+
+
+BENCHMARKS: dict[str, Callable[[], None]] = {
+    "scrape_parse": bench_scrape_parse,
+    "calendar_merge": bench_calendar_merge,
+    "week_lookups": bench_week_lookups,
+    "render": bench_render,
+}
+
+
+def run_benchmark(function: Callable[[], None], repeat: int) -> list[float]:
+    """Runs the function once to warm up, then 'repeat' times, returns the durations in seconds."""
+    function()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def load_baselines() -> dict[str, float]:
+    if not os.path.exists(BASELINES_FILENAME):
+        return {}
+    with open(BASELINES_FILENAME) as infile:
+        return json.load(infile)
+
+
+def save_baselines(results: dict[str, float]) -> None:
+    baselines = load_baselines()
+    baselines.update(results)
+    with open(BASELINES_FILENAME, "w") as outfile:
+        json.dump(baselines, outfile, indent=3, sort_keys=True)
+
+
+def get_machine_factor(calibration: list[float], baselines: dict[str, float]) -> float:
+    """Returns how much slower this machine ran the calibration workload than the one the baselines were
+    saved on, 1.0 if the baselines have no calibration."""
+    baseline = baselines.get(CALIBRATION)
+    if not baseline:
+        return 1.0
+    return statistics.median(calibration) / baseline
+
+
+def report(results: dict[str, list[float]], baselines: dict[str, float], factor: float = 1.0) -> list[str]:
+    """Prints the comparison report with the baselines scaled by the machine 'factor', returns the names of the
+    regressed benchmarks."""
+    regressions = []
+    print(f"Machine speed factor {factor:.2f} (baselines scaled by it, see the module docstring)")
+    print(f"{'benchmark':<16}{'median ms':>12}{'min ms':>10}{'baseline ms':>14}{'change':>10}")
+    for name, times in results.items():
+        median = statistics.median(times)
+        line = f"{name:<16}{median * 1000:>12.2f}{min(times) * 1000:>10.2f}"
+        baseline = baselines.get(name)
+        if baseline:
+            baseline *= factor
+            change = (median - baseline) / baseline
+            line += f"{baseline * 1000:>14.2f}{change:>+10.1%}"
+            if change > REGRESSION_THRESHOLD:
+                line += "  REGRESSION"
+                regressions.append(name)
+        else:
+            line += f"{'-':>14}{'-':>10}"
+        print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="only run these benchmarks")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as baselines")
+    parser.add_argument(
+        "--fail-on-regression", action="store_true", help="exit with code 1 if any benchmark regressed"
+    )
+    args = parser.parse_args()
+
+    results = {}
+    calibration = run_benchmark(bench_calibration, args.repeat)
+    with fixtures.use_fixtures():
+        for name in args.only or BENCHMARKS:
+            results[name] = run_benchmark(BENCHMARKS[name], args.repeat)
+
+    baselines = load_baselines()
+    regressions = report(results, baselines, get_machine_factor(calibration, baselines))
+    if args.save_baseline:
+        results[CALIBRATION] = calibration
+        save_baselines({name: statistics.median(times) for name, times in results.items()})
+        print(f"Baselines saved to {BASELINES_FILENAME}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""Season simulator: replays the bot's refreshes over a whole season offline.
+
+The clock (clock.py) is moved through the season following the bot's own refresh schedule
+(refresh.get_next_refresh_time()), and each refresh runs the real refresh path against the fixture season
+(benchmarks/fixtures.py), a stand-in f2 scraper serving the saved pages and fake discord channels.
+It records every post, edit, reaction and presence update, the upstream fastf1/http calls and the latency
+of each refresh, and reports the totals, per week counts and any duplicate posts.
+
+Everything runs in a temporary copy of the data folder, nothing in the repo is changed.
+
+Run from the repo root:
+    python3 benchmarks/simulate_season.py
+    python3 benchmarks/simulate_season.py --channels 3 --start 2024-05-01 --end 2024-06-30 --output sim.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, ContextManager, Union
+from unittest import mock
+
+import fixtures
+
+BOT_ID = 1
+FIRST_CHANNEL_ID = 100
+
+# Lifetime of the fake cdn image urls, like discord's signed attachment urls
+CDN_URL_LIFETIME = timedelta(hours=24)
+
+
+class Recorder:
+    """Records the discord actions and upstream calls of the simulation."""
+
+    def __init__(self):
+        self.actions = []
+        self.upstream = Counter()
+        self.refreshes = []
+
+    def action(self, kind: str, channel_id=None, **details) -> None:
+        import clock
+
+        self.actions.append(
+            {"time": clock.now().isoformat(), "action": kind, "channel": channel_id, **details}
+        )
+
+    def counting(self, name: str, function):
+        """Returns the function wrapped to count its calls as upstream calls."""
+
+        def wrapper(*args, **kwargs):
+            self.upstream[name] += 1
+            return function(*args, **kwargs)
+
+        return wrapper
+
+
+class FakeUser:
+    def __init__(self, id_: int):
+        self.id = id_
+
+
+class FakeAttachment:
+    def __init__(self, url: str):
+        self.url = url
+
+
+class FakeMessage:
+    """Stand-in for discord.Message with what the bot uses."""
+
+    def __init__(self, channel, id_: int, content, embed, file):
+        import clock
+
+        self.channel = channel
+        self.id = id_
+        self.content = content
+        self.author = FakeUser(BOT_ID)
+        self.created_at = clock.now(timezone.utc).replace(tzinfo=None)
+        self.attachments = []
+        self.embeds = [embed.copy()] if embed is not None else []
+        if file is not None:
+            # Discord replaces the attachment url with a signed cdn url
+            expiry = int((clock.now() + CDN_URL_LIFETIME).timestamp())
+            url = f"https://cdn.discordapp.com/attachments/{channel.id}/{id_}/{file.filename}?ex={expiry:x}"
+            self.attachments.append(FakeAttachment(url))
+            if self.embeds:
+                self.embeds[0].set_image(url=url)
+
+    async def edit(self, content=None, embed=None, **kwargs) -> None:
+        self.channel.recorder.action("edit", self.channel.id, message=self.id)
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed.copy()]
+
+    async def add_reaction(self, emoji) -> None:
+        self.channel.recorder.action("reaction", self.channel.id, message=self.id)
+
+    async def delete(self) -> None:
+        self.channel.recorder.action("delete", self.channel.id, message=self.id)
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel:
+    """Stand-in for a discord text channel, keeping the messages sent in it."""
+
+    def __init__(self, id_: int, recorder: Recorder):
+        self.id = id_
+        self.recorder = recorder
+        self.messages = {}
+        self._next_id = id_ * 1_000_000
+
+    async def send(self, content=None, embed=None, file=None, **kwargs) -> FakeMessage:
+        self._next_id += 1
+        message = FakeMessage(self, self._next_id, content, embed, file)
+        self.messages[message.id] = message
+        self.recorder.action("send", self.id, message=message.id, upload=file is not None)
+        return message
+
+    async def fetch_message(self, id_: int) -> FakeMessage:
+        self.recorder.upstream["discord_fetch_message"] += 1
+        return self.messages[id_]
+
+    async def history(self, limit: int = 100):
+        self.recorder.upstream["discord_history"] += 1
+        for message in list(reversed(self.messages.values()))[:limit]:
+            yield message
+
+
+def setup_data_folder(folder: str, channels: int) -> None:
+    """Copies the repo data into the given folder, with a fake discord config and 'channels' subscriptions."""
+    shutil.copytree(
+        os.path.join(fixtures.REPO_ROOT, "data"),
+        os.path.join(folder, "data"),
+        ignore=shutil.ignore_patterns("cache", "profiles", "bot_state.json", "discord_data.json"),
+    )
+    with open(os.path.join(folder, "data", "template_discord_data.json")) as infile:
+        config = json.load(infile)
+    config.update(
+        {
+            "bot_token": "simulated",
+            "bot_id": str(BOT_ID),
+            "channel_id": str(FIRST_CHANNEL_ID),
+            "race_week_emoji": "🏎️",
+            "no_race_week_emoji": "😴",
+            "metrics_port": "",
+            "reminder_channel_id": "",
+        }
+    )
+    with open(os.path.join(folder, "data", "discord_data.json"), "w") as outfile:
+        json.dump(config, outfile, indent=2)
+    if channels > 1:
+        with open(os.path.join(folder, "data", "subscriptions.json"), "w") as outfile:
+            json.dump({str(FIRST_CHANNEL_ID + i): {} for i in range(channels)}, outfile, indent=3)
+
+
+async def wait_for_outbound(bot) -> None:
+    """Waits until the outbound queue has sent everything queued, like presence updates nobody awaits."""
+    while bot.outbound_queue.pending() or bot.outbound_queue.running():
+        await asyncio.sleep(0.001)
+
+
+async def simulate(
+    bot,
+    recorder: Recorder,
+    start: date,
+    end: date,
+    measure: Union[Callable[[datetime], ContextManager], None] = None,
+) -> None:
+    """Runs the refreshes from 'start' until 'end' on the bot's refresh schedule.
+    'measure' is an optional context manager factory called with the time of each refresh and wrapped
+    around it, e.g. to measure memory."""
+    import clock
+    import refresh
+
+    now = datetime(start.year, start.month, start.day, bot.scheduled_hour, bot.scheduled_minute)
+    while now.date() <= end:
+        clock.set_now(now)
+        began = time.perf_counter()
+        with measure(now) if measure else nullcontext():
+            await bot._run_refresh(force_scrape=False)
+            await wait_for_outbound(bot)
+        recorder.refreshes.append((now.isoformat(), time.perf_counter() - began))
+        now = refresh.get_next_refresh_time(now, bot.scheduled_hour, bot.scheduled_minute)
+    clock.set_now(None)
+
+
+def run(
+    recorder: Recorder,
+    start: date,
+    end: date,
+    fastf1,
+    requests,
+    measure: Union[Callable[[datetime], ContextManager], None] = None,
+) -> None:
+    """Runs the simulation in the current folder, with fake channels and counted upstream calls.
+    The outbound queue has no local rate limits, they would be measured in real time and hold back the simulated
+    refreshes."""
+    import bot  # imported here so its log and state files are in the temporary folder
+    import outbound
+
+    channels = {}
+
+    def get_channel(channel_id: int) -> FakeChannel:
+        if channel_id not in channels:
+            channels[channel_id] = FakeChannel(channel_id, recorder)
+        return channels[channel_id]
+
+    async def change_presence(**kwargs) -> None:
+        recorder.action("presence", activity=kwargs["activity"].name)
+
+    queue = outbound.OutboundQueue()
+    with mock.patch.object(bot, "outbound_queue", queue), mock.patch.object(
+        bot.bot, "get_channel", get_channel
+    ), mock.patch.object(
+        bot.bot, "change_presence", change_presence
+    ), mock.patch.object(
+        requests.Session, "get", recorder.counting("http_get", requests.Session.get)
+    ), mock.patch.object(
+        fastf1, "get_event_schedule", recorder.counting("fastf1_get_event_schedule", fastf1.get_event_schedule)
+    ), mock.patch.object(
+        fastf1, "get_event", recorder.counting("fastf1_get_event", fastf1.get_event)
+    ), mock.patch.object(
+        fastf1, "get_events_remaining", recorder.counting("fastf1_get_events_remaining", fastf1.get_events_remaining)
+    ):
+        bot.bot.loop.run_until_complete(simulate(bot, recorder, start, end, measure))
+    if queue._dispatcher is not None:
+        queue._dispatcher.cancel()
+        bot.bot.loop.run_until_complete(asyncio.gather(queue._dispatcher, return_exceptions=True))
+
+
+def get_duplicate_posts(recorder: Recorder) -> list[tuple[int, str, int]]:
+    """Returns the (channel, iso week, posts) of every channel week with more than one weekly post."""
+    import state
+
+    posts = Counter(
+        (action["channel"], state.get_iso_week(datetime.fromisoformat(action["time"]).date()))
+        for action in recorder.actions
+        if action["action"] == "send"
+    )
+    return [(channel, week, count) for (channel, week), count in sorted(posts.items()) if count > 1]
+
+
+def report(recorder: Recorder, duplicates: list, weekly: bool) -> None:
+    """Prints the totals, optionally the counts per week, and the duplicate posts."""
+    import state
+
+    totals = Counter(action["action"] for action in recorder.actions)
+    uploads = sum(1 for action in recorder.actions if action.get("upload"))
+    latencies = [duration for _, duration in recorder.refreshes]
+
+    print(f"refreshes          {len(recorder.refreshes)}")
+    print(
+        f"refresh latency    median {statistics.median(latencies) * 1000:.1f} ms, "
+        f"max {max(latencies) * 1000:.1f} ms, total {sum(latencies):.2f} s"
+    )
+    print("discord actions    " + ", ".join(f"{kind} {count}" for kind, count in sorted(totals.items())))
+    print(f"image uploads      {uploads}")
+    print("upstream calls     " + ", ".join(f"{name} {count}" for name, count in sorted(recorder.upstream.items())))
+
+    if weekly:
+        per_week = defaultdict(Counter)
+        for action in recorder.actions:
+            per_week[state.get_iso_week(datetime.fromisoformat(action["time"]).date())][action["action"]] += 1
+        print(f"\n{'week':<10}{'send':>6}{'edit':>6}{'reaction':>10}{'presence':>10}")
+        for week, counts in sorted(per_week.items()):
+            print(
+                f"{week:<10}{counts['send']:>6}{counts['edit']:>6}{counts['reaction']:>10}{counts['presence']:>10}"
+            )
+
+    if duplicates:
+        print(f"\nDUPLICATE POSTS ({len(duplicates)}):")
+        for channel, week, count in duplicates:
+            print(f"  channel {channel} week {week}: {count} posts")
+    else:
+        print("\nNo duplicate posts")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--start", type=date.fromisoformat, help="first day, defaults to 2 weeks before the first race")
+    parser.add_argument("--end", type=date.fromisoformat, help="last day, defaults to the last race (the bot has no week to show after it)")
+    parser.add_argument("--channels", type=int, default=1, help="number of subscribed channels")
+    parser.add_argument("--weekly", action="store_true", help="also print the discord actions per week")
+    parser.add_argument("--output", help="write all the recorded actions and refreshes to this json file")
+    parser.add_argument("--fail-on-duplicates", action="store_true", help="exit with code 1 on duplicate posts")
+    args = parser.parse_args()
+
+    race_dates = fixtures.get_race_dates()
+    start = args.start or race_dates[0] - timedelta(weeks=2)
+    end = args.end or race_dates[-1]
+    output = os.path.abspath(args.output) if args.output else None
+
+    recorder = Recorder()
+    with tempfile.TemporaryDirectory() as folder, fixtures.use_fixtures():
+        import fastf1
+        import requests
+
+        setup_data_folder(folder, args.channels)
+        os.chdir(folder)
+        try:
+            run(recorder, start, end, fastf1, requests)
+        finally:
+            os.chdir(fixtures.REPO_ROOT)
+
+    duplicates = get_duplicate_posts(recorder)
+    print(f"Simulated {start} to {end}, {args.channels} channel(s)\n")
+    report(recorder, duplicates, args.weekly)
+
+    if output:
+        with open(output, "w") as outfile:
+            json.dump(
+                {
+                    "start": str(start),
+                    "end": str(end),
+                    "actions": recorder.actions,
+                    "upstream": dict(recorder.upstream),
+                    "refreshes": recorder.refreshes,
+                },
+                outfile,
+                indent=1,
+                ensure_ascii=False,
+            )
+        print(f"Recorded simulation written to {output}")
+
+    if duplicates and args.fail_on_duplicates:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
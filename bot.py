@@ -1,66 +1,289 @@
+import argparse
+import hashlib
+import importlib
 import logging
+import os
 import sys
 
-import traceback
-
-from asyncio import sleep, get_event_loop, Lock
+from asyncio import sleep, gather, get_event_loop, shield, Future, Lock, Semaphore, Task
 from datetime import datetime, timedelta
-from typing import Union
+from functools import partial
+from typing import NamedTuple, Union
 
 import discord
 from discord.ext import commands
 
-import formula1 as f1
-import formula2 as f2
+import botlog
+import changes
+import clock
+import feeds
+import images
+import metrics
+import outbound
+import profiling
+import providers
+import refresh
+import reminders
+import schedule_index
+import shared_cache
+import state
+import subscriptions
 import util
+import watchdog
+
+# The f1 and f2 modules pull in fastf1, pandas, numpy and bs4. warm_up() imports them in a background thread so the
+# bot can connect without waiting for them, refreshes and commands wait for it first (see wait_for_warm_up())
+f1 = None
+f2 = None
 
-# Discord Channel ID for the bot to work in
-CHANNEL_ID = int(util.get_json_data("channel_id"))
+# The running or finished warm_up() in the background thread, None until it is started
+warm_up_future: Union[Future, None] = None
+
+# Max number of subscribed channels to send/edit the weekly embed in at the same time
+MAX_CONCURRENT_CHANNELS = 10
 
 # Status run timing (24 hour format)
 # NOTE: in norway it should be after 2 am since get_previous_bot_message() is in UTC time (norway time minus 2 hours).
 scheduled_hour = 5
 scheduled_minute = 0
 
+# Minutes before the scheduled time to fetch the schedules and render the week embeds, so the scheduled refresh
+# only has to check they are still fresh and send them (see prerender_week_embeds())
+PRERENDER_MINUTES = 60
+
 
-# Create logging to a bot.log file
+# Create logging to a bot.log file, as json lines written by a background thread. The file is rotated
+# when it reaches LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files
 LOG_FILENAME = "bot.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
 logger = logging.getLogger(__name__)
-fh = logging.FileHandler(LOG_FILENAME)  # log to logfile
-fh.setFormatter(logging.Formatter("[%(asctime)s - %(levelname)s] - %(message)s"))
-logger.addHandler(fh)
 logger.setLevel(logging.INFO)
+log_listener = botlog.setup_logging(logger, LOG_FILENAME, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+
+
+def set_log_filename(filename: str) -> None:
+    """Logs to another file instead, e.g. one per shard process since rotating a shared file isnt safe
+    across processes."""
+    global log_listener
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    log_listener.stop()
+    log_listener = botlog.setup_logging(logger, filename, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+
+
+# Discord bot permissions: only the gateway events the bot uses, the guilds (the channel cache behind
+# get_channel()) and guild messages (the commands)
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+
+# No member or message cache and no member chunking, the bot only needs its own member and fetches the
+# messages it edits. See benchmarks/bench_gateway.py
+CLIENT_OPTIONS = {
+    "member_cache_flags": discord.MemberCacheFlags.none(),
+    "max_messages": None,
+    "chunk_guilds_at_startup": False,
+}
+
+
+def create_bot(shard_id: Union[int, None] = None, shard_count: Union[int, None] = None) -> commands.Bot:
+    """Returns a new discord client with the bot's commands and events. A shard of a sharded deployment is
+    created with its shard id and count, discord.py only reads them when the client is created."""
+    client = commands.Bot(
+        command_prefix="&",
+        intents=intents,
+        case_insensitive=True,
+        shard_id=shard_id,
+        shard_count=shard_count,
+        **CLIENT_OPTIONS,
+    )
+    for command in COMMANDS:
+        client.add_command(command)
+    client.before_invoke(before_command)
+    client.event(on_ready)
+    return client
 
 
-# Discord bot permissions
-intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="&", intents=intents, case_insensitive=True)
-
-# Startup check
-loop = get_event_loop()
-try:
-    loop.run_until_complete(util.startup_check())
-except KeyboardInterrupt:
-    loop.close()
-    sys.exit(1)
+# The process role, set in main(): 'single' does everything, 'once' runs one refresh over REST and exits (see
+# run_once()), or in a sharded deployment 'refresher' fetches the schedules and writes the week models to the
+# shared cache, and each 'shard' posts them (see shared_cache.py)
+role = "single"
 
+# Channels fetched over REST in one-shot mode, where there is no gateway filling the channel cache
+rest_channels: dict[int, discord.abc.GuildChannel] = {}
 
 # Lock to prevent multiple instances of the status task
 lock = Lock()
 
-async def get_race_week_embed(date_: datetime.date) -> discord.Embed:
+# The in-flight refresh, see start_refresh()
+refresh_task = None
+
+# Set when the f2 calendar or the schedule changed. The week embeds are only rendered again when it is set,
+# or when a channel doesnt have this week's embed yet
+week_embed_dirty = True
+
+# Set when the f2 calendar changed. Otherwise the schedule index (and feeds) are only rebuilt once a day,
+# to pick up f1 schedule changes
+schedule_index_dirty = True
+schedule_index_date = None
+
+# The iso week the reminders are loaded for, see load_reminders()
+reminders_week = None
+
+
+class PrerenderedWeek(NamedTuple):
+    """Week embeds rendered ahead of the scheduled refresh, with the week and data version they were rendered for
+    and when the schedules were fetched for them."""
+
+    week: str
+    version: str
+    fetched: datetime
+    race_week: bool
+    embeds: dict[tuple, Union[discord.Embed, None]]
+
+
+# The week embeds rendered by prerender_week_embeds(), None until then
+prerendered_week = None
+
+# Reports event loop lag and logs the stack of any call blocking the loop for over half a second
+loop_watchdog = watchdog.LoopWatchdog(interval=0.5, threshold=0.5, logger=logger)
+
+# The local metrics http server, see start_metrics_server()
+metrics_runner = None
+
+# The status loop and reminder tasks started by on_ready(), which is called again on every reconnect
+status_loop: Union[Task, None] = None
+reminder_loop: Union[Task, None] = None
+
+# Queue for all outbound discord operations, handles priorities and coalescing (discord.py handles the rate limits)
+outbound_queue = outbound.OutboundQueue(logger=logger, route_limits=outbound.DEFAULT_ROUTE_LIMITS)
+
+
+async def queued_send(
+    channel: discord.abc.Messageable, priority: int = outbound.PRIORITY_BACKGROUND, **kwargs
+) -> discord.Message:
+    """Sends a message in the given channel through the outbound queue. Keyword arguments are passed
+    to channel.send()."""
+
+    return await outbound_queue.submit(f"send:{channel.id}", lambda: channel.send(**kwargs), priority)
+
+
+async def queued_edit(
+    message: discord.Message, priority: int = outbound.PRIORITY_BACKGROUND, **kwargs
+) -> None:
+    """Edits the given message through the outbound queue. Keyword arguments are passed to message.edit().
+    A queued edit of the same message that hasn't been sent yet is replaced by this one."""
+    await outbound_queue.submit(
+        f"edit:{message.channel.id}",
+        lambda: message.edit(**kwargs),
+        priority,
+        coalesce_key=f"edit:{message.id}",
+    )
+
+
+async def queued_delete(
+    message: discord.Message, priority: int = outbound.PRIORITY_BACKGROUND
+) -> None:
+    """Deletes the given message through the outbound queue."""
+    await outbound_queue.submit(
+        f"delete:{message.channel.id}", lambda: message.delete(), priority
+    )
+
+
+def get_channel(channel_id: int) -> Union[discord.abc.GuildChannel, None]:
+    """Returns the channel with the given id from the gateway's cache, or fetched over REST in one-shot mode."""
+    return rest_channels.get(channel_id) or bot.get_channel(channel_id)
+
+
+def get_optional_json_data(key: str, default: str = "") -> str:
+    """Returns the value of an optional key in 'discord_data.json', or the default if it is missing."""
+    try:
+        return util.get_json_data(key)
+    except KeyError:
+        return default
+
+
+async def send_session_reminder(session: reminders.Session) -> None:
+    """Sends a reminder for a session about to start in the reminder channel."""
+    channel = bot.get_channel(int(get_optional_json_data("reminder_channel_id")))
+    await queued_send(channel, content=reminders.get_reminder_text(session))
+
+
+# Reminders before each session, only used if a 'reminder_channel_id' is set in 'discord_data.json'
+# (minutes_before is read from the config in on_ready())
+reminder_scheduler = reminders.ReminderScheduler(send_session_reminder, logger=logger)
+
+
+def load_reminders() -> None:
+    """Reschedules the session reminders from the current calendar data."""
+    global reminders_week
+    channel_id = get_optional_json_data("reminder_channel_id")
+    if not channel_id or role in ["refresher", "once"]:
+        return
+    today = clock.today()
+    if role == "shard":
+        # Only the shard with the reminder channel's guild sends reminders, from the shared schedule index
+        if bot.get_channel(int(channel_id)) is None:
+            return
+        event = schedule_index.find_week_event(today)
+        sessions = [session for session in event.sessions if not session.unknown] if event else []
+    else:
+        sessions = reminders.get_week_sessions(today)
+    reminder_scheduler.load(sessions)
+    reminders_week = state.get_iso_week(today)
+
+
+def on_calendar_changes(calendar_changes: list[changes.SessionChange]) -> None:
+    """Called when the f2 calendar changed: reschedules the reminders right away and marks the week embeds
+    and schedule index to be rendered again."""
+    global week_embed_dirty, schedule_index_dirty
+    week_embed_dirty = True
+    schedule_index_dirty = True
+    load_reminders()
+
+
+changes.subscribe(on_calendar_changes)
+
+
+def log_presence_error(future) -> None:
+    """Logs if a queued presence update failed, since nobody waits for its result."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            f"update_status_message(): Presence update failed: {type(future.exception())}: {future.exception()}"
+        )
+
+
+def queue_presence(activity: discord.Activity) -> None:
+    """Queues a presence update without waiting for it. A newer presence update replaces one that
+    hasn't been sent yet."""
+    future = outbound_queue.submit_nowait(
+        "presence",
+        lambda: bot.change_presence(status=discord.Status.online, activity=activity),
+        coalesce_key="presence",
+    )
+    future.add_done_callback(log_presence_error)
+
+
+async def get_race_week_embed(
+    date_: datetime.date,
+    language: str = "norwegian",
+    series: Union[list[str], tuple[str, ...]] = ("f1", "f2"),
+) -> discord.Embed:
     """Returns embed for a race week with a 'race week' image."""
     title, des = f1.get_all_week_info(
-        date_
+        date_, language=language, series=series
     )  # title and description for the embed message
     embed = discord.Embed(title=title, description=des)
     embed.set_image(url="attachment://race.png")
     return embed
 
 
-async def get_no_race_week_embed(date_: datetime.date) -> Union[discord.Embed, None]:
-    """Returns embed for a non race week with a 'no race week' image. Returns None if something messes up
-    and there actually is no race week found."""
+async def get_no_race_week_embed(
+    date_: datetime.date, language: str = "norwegian"
+) -> Union[discord.Embed, None]:
+    """Returns embed for a non race week with a 'no race week' image, in the given language ('norwegian' or
+    'english'). Returns None if something messes up and there actually is no race week found."""
     week_count = f1.until_next_race_week(date_)
     if week_count == 0:
         logger.error(
@@ -68,267 +291,747 @@ async def get_no_race_week_embed(date_: datetime.date) -> Union[discord.Embed, N
             " meaning there is a race this week. Can't return a no_race_week_embed, returning None early."
         )
         return
-    elif week_count == 1:
+    norwegian = language.lower() == "norwegian"
+    if week_count == 1:
         title = (
-            str(week_count) + " uke til neste rawe ceek..."
+            str(week_count) + (" uke til neste rawe ceek..." if norwegian else " week until the next rawe ceek...")
         )  # title for embed message
 
     else:
         title = (
-            str(week_count) + " uker til neste rawe ceek..."
+            str(week_count) + (" uker til neste rawe ceek..." if norwegian else " weeks until the next rawe ceek...")
         )  # title for embed message
 
     next_event = f1.get_next_week_event(date_)
-    next_event_name = next_event["EventName"]
+    next_event_name = next_event.name
 
     en_date = util.get_event_date_str(next_event)
-    no_date = (
-        str(int(en_date.split(" ")[0]))
-        + " "
-        + util.month_to_norwegian(en_date.split(" ")[1], caps=False)
-    )
-    des = f"{next_event_name} den {no_date}."  # description for embed message
+    if norwegian:
+        no_date = (
+            str(int(en_date.split(" ")[0]))
+            + " "
+            + util.month_to_norwegian(en_date.split(" ")[1], caps=False)
+        )
+        des = f"{next_event_name} den {no_date}."  # description for embed message
+    else:
+        des = f"{next_event_name} on {int(en_date.split(' ')[0])} {en_date.split(' ')[1]}."
     embed = discord.Embed(title=title, description=des)
     embed.set_image(url="attachment://norace.png")
     return embed
 
 
-async def update_status_message() -> None:
-    """Updates the bots status message with either a message depending on if its a race week or not."""
-    today = datetime.now().date()
-    if f1.is_f1_race_week(today):
+def get_status_text(date_: datetime.date) -> str:
+    """Returns the status message text for the week of the given date, depending on if its a race week or not."""
+    if f1.is_f1_race_week(date_):
         # Set bot satus message to rawe ceek
-        activity = discord.Activity(
-            type=discord.ActivityType.watching, name="the RACE WEEK!"
-        )
-        await bot.change_presence(status=discord.Status.online, activity=activity)
+        return "the RACE WEEK!"
 
+    # Set bot satus message to no rawe ceek
+    until_next_race = f1.until_next_race_week(date_)
+    if until_next_race == 1:
+        until_next_race = str(until_next_race) + " week"
     else:
-        # Set bot satus message to no rawe ceek
-        until_next_race = f1.until_next_race_week(today)
-        if until_next_race == 1:
-            until_next_race = str(until_next_race) + " week"
+        until_next_race = str(until_next_race) + " weeks"
+    return f"nothing for {until_next_race}..."
+
+
+async def update_status_message(text: Union[str, None] = None) -> None:
+    """Updates the bots status message with the given text, by default depending on if its a race week or not."""
+    activity = discord.Activity(
+        type=discord.ActivityType.watching, name=text or get_status_text(clock.today())
+    )
+    queue_presence(activity)
+
+
+async def get_week_embeds(
+    date_: datetime.date, race_week: bool, subscriptions_: dict[str, dict]
+) -> dict[tuple, Union[discord.Embed, None]]:
+    """Returns the week embeds for all the given subscriptions, mapped by their render key.
+    Each distinct language/series combination is only rendered once."""
+    embeds = {}
+    for subscription in subscriptions_.values():
+        key = subscriptions.get_render_key(subscription)
+        if key in embeds:
+            continue
+        language, series = key
+        if race_week:
+            embeds[key] = await get_race_week_embed(date_, language, series)
         else:
-            until_next_race = str(until_next_race) + " weeks"
+            # The no race week embed only depends on the language
+            same_language = next((k for k in embeds if k[0] == language), None)
+            embeds[key] = embeds[same_language] if same_language else await get_no_race_week_embed(date_, language)
+    return embeds
+
+
+def get_week_data_version() -> str:
+    """Returns the version of the data the week embeds are rendered from: the schedule index and the stored f2
+    calendar, which also has the sessions still without times."""
+    calendar = b""
+    if util.file_exists("data/f2_calendar.json"):
+        with open("data/f2_calendar.json", "rb") as infile:
+            calendar = infile.read()
+    content = str(schedule_index.get_version()).encode("utf-8") + calendar
+    return hashlib.sha256(content).hexdigest()[:16]
+
+
+async def get_current_week_embeds(
+    date_: datetime.date, subscriptions_: dict[str, dict]
+) -> tuple[bool, dict[tuple, Union[discord.Embed, None]]]:
+    """Returns if it is a race week and the week embeds for the given subscriptions. Uses the pre-rendered embeds
+    if they are still fresh (same week and data version, and all the render keys), otherwise renders them now."""
+    prerendered = prerendered_week
+    keys = {subscriptions.get_render_key(subscription) for subscription in subscriptions_.values()}
+    if (
+        prerendered is not None
+        and prerendered.week == state.get_iso_week(date_)
+        and prerendered.version == get_week_data_version()
+        and keys <= prerendered.embeds.keys()
+    ):
+        metrics.inc("cache_hits", cache="prerendered_week")
+        return prerendered.race_week, prerendered.embeds
+
+    metrics.inc("cache_misses", cache="prerendered_week")
+    race_week = f1.is_f1_race_week(date_)
+    return race_week, await get_week_embeds(date_, race_week, subscriptions_)
+
+
+def get_week_image(date_: datetime.date, race_week: bool, subscription: dict) -> str:
+    """Returns the image file for a channel's week embed, generated from the schedule index: the race week image
+    with the week's sessions below it, or the no race week image with the number of weeks until the next race
+    week (see images.py). The plain image if the channel has 'generated_images' turned off or the index has
+    nothing for the week. Blocking, since a new image is rendered."""
+    image = subscription["race_week_image" if race_week else "no_race_week_image"]
+    if not subscription.get("generated_images", True):
+        return image
+
+    if race_week:
+        event = schedule_index.find_week_event(date_)
+        series = [providers.PROVIDERS[key].name for key in subscription["series"] if key in providers.PROVIDERS]
+        days = schedule_index.get_event_days(event, series) if event else []
+        if not days:
+            return image
+        norwegian = subscription["language"].lower() == "norwegian"
+        rows = [
+            (
+                util.day_to_norwegian(day) if norwegian else day,
+                [(time, f"{session.series} {session.name}") for time, session in sessions],
+            )
+            for day, sessions in days
+        ]
+        return images.render_schedule_image(image, rows, logger)
 
-        activity = discord.Activity(
-            type=discord.ActivityType.watching, name=f"nothing for {until_next_race}..."
-        )
-        await bot.change_presence(status=discord.Status.online, activity=activity)
+    event = schedule_index.find_next_event(date_)
+    if event is None:
+        return image
+    weeks = (util.get_sunday_date_object(event.sunday) - util.get_sunday_date_object(date_)).days // 7
+    return images.render_countdown_image(image, weeks, logger) if weeks > 0 else image
 
 
 async def send_week_embed(
-    date_: datetime.date, emoji_race_week=None, emoji_no_race_week=None
+    date_: datetime.date,
+    channel_id: int,
+    embed: discord.Embed,
+    race_week: bool,
+    subscription: dict,
 ):
-    """Sends an embed for the week, either embed for race week or non race week."""
+    """Sends the weeks embed in the given channel, either embed for race week or non race week.
+    The posted message is stored in the bot state so it can be fetched directly later."""
+    channel = get_channel(channel_id)
+    send = partial(queued_send, channel)
+    image = await bot.loop.run_in_executor(None, get_week_image, date_, race_week, subscription)
+
     # If its race week post the times, if not then post no. of weeks until next race week
-    if f1.is_f1_race_week(date_):
-        race_week_image = util.get_json_data("race_week_image")
-        file = discord.File(race_week_image, filename="race.png")
-        embed = await get_race_week_embed(date_)
-        message = await bot.get_channel(CHANNEL_ID).send(file=file, embed=embed)
-        if emoji_race_week is not None:
-            await message.add_reaction(emoji_race_week)
-
-    else:  # if not race week then post no. weeks until next race week
-        # Count how many weeks until next race week
-        embed = await get_no_race_week_embed(date_)
-        if not embed:  # no embed returned
-            logger.error(
-                "send_week_embed(): No embed returned for no race week from get_no_race_week_embed()."
-                " sending no embed."
+    if race_week:
+        message = await images.send_embed_with_image(channel, embed, image, "race.png", send)
+        emoji = subscription["race_week_emoji"]
+    else:
+        message = await images.send_embed_with_image(channel, embed, image, "norace.png", send)
+        emoji = subscription["no_race_week_emoji"]
+
+    if emoji:
+        await outbound_queue.submit(
+            f"reaction:{channel_id}", lambda: message.add_reaction(emoji)
+        )
+
+    state.set_posted_message(
+        channel_id,
+        message.id,
+        state.get_iso_week(date_),
+        state.get_embed_hash(embed),
+        image_hash=images.get_file_hash(image),
+    )
+
+
+async def edit_week_embed(
+    date_: datetime.date,
+    channel_id: int,
+    message: discord.Message,
+    new_embed: discord.Embed,
+    race_week: bool,
+    subscription: dict,
+):
+    """Edits an already sent weeks embed. Skips the edit if the content is unchanged.
+    A message edit can't upload a new image, so if the week image changed (e.g. an F2 time is known now) it is only
+    swapped in when it has a reusable cdn url from an earlier upload, otherwise the message keeps its image."""
+    image = await bot.loop.run_in_executor(None, get_week_image, date_, race_week, subscription)
+    image_hash = images.get_file_hash(image)
+    posted = state.get_posted_message(channel_id)
+    if posted and posted["message_id"] != str(message.id):
+        posted = None
+    shown_hash = posted.get("image_hash") if posted else None
+
+    url = images.get_cached_image_url(image) if shown_hash != image_hash else None
+    if url:
+        new_embed.set_image(url=url)
+        shown_hash = image_hash
+    elif message.embeds and message.embeds[0].image.url:
+        # Keep the image already shown in the message, it may be a reused cdn url instead of an attachment
+        new_embed.set_image(url=message.embeds[0].image.url)
+
+    new_hash = state.get_embed_hash(new_embed)
+    if posted and posted["content_hash"] == new_hash and not url:
+        logger.info(
+            f"edit_week_embed(): Embed content unchanged in channel {channel_id}, skipping edit."
+        )
+        metrics.inc("embed_edits_skipped")
+        return
+
+    await queued_edit(message, embed=new_embed)
+    state.set_posted_message(
+        channel_id, message.id, state.get_iso_week(date_), new_hash, image_hash=shown_hash
+    )
+
+
+async def get_previous_bot_message(
+    channel_id: int, max_messages=15
+) -> Union[discord.Message, None]:
+    """Returns the discord.Message for the last weekly embed the bot sent in the given channel.
+    Fetches the message stored in the bot state directly, and only falls back to checking up to
+    given number of previous messages in the channel history if nothing is stored or the message is gone."""
+    channel = get_channel(channel_id)
+
+    posted = state.get_posted_message(channel_id)
+    if posted:
+        try:
+            message = await channel.fetch_message(int(posted["message_id"]))
+            metrics.inc("cache_hits", cache="posted_message")
+            return message
+        except discord.NotFound:
+            logger.warning(
+                "get_previous_bot_message(): Stored message was not found, clearing it and checking channel history."
+            )
+            state.clear_posted_message(channel_id)
+        except discord.HTTPException as e:
+            logger.warning(
+                f"get_previous_bot_message(): Fetching stored message failed ({e}), checking channel history."
             )
-            return
 
-        no_race_week_image = util.get_json_data("no_race_week_image")
-        file = discord.File(no_race_week_image, filename="norace.png")
+    metrics.inc("cache_misses", cache="posted_message")
+    bot_id = int(
+        util.get_json_data("bot_id")
+    )  # the bots user id to check the previous messages
+    async for msg in channel.history(limit=max_messages):
+        if msg.author.id == bot_id:
+            return msg
 
-        message = await bot.get_channel(CHANNEL_ID).send(file=file, embed=embed)
-        if emoji_no_race_week is not None:
-            await message.add_reaction(emoji_no_race_week)
+    logger.warning(
+        f"get_previous_bot_message(): No previous bot message found in channel {channel_id}, returning None."
+    )
 
 
-async def edit_week_embed(date_: datetime.date):
-    """Edits an already sent weeks embed."""
-    message = await get_previous_bot_message()
-    if f1.is_f1_race_week(date_):
-        new_embed = await get_race_week_embed(date_)
+async def execute_channel_week_embed(
+    date_: datetime.date,
+    channel_id: int,
+    embed: discord.Embed,
+    race_week: bool,
+    subscription: dict,
+) -> None:
+    """Checks if the bot has sent an embed the week of the given date in the given channel.
+    If so then update and edit the embed, if not then send a new embed."""
+    # Retrieves the previous bot message. The stored week is used if the message is known in
+    # the bot state, otherwise the week of the message creation date
+    message = await get_previous_bot_message(channel_id)
+    posted = state.get_posted_message(channel_id)
+    if message and posted and posted["message_id"] == str(message.id):
+        prev_week = posted["week"]
+    elif message:
+        prev_week = state.get_iso_week(message.created_at.date())
+    else:
+        prev_week = None
+
+    # If it has posted this week and its a race week: only edit the embed to update f2 times
+    posted_cond = state.get_iso_week(date_) == prev_week  # is same week as prev post?
+
+    if posted_cond:  # same week then edit the embed
+        await edit_week_embed(date_, channel_id, message, embed, race_week, subscription)
+
+    # if not same week: post new embed and save date
+    else:
+        await send_week_embed(date_, channel_id, embed, race_week, subscription)
+
+
+def is_week_embed_posted(date_: datetime.date) -> bool:
+    """Returns True if all the enabled channels have the embed of the week of the given date posted."""
+    week = state.get_iso_week(date_)
+    return all(
+        (state.get_posted_message(channel_id) or {}).get("week") == week
+        for channel_id in subscriptions.get_enabled_subscriptions()
+    )
+
+
+async def execute_week_embed(model: Union[dict, None] = None) -> None:
+    """Computes the weeks embed once and sends or edits it in all subscribed channels concurrently,
+    with at most MAX_CONCURRENT_CHANNELS channels at a time. Raises RuntimeError if any of the
+    channels failed, after all the others are done.
+    A shard process passes the week 'model' from the shared cache instead, and only posts in its own channels."""
+    today = clock.today()
+    subscriptions_ = subscriptions.get_enabled_subscriptions()
+    if model is None:
+        race_week, embeds = await get_current_week_embeds(today, subscriptions_)
     else:
-        new_embed = await get_no_race_week_embed(date_)
-        if not new_embed:
+        # The gateway only delivers the guilds of this shard, so the other channels are unknown here
+        subscriptions_ = {
+            channel_id: subscription
+            for channel_id, subscription in subscriptions_.items()
+            if bot.get_channel(int(channel_id)) is not None
+        }
+        race_week = model["race_week"]
+        embeds = shared_cache.get_embeds(model)
+
+    semaphore = Semaphore(MAX_CONCURRENT_CHANNELS)
+
+    async def channel_task(channel_id: str, subscription: dict) -> None:
+        embed = embeds.get(subscriptions.get_render_key(subscription))
+        if not embed:  # no embed returned
             logger.error(
-                "edit_week_embed(): No embed returned for no race week from get_no_race_week_embed()."
-                " editing no embed."
+                f"execute_week_embed(): No embed for channel {channel_id}, sending/editing no embed."
             )
             return
-    await message.edit(embed=new_embed)
+        async with semaphore:
+            await execute_channel_week_embed(
+                today, int(channel_id), embed.copy(), race_week, subscription
+            )
 
+    channel_ids = list(subscriptions_.keys())
+    results = await gather(
+        *(channel_task(channel_id, subscriptions_[channel_id]) for channel_id in channel_ids),
+        return_exceptions=True,
+    )
 
-async def get_previous_bot_message(max_messages=15) -> Union[discord.Message, None]:
-    """Returns the discord.Message for the last message the bot sent, checks up to given
-    number of previous messages."""
-    bot_id = util.get_json_data(
-        "bot_id"
-    )  # the bots user id to check the previous messages
-    prev_msgs = (
-        await bot.get_channel(CHANNEL_ID).history(limit=max_messages).flatten()
-    )  # list of prev messages
-    if not prev_msgs:
-        logger.warning(
-            "get_previous_bot_message(): No previous messages found in channel, returning None early."
+    failed = []
+    for channel_id, result in zip(channel_ids, results):
+        if isinstance(result, Exception):
+            logger.error(
+                f"execute_week_embed(): Failed in channel {channel_id}: {type(result)}: {result}"
+            )
+            failed.append(channel_id)
+    if failed:
+        raise RuntimeError(
+            f"execute_week_embed(): Failed in {len(failed)}/{len(channel_ids)} channels: {failed}"
         )
-        return
-
-    prev_ids = [
-        str(msg.author.id) for msg in prev_msgs
-    ]  # list of the user ids for all prev messages
 
-    if bot_id in prev_ids:
-        index = prev_ids.index(bot_id)  # first index of last bot msg
-        return prev_msgs[index]
 
+def warm_up() -> None:
+    """Imports the heavy f1/f2 modules and loads this years f1 schedule into the fastf1 cache.
+    Blocking, so it is run in a background thread."""
+    global f1, f2
+    f1 = importlib.import_module("formula1")
+    f2 = importlib.import_module("formula2")
+    f1.get_remaining_dates(clock.today())
+
+
+async def wait_for_warm_up() -> None:
+    """Starts warm_up() in a background thread if it isn't yet, and waits until it is done. Nothing touches the
+    f1/f2 modules before that, so the event loop never imports them itself or races the thread importing them."""
+    global warm_up_future
+    if warm_up_future is None:
+        warm_up_future = bot.loop.run_in_executor(None, warm_up)
+    await shield(warm_up_future)
+
+
+async def before_command(ctx) -> None:
+    """Runs before every command, commands use the f1/f2 modules so they wait for the warm-up."""
+    await wait_for_warm_up()
+
+
+async def run_refresh(force_scrape: bool = False) -> None:
+    """Runs one full refresh: fetches the series schedules that need it, or all if 'force_scrape' (see
+    refresh_providers()), rebuilds the schedule index, sends/edits the weekly embeds if anything changed, and updates the status
+    message. Calendar changes reschedule the reminders (see on_calendar_changes()).
+    Holds the lock so only one refresh can post at a time."""
+    botlog.new_run_id()
+    async with lock:
+        with metrics.timed("refresh"):
+            await _run_refresh(force_scrape)
+
+    # Log the durations of this refresh's stages
+    stages = {}
+    for stage in ["refresh", "providers", "week_embed", "schedule_index", "shared_cache"]:
+        summary = metrics.get_summary("stage_duration_seconds", stage=stage)
+        if summary:
+            stages[stage] = round(summary[4], 4)
+    logger.info("Refresh complete", extra={"stages": stages, "force_scrape": force_scrape})
+
+
+async def _run_refresh(force_scrape: bool) -> None:
+    """See run_refresh()."""
+    global week_embed_dirty
+    await wait_for_warm_up()
+    if role == "shard":
+        await run_shard_refresh()
+        return
 
-async def execute_week_embed() -> None:
-    """Checks if the bot has sent an embed the week of the given date.
-    If so then update and edit the embed, if not then send a new embed."""
-    today = datetime.now().date()
+    now = clock.now()
+    today = now.date()
 
     # Check if new year, archive f2 calendar json
     if "01-01" in str(today):
         util.archive_json("data/f2_calendar.json")
 
-    # Retrieves the previous bot message. If a message is not found, it sets the date as 8 days before today
-    message = await get_previous_bot_message()
-    if message:
-        prev_date = message.created_at.date()
+    # Storing the f2 calendar publishes any changes, see on_calendar_changes(). Skipped if the pre-render stage
+    # just fetched the schedules for this refresh
+    if not force_scrape and is_prefetched(now):
+        logger.info("Schedules fetched by the pre-render stage, skipping fetch")
     else:
-        prev_date = today - timedelta(days=8)
+        await refresh_providers(now, force_scrape)
 
-    # If it has posted this week and its a race week: only edit the embed to update f2 times
-    posted_cond = util.get_sunday_date_str(today) == util.get_sunday_date_str(
-        prev_date
-    )  # is same week as prev post?
+    await rebuild_schedule_index()
 
-    if posted_cond:  # same week then edit the embed
-        await edit_week_embed(today)
+    if role == "refresher":
+        with metrics.timed("shared_cache"):
+            await write_shared_cache(today)
+        return
 
-    # if not same week: post new embed and save date
+    # Weekly embed, only rendered again if something changed or a channel is missing this week's embed
+    # (or on a forced refresh from the update command)
+    if force_scrape or week_embed_dirty or not is_week_embed_posted(today):
+        with metrics.timed("week_embed"):
+            await execute_week_embed()
+        week_embed_dirty = False
     else:
-        race_week_emoji = util.get_json_data("race_week_emoji")
-        no_race_week_emoji = util.get_json_data("no_race_week_emoji")
-        await send_week_embed(today, race_week_emoji, no_race_week_emoji)
+        logger.info("No calendar changes and the week embeds are posted, skipping week embed")
+        metrics.inc("week_embeds_skipped")
 
+    # Session reminders of the new week, changed times are rescheduled when the calendar changes
+    if reminders_week != state.get_iso_week(today):
+        load_reminders()
 
-async def status() -> None:
-    """Updates weekly embed and status message, calling execute_week_embed() and
-    update_status_message(), every day at scheduled time (global variable). It
-    does the update once before starting the schedule loop."""
+    # Status message once per refresh, needs the gateway
+    if role == "single":
+        await update_status_message()
 
-    async def status_task():
-        """The task to schedule"""
-        # Lock the critical status task with asyncio.Lock()
-        # This will hopefully prevent multiple embeds being posted at the same time
+
+async def refresh_providers(now: datetime, force: bool = False) -> None:
+    """Fetches the schedules of all the series providers that need it (or all if 'force') concurrently,
+    each in a thread since fetching is blocking, then stores them. The http requests of all providers share
+    one connection pool and cache (see fetch.py), so more series dont add up the refresh time.
+    Raises RuntimeError if any provider failed, after storing the others."""
+    due = [provider for provider in providers.get_providers() if force or provider.needs_fetch(now)]
+    for provider in providers.get_providers():
+        if provider not in due:
+            logger.info(f"{provider.name} schedule is up to date, skipping fetch")
+            metrics.inc("provider_fetches_skipped", series=provider.key)
+
+    async def fetch(provider: providers.SeriesProvider):
+        with metrics.timed("provider_fetch", series=provider.key):
+            return await bot.loop.run_in_executor(None, provider.fetch, logger)
+
+    with metrics.timed("providers"):
+        results = await gather(*(fetch(provider) for provider in due), return_exceptions=True)
+
+    failed = []
+    for provider, result in zip(due, results):
+        if isinstance(result, Exception):
+            logger.error(
+                f"refresh_providers(): Fetching {provider.name} failed: {type(result)}: {result}"
+            )
+            failed.append(provider.name)
+            continue
+        provider.store(result, now, logger)
+    if failed:
+        raise RuntimeError(f"refresh_providers(): Failed for {failed}")
+
+
+def is_prefetched(now: datetime) -> bool:
+    """Returns True if the pre-render stage fetched the schedules less than PRERENDER_MINUTES ago."""
+    return prerendered_week is not None and now - prerendered_week.fetched <= timedelta(minutes=PRERENDER_MINUTES)
+
+
+async def prerender_week_embeds(date_: datetime.date) -> None:
+    """Warm-up stage before the scheduled refresh: fetches the schedules that need it, rebuilds the schedule index
+    and renders the week embeds of the given date, stored with their data version. The scheduled refresh then
+    only checks they are still fresh and sends them (see get_current_week_embeds()).
+    Failing only leaves the work to the scheduled refresh."""
+    global prerendered_week
+    botlog.new_run_id()
+    try:
+        await wait_for_warm_up()
         async with lock:
-            # Log start of task
-            logger.info("Status task starting")
+            with metrics.timed("prerender"):
+                now = clock.now()
+                await refresh_providers(now)
+                await rebuild_schedule_index()
+                version = get_week_data_version()
+                race_week = f1.is_f1_race_week(date_)
+                embeds = await get_week_embeds(date_, race_week, subscriptions.get_enabled_subscriptions())
+        prerendered_week = PrerenderedWeek(state.get_iso_week(date_), version, now, race_week, embeds)
+        logger.info(f"Pre-rendered the week embeds of {date_} (data version {version})")
+    except Exception as e:
+        logger.error(f"prerender_week_embeds(): Failed: {type(e)}: {e}")
+
+
+async def rebuild_schedule_index() -> None:
+    """Rebuilds the schedule index used by the query commands and feeds, in a thread since it is blocking.
+    Only rebuilds if the f2 calendar changed or it wasnt rebuilt today. If the schedule data changed the
+    week embeds are rendered again. Failing to rebuild only leaves the old index in place."""
+    global schedule_index_dirty, schedule_index_date, week_embed_dirty
+    today = clock.today()
+    if not schedule_index_dirty and schedule_index_date == today:
+        return
+
+    old_version = schedule_index.get_version()
+    try:
+        with metrics.timed("schedule_index"):
+            await bot.loop.run_in_executor(None, schedule_index.rebuild)
+    except Exception as e:
+        logger.error(f"rebuild_schedule_index(): Failed: {type(e)}: {e}")
+        return
+    schedule_index_dirty, schedule_index_date = False, today
+    if old_version is not None and schedule_index.get_version() != old_version:
+        logger.info("Schedule changed, the week embeds will be rendered again")
+        week_embed_dirty = True
+
+
+async def write_shared_cache(date_: datetime.date) -> None:
+    """Refresher process: renders the week embeds of all the subscribed channels and the status text once,
+    and writes them with the schedule index to the shared cache for the shard processes."""
+    race_week = f1.is_f1_race_week(date_)
+    embeds = await get_week_embeds(date_, race_week, subscriptions.get_enabled_subscriptions())
+    model = shared_cache.build_model(
+        date_,
+        race_week,
+        get_status_text(date_),
+        embeds,
+        schedule_index.serialize_events(schedule_index.get_events()),
+        schedule_index.get_version(),
+    )
+    if shared_cache.write_model(model):
+        logger.info(f"Wrote week model {model['version']} to the shared cache")
+    else:
+        logger.info("Week model unchanged, shared cache not written")
 
-            retries = 0
-            max_retries = 5
-            while True:
-                try:
-                    await update_status_message()
 
-                    f2.store_calendar_to_json(
-                        f2.scrape_calendar(logger)
-                    )  # update the f2 calendar json
+async def run_shard_refresh() -> None:
+    """Shard process: posts the week model written by the refresher process in this shard's channels and loads
+    its schedule index, without fetching anything from upstream. Raises RuntimeError if there is no model
+    of this week yet."""
+    today = clock.today()
+    model = shared_cache.read_model()
+    if model is None or model["week"] != state.get_iso_week(today):
+        raise RuntimeError("run_shard_refresh(): No week model of this week in the shared cache yet")
 
-                    # Weekly embed
-                    await execute_week_embed()
+    await update_status_message(model["presence"])
+    index_changed = model["index_version"] != schedule_index.get_version()
+    if index_changed:
+        schedule_index.load(model["index"], model["index_version"])
 
-                    # Status message
-                    await update_status_message()
+    with metrics.timed("week_embed"):
+        await execute_week_embed(model)
 
-                    # Log end of the task and print to terminal
-                    logmsg = "Status task complete"
-                    print(logmsg + f" {datetime.now()} UTC")
-                    logger.info(logmsg)
-                    break
+    if index_changed or reminders_week != model["week"]:
+        load_reminders()
 
-                # Log exception and add a retry after 10 seconds
-                except Exception as e:
-                    if retries < max_retries:
-                        logger.error(
-                            f"An error occured in status_task ({retries=}): {type(e)}: {e}"
-                        )
 
-                    else:
-                        logger.error("Max retries reached, see error traceback:")
-                        traceback.print_exc(file=open(LOG_FILENAME, "a"))
-                        break
+def start_refresh(force_scrape: bool = False) -> Task:
+    """Returns the in-flight refresh task if there is one, otherwise starts a new refresh in the background.
+    This way concurrent triggers (the status loop and update commands) share one refresh instead
+    of each scraping and posting."""
+    global refresh_task
+    if refresh_task is None or refresh_task.done():
+        refresh_task = bot.loop.create_task(run_refresh(force_scrape))
+    return refresh_task
 
-                    retries += 1
-                    await sleep(10)  # sleep and retry
 
-    # Run the task once, then create the schedule loop
+async def status() -> None:
+    """Updates weekly embed and status message, calling execute_week_embed() and
+    update_status_message(), every day at scheduled time (global variable), and more often
+    during a race week while some F2 session times are unknown (see refresh.py). The F2
+    calendar is only scraped when refresh.needs_scrape() says so. It does the update once
+    before starting the schedule loop. The daily update's embeds are pre-rendered PRERENDER_MINUTES ahead."""
+
+    async def status_task():
+        """The task to schedule"""
+        # Log start of task
+        logger.info("Status task starting")
+
+        retries = 0
+        max_retries = 5
+        while True:
+            try:
+                await start_refresh()
+
+                # Log end of the task
+                logger.info("Status task complete")
+                break
+
+            # Log exception and add a retry after 10 seconds
+            except Exception as e:
+                if retries < max_retries:
+                    logger.error(
+                        f"An error occured in status_task ({retries=}): {type(e)}: {e}"
+                    )
+
+                else:
+                    logger.exception("Max retries reached, see error traceback:")
+                    break
+
+                retries += 1
+                metrics.inc("status_task_retries")
+                await sleep(10)  # sleep and retry
+
+    # Do the heavy imports and schedule loading outside the event loop, then run the task once
+    # and create the schedule loop
+    await wait_for_warm_up()
+    await rebuild_schedule_index()
+    logger.info("Warm-up complete")
     await status_task()
 
     # Start the scheduling loop
-    now = datetime.now()
-    scheduled_time = datetime(
-        now.year, now.month, now.day, scheduled_hour, scheduled_minute
-    )
     while True:
-        # Wait to run until scheduled time
-        now = datetime.now()
-        if now > scheduled_time:
-            scheduled_time += timedelta(
-                days=1
-            )  # if past scheduled time, wait until next day
-
-        seconds = (scheduled_time - now).seconds
+        # Wait to run until next refresh time
+        now = clock.now()
+        scheduled_time = refresh.get_next_refresh_time(
+            now, scheduled_hour, scheduled_minute
+        )
+
+        # Fetch and render ahead of the daily post, the more frequent race week refreshes run as they are
+        prerender_time = scheduled_time - timedelta(minutes=PRERENDER_MINUTES)
+        is_daily_post = (scheduled_time.hour, scheduled_time.minute) == (scheduled_hour, scheduled_minute)
+        if role == "single" and is_daily_post and prerender_time > now:
+            seconds = (prerender_time - now).total_seconds()
+            logger.info(f"Sleeping {seconds} seconds until the pre-render at {prerender_time}")
+            await sleep(seconds)
+            await prerender_week_embeds(scheduled_time.date())
+            now = clock.now()
+
+        seconds = max((scheduled_time - now).total_seconds(), 0)
         logger.info(f"Sleeping {seconds} seconds until {scheduled_time}")
         await sleep(seconds)
         logger.info("Waking up")
         await status_task()
 
 
-@bot.command(aliases=["upd"])
+async def shard_status() -> None:
+    """Shard process version of status(): refreshes whenever the refresher process writes a new week model,
+    checking the shared cache every shared_cache.POLL_SECONDS. A failed refresh is retried at the next check."""
+    version = None
+    while True:
+        model = shared_cache.read_model()
+        if model is not None and model["version"] != version:
+            try:
+                await start_refresh()
+                version = model["version"]
+                logger.info(f"Posted week model {version}")
+            except Exception as e:
+                logger.error(f"An error occured in shard_status: {type(e)}: {e}")
+                metrics.inc("status_task_retries")
+        await sleep(shared_cache.POLL_SECONDS)
+
+
+def is_one_shot_due(now: datetime) -> bool:
+    """One-shot mode: returns True if a refresh is due, on the same schedule as the status loop (the next refresh
+    time is stored in the bot state by run_once()), or if a channel is missing this week's embed.
+    Only reads the state file, so a run with nothing to do exits right away."""
+    next_refresh = state.load_state().get("next_refresh")
+    if next_refresh is None or now >= datetime.fromisoformat(next_refresh):
+        return True
+    return not is_week_embed_posted(now.date())
+
+
+async def run_once(force: bool = False) -> None:
+    """One-shot mode for cron or a systemd timer: if a refresh is due (or 'force'), logs in over REST only, without
+    a gateway connection, fetches the subscribed channels and runs one refresh, sending/editing the week embeds
+    over REST. The posted message ids are stored in the bot state like in the normal mode. Stores when the next
+    refresh is due and returns."""
+    now = clock.now()
+    if not force and not is_one_shot_due(now):
+        logger.info("One-shot: nothing due, exiting")
+        return
+
+    await bot.login(util.get_json_data("bot_token"))
+    try:
+        channel_ids = [int(channel_id) for channel_id in subscriptions.get_enabled_subscriptions()]
+        channels = await gather(*(bot.fetch_channel(channel_id) for channel_id in channel_ids), return_exceptions=True)
+        for channel_id, channel in zip(channel_ids, channels):
+            if isinstance(channel, Exception):
+                logger.error(f"run_once(): Fetching channel {channel_id} failed: {type(channel)}: {channel}")
+                continue
+            rest_channels[channel_id] = channel
+        await run_refresh(force)
+    finally:
+        await bot.close()
+
+    bot_state = state.load_state()
+    bot_state["next_refresh"] = refresh.get_next_refresh_time(
+        clock.now(), scheduled_hour, scheduled_minute
+    ).isoformat()
+    state.save_state(bot_state)
+    logger.info(f"One-shot: done, next refresh due {bot_state['next_refresh']}")
+
+
+async def run_refresher() -> None:
+    """Refresher process of a sharded deployment: runs the status loop without connecting to discord, writing
+    the week models to the shared cache. Also serves the metrics and schedule feeds."""
+    loop_watchdog.start()
+    await start_metrics_server()
+    await status()
+
+
+@commands.command(aliases=["upd"])
 async def update(ctx) -> None:
-    """On recieving update command with the bots prefix, executes the weekly embed send/edit
-    with todays updated info. Also updates the status message just incase.
+    """On recieving update command with the bots prefix, replies right away and executes the weekly
+    embed send/edit with todays updated info in the background, also updating the status message just incase.
+    If a refresh is already running it waits for that one instead of starting another.
+    The reply is edited when the update is done.
     If the command was not in #bot channel, delete both the command message and the reply message.
     """
 
     # Log start
+    botlog.new_run_id()
     logger.info("Update command starting")
 
-    try:
-        f2.store_calendar_to_json(
-            f2.scrape_calendar(logger)
-        )  # update the f2 calendar json
-
-        await execute_week_embed()
-        await update_status_message()
-
-        # send reply message in the same channel
-        msg_channel_id = ctx.message.channel.id
-        reply = await bot.get_channel(msg_channel_id).send("Update done.")
+    msg_channel_id = ctx.message.channel.id
+    joined = refresh_task is not None and not refresh_task.done()
+    task = start_refresh(force_scrape=True)
+
+    # send reply message in the same channel
+    reply = await queued_send(
+        bot.get_channel(msg_channel_id),
+        outbound.PRIORITY_INTERACTIVE,
+        content="Update already running, waiting for it..." if joined else "Updating...",
+    )
 
-        # if its not in the #bot channel, then delete both the user and bots messages after 2 seconds
-        bot_channel_id = int(util.get_json_data("bot_channel_id"))
-        if msg_channel_id != bot_channel_id:
-            await sleep(2)
-            await reply.delete()
-            await ctx.message.delete()
+    try:
+        await shield(task)  # cancelling this command must not cancel the shared refresh
+        await queued_edit(reply, outbound.PRIORITY_INTERACTIVE, content="Update done.")
 
         # Log end
-        logmsg = "Update command executed"
-        print(logmsg + f" {datetime.now()} UTC")
-        logger.info(logmsg)
+        logger.info("Update command executed")
 
     # Log error
     except Exception as e:
-        logger.exception(f"An error occurred in on_ready: {type(e)}: {e}")
+        logger.exception(f"An error occurred in the update command: {type(e)}: {e}")
+        await queued_edit(
+            reply, outbound.PRIORITY_INTERACTIVE, content="An error occurred during the update command."
+        )
+        return
+
+    # if its not in the #bot channel, then delete both the user and bots messages after 2 seconds
+    bot_channel_id = int(util.get_json_data("bot_channel_id"))
+    if msg_channel_id != bot_channel_id:
+        await sleep(2)
+        await queued_delete(reply, outbound.PRIORITY_INTERACTIVE)
+        await queued_delete(ctx.message, outbound.PRIORITY_INTERACTIVE)
 
 
 @update.error
@@ -336,25 +1039,142 @@ async def update_error(ctx, error):
     """Send error in channel on recieved update command when it raises an error"""
     if isinstance(error, commands.CommandError):
         # Handle command-specific errors
-        await ctx.send("An error occurred during the update command.")
+        await queued_send(
+            ctx.channel, outbound.PRIORITY_INTERACTIVE, content="An error occurred during the update command."
+        )
         logger.error(
             f"An error occurred during the update command: {type(error)}: {error}"
         )
 
 
-@bot.command()
+async def reply_query(ctx, kind: str, argument: str = "") -> None:
+    """Replies to a schedule query command from the schedule index, without touching fastf1 or the f2 website."""
+    reply = schedule_index.query(kind, argument)
+    if reply is None:
+        reply = "Kalenderen lastes fortsatt, prøv igjen om litt."
+    await queued_send(ctx.channel, outbound.PRIORITY_INTERACTIVE, content=reply)
+
+
+@commands.command(name="next", aliases=["neste"])
+async def next_race(ctx) -> None:
+    """Bot responds with the sessions of the next race week."""
+    await reply_query(ctx, "next")
+
+
+@commands.command(aliases=["uke"])
+async def week(ctx, date_: str = "") -> None:
+    """Bot responds with the sessions of the week of the given date ('yyyy-mm-dd'), defaults to this week."""
+    await reply_query(ctx, "week", date_)
+
+
+@commands.command(aliases=["økt"])
+async def session(ctx, *, name: str) -> None:
+    """Bot responds with when the next F1 and F2 session with the given name is, e.g. 'qualifying'."""
+    await reply_query(ctx, "session", name)
+
+
+@commands.command(name="f2")
+async def f2_command(ctx) -> None:
+    """Bot responds with the F2 sessions of the next F2 race week."""
+    await reply_query(ctx, "f2")
+
+
+@commands.command()
+async def stats(ctx) -> None:
+    """Bot responds with the timings of the refresh stages and cache hits."""
+    await queued_send(
+        ctx.channel, outbound.PRIORITY_INTERACTIVE, content=metrics.render_stats()
+    )
+
+
+def collect_metrics() -> None:
+    """Updates the gauges that are read on demand, called before the metrics are rendered."""
+    cache_info = schedule_index.get_cache_info()
+    metrics.set_gauge("query_cache_hits", cache_info.hits)
+    metrics.set_gauge("query_cache_misses", cache_info.misses)
+    metrics.set_gauge("query_cache_size", cache_info.currsize)
+    metrics.set_gauge("outbound_queue_length", outbound_queue.pending())
+
+
+metrics.add_collector(collect_metrics)
+
+
+async def start_metrics_server() -> None:
+    """Starts the local metrics endpoint, also serving the schedule feeds, if a 'metrics_port' is set in
+    'discord_data.json'. Only once, on_ready() can be called again on reconnects."""
+    global metrics_runner
+    port = get_optional_json_data("metrics_port")
+    if not port or metrics_runner is not None:
+        return
+    if role == "shard":
+        # The refresher uses the configured port, each shard the ones after it
+        port = int(port) + 1 + bot.shard_id
+    metrics_runner = await metrics.start_http_server(
+        "127.0.0.1", int(port), routes=feeds.get_routes()
+    )
+    logger.info(
+        f"Metrics served on http://127.0.0.1:{port}/metrics, schedule feeds on /schedule.ics and /schedule.json"
+    )
+
+
+@commands.command()
+@commands.is_owner()
+async def profile(ctx) -> None:
+    """Admin only (the bot owner). Runs one dry-run refresh (no posting) under the profiler, in a thread
+    so the bot stays responsive, and replies with the top hot functions and the stats file."""
+    botlog.new_run_id()
+    logger.info("Profile command starting")
+    reply = await queued_send(
+        ctx.channel, outbound.PRIORITY_INTERACTIVE, content="Profiling a dry-run refresh..."
+    )
+    try:
+        stats_filename, report = await bot.loop.run_in_executor(
+            None, profiling.profile_refresh
+        )
+    except Exception as e:
+        logger.exception(f"An error occurred in the profile command: {type(e)}: {e}")
+        await queued_edit(
+            reply, outbound.PRIORITY_INTERACTIVE, content="An error occurred during the profile command."
+        )
+        return
+
+    await queued_edit(
+        reply,
+        outbound.PRIORITY_INTERACTIVE,
+        content=f"```{profiling.get_short_report(report)}```",
+    )
+    await queued_send(
+        ctx.channel,
+        outbound.PRIORITY_INTERACTIVE,
+        file=discord.File(stats_filename, filename=os.path.basename(stats_filename)),
+    )
+    logger.info(f"Profile command executed, stats saved to {stats_filename}")
+
+
+@commands.command()
 async def ping(ctx) -> None:
     """Bot responds "pong" in same channel."""
     msg_channel_id = ctx.message.channel.id
-    await bot.get_channel(msg_channel_id).send("Pong")
-    print("Pong", datetime.now(), "UTC")
+    await queued_send(
+        bot.get_channel(msg_channel_id), outbound.PRIORITY_INTERACTIVE, content="Pong"
+    )
+    logger.info("Pong")
 
 
-@bot.event
 async def on_ready() -> None:
-    """On bot ready, create the status loop task and print to terminal"""
+    """On bot ready, create the status loop task and print to terminal. discord.py calls it again on every
+    reconnect, the loops are only started if they arent running already."""
+    global status_loop, reminder_loop
     try:
-        bot.loop.create_task(status())
+        loop_watchdog.start()
+        if status_loop is None or status_loop.done():
+            status_loop = bot.loop.create_task(shard_status() if role == "shard" else status())
+        bot.loop.create_task(start_metrics_server())
+        reminder_scheduler.minutes_before = int(
+            get_optional_json_data("reminder_minutes", "30")
+        )
+        if get_optional_json_data("reminder_channel_id") and (reminder_loop is None or reminder_loop.done()):
+            reminder_loop = bot.loop.create_task(reminder_scheduler.run())
 
         hour = str(scheduled_hour)
         if len(hour) == 1:
@@ -363,8 +1183,9 @@ async def on_ready() -> None:
         if len(minute) == 1:
             minute = "0" + minute
 
+        channel_ids = list(subscriptions.get_enabled_subscriptions().keys())
         logger.info(
-            f"Bot ready with scheduled_time={hour}:{minute} in channel {CHANNEL_ID}"
+            f"Bot ready with scheduled_time={hour}:{minute} in channels {channel_ids}"
         )
         print("PIERRRE GASLYYYY!")
 
@@ -373,6 +1194,103 @@ async def on_ready() -> None:
         logger.exception(f"An error occurred in on_ready: {type(e)}: {e}")
 
 
-if __name__ == "__main__":
+COMMANDS = [update, next_race, week, session, f2_command, stats, profile, ping]
+
+# The discord client, replaced in main() by a shard's own client in a sharded deployment
+bot = create_bot()
+
+
+def main(args: Union[list[str], None] = None) -> None:
+    """Command line entry point. Runs the bot, or the interactive setup of the json data files with '--setup'."""
+    parser = argparse.ArgumentParser(description="Rawe ceek discord bot")
+    parser.add_argument(
+        "--setup",
+        action="store_true",
+        help="interactively create/fill in the required json data files, then exit",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile one dry-run refresh (nothing is posted), print the hot functions and exit",
+    )
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="run one refresh over REST only (no gateway connection) if it is due, then exit. For cron/systemd timers",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="with --once: refresh and scrape even if nothing is due",
+    )
+    parser.add_argument(
+        "--refresher",
+        action="store_true",
+        help="sharded deployment: only fetch the schedules and write the week models to the shared cache,"
+        " without connecting to discord",
+    )
+    parser.add_argument(
+        "--shard-id",
+        type=int,
+        help="sharded deployment: run as this gateway shard, posting the week models from the shared cache",
+    )
+    parser.add_argument(
+        "--shard-count", type=int, help="sharded deployment: the total number of shard processes"
+    )
+    args = parser.parse_args(args)
+    if args.shard_id is not None and not (args.shard_count and 0 <= args.shard_id < args.shard_count):
+        parser.error("--shard-id needs --shard-count, with 0 <= shard id < shard count")
+
+    if args.profile:
+        stats_filename, report = profiling.profile_refresh()
+        print(report)
+        print(f"Stats saved to {stats_filename}")
+        return
+
+    if args.setup:
+        loop = get_event_loop()
+        try:
+            loop.run_until_complete(util.startup_check())
+        except KeyboardInterrupt:
+            sys.exit(1)
+        return
+
+    missing = util.get_missing_startup_data()
+    if missing:
+        print(
+            f"Missing required data: {missing}. Run 'python3 bot.py --setup' or add them manually.\nExiting..."
+        )
+        sys.exit(1)
+
+    global bot, role
+    if args.once:
+        role = "once"
+        try:
+            bot.loop.run_until_complete(run_once(args.force))
+        except Exception as e:
+            logger.exception(f"An error occurred in the one-shot refresh: {type(e)}: {e}")
+            sys.exit(1)
+        return
+
+    if args.refresher:
+        role = "refresher"
+        set_log_filename("bot_refresher.log")
+        try:
+            bot.loop.run_until_complete(run_refresher())
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if args.shard_id is not None:
+        # Each shard has its own state and log file, the channels of a guild are always on the same shard
+        role = "shard"
+        bot = create_bot(args.shard_id, args.shard_count)
+        state.set_state_filename(f"data/bot_state_shard{args.shard_id}.json")
+        set_log_filename(f"bot_shard{args.shard_id}.log")
+
     # Run bot loop
     bot.run(util.get_json_data("bot_token"))
+
+
+if __name__ == "__main__":
+    main()
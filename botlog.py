@@ -0,0 +1,123 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from typing import Union
+
+# Id of the current run (status refresh, command...), added to every log record logged within it
+run_id_var: ContextVar[Union[str, None]] = ContextVar("run_id", default=None)
+
+# Record attributes that are not copied into the json output as extra fields
+_STANDARD_ATTRIBUTES = set(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "run_id"}
+
+
+def new_run_id() -> str:
+    """Starts a new run and returns its id. Every record logged in the current context (and tasks
+    started from it) after this gets the id."""
+    run_id = uuid.uuid4().hex[:8]
+    run_id_var.set(run_id)
+    return run_id
+
+
+class RunIdFilter(logging.Filter):
+    """Adds the current run id to the records. Runs in the logging thread/task, before the record is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.run_id = run_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one json object per line, with the time, level, message, run id, exception,
+    and any extra fields given like logger.info("...", extra={"duration": 1.2})."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        run_id = getattr(record, "run_id", None)
+        if run_id:
+            data["run_id"] = run_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Queue handler that keeps the extra fields of the records, only turning the message and exception
+    into strings so the record can be formatted later by the background writer."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+def setup_logging(
+    logger: logging.Logger,
+    filename: str,
+    max_bytes: int = 5 * 1024 * 1024,
+    backup_count: int = 3,
+    rotate_when: Union[str, None] = None,
+    console: bool = True,
+) -> QueueListener:
+    """Makes the given logger log through a queue, so logging never blocks the event loop. A background
+    thread writes the records as json lines to the given file, rotated when it reaches 'max_bytes', or at
+    'rotate_when' (e.g. 'midnight', see TimedRotatingFileHandler) if given, keeping 'backup_count' old files.
+    If 'console' the records are also printed to stdout in a short human readable format.
+    Returns the started listener, which is stopped at exit."""
+    if rotate_when:
+        file_handler = TimedRotatingFileHandler(
+            filename, when=rotate_when, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    file_handler.setFormatter(JsonFormatter())
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(
+            logging.Formatter("[%(asctime)s - %(levelname)s] - %(message)s")
+        )
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RunIdFilter())
+    logger.addHandler(queue_handler)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    def stop_listener() -> None:
+        if listener._thread is not None:  # not already stopped
+            listener.stop()
+
+    atexit.register(stop_listener)
+    return listener
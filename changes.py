@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+from typing import Callable, NamedTuple, Union
+
+import clock
+import metrics
+
+# Change log of the f2 calendar, one compact json line per changed session
+CHANGE_LOG_FILENAME = "data/f2_changes.jsonl"
+
+# Session times that are not known yet
+UNKNOWN_TIMES = ["TBC", "N/A"]
+
+
+class SessionChange(NamedTuple):
+    """A change of a single f2 session between the stored and the scraped calendar.
+    'kind' is 'added', 'removed', 'moved' (new day or time) or 'resolved' (the time was unknown before).
+    'old' and 'new' are the (day, time) of the session before and after, None if it didnt exist."""
+
+    event: str
+    session: str
+    kind: str
+    old: Union[tuple[str, ...], None]
+    new: Union[tuple[str, ...], None]
+
+
+# Callbacks called with the list of changes every time the calendar changes, see subscribe()
+_subscribers: list[Callable[[list[SessionChange]], None]] = []
+
+
+def get_event_sessions(f2_event: Union[list, None]) -> dict[str, tuple[str, ...]]:
+    """Returns the sessions of an f2 calendar event mapped by name to their (day, time)."""
+    if not f2_event or not isinstance(f2_event[-1], list):
+        return {}
+    return {
+        session[0]: tuple(session[1:])
+        for session in f2_event[-1]
+        if isinstance(session, list) and session
+    }
+
+
+def diff_event(
+    key: str, old_event: Union[list, None], new_event: Union[list, None]
+) -> list[SessionChange]:
+    """Returns the per session changes between the stored and the new value of an f2 calendar event."""
+    old_sessions = get_event_sessions(old_event)
+    new_sessions = get_event_sessions(new_event)
+    changes = []
+    for name, new in new_sessions.items():
+        old = old_sessions.get(name)
+        if old is None:
+            changes.append(SessionChange(key, name, "added", None, new))
+        elif old != new:
+            resolved = old[-1] in UNKNOWN_TIMES and new[-1] not in UNKNOWN_TIMES
+            changes.append(SessionChange(key, name, "resolved" if resolved else "moved", old, new))
+    for name, old in old_sessions.items():
+        if name not in new_sessions:
+            changes.append(SessionChange(key, name, "removed", old, None))
+    return changes
+
+
+def diff_calendar(old_calendar: dict, new_calendar: dict) -> list[SessionChange]:
+    """Returns the per session changes of all the events in the new calendar."""
+    changes = []
+    for key, new_event in new_calendar.items():
+        changes += diff_event(key, old_calendar.get(key), new_event)
+    return changes
+
+
+def append_change_log(changes: list[SessionChange], filename: str = CHANGE_LOG_FILENAME) -> None:
+    """Appends the changes to the change log."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    time_ = clock.now().isoformat(timespec="seconds")
+    with open(filename, "a", encoding="utf-8") as outfile:
+        for change in changes:
+            line = {"time": time_, **change._asdict()}
+            outfile.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def subscribe(callback: Callable[[list[SessionChange]], None]) -> None:
+    """Registers a callback to be called with the list of changes every time the calendar changes."""
+    _subscribers.append(callback)
+
+
+def publish(changes: list[SessionChange], logger: Union[logging.Logger, None] = None) -> None:
+    """Logs the changes to the change log and calls the subscribers, if there are any changes.
+    A failing subscriber is logged and doesnt stop the others."""
+    if not changes:
+        return
+    append_change_log(changes)
+    for change in changes:
+        metrics.inc("calendar_changes", kind=change.kind)
+    if logger:
+        logger.info(
+            f"F2 calendar changed: {len(changes)} session changes",
+            extra={"changes": [f"{c.event} {c.session}: {c.kind} {c.old} -> {c.new}" for c in changes]},
+        )
+
+    for callback in _subscribers:
+        try:
+            callback(changes)
+        except Exception as e:
+            if logger:
+                logger.exception(f"changes.publish(): Subscriber {callback.__name__} failed: {type(e)}: {e}")
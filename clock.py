@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, tzinfo
+from typing import Iterator, Union
+
+# The fixed local time returned by now() instead of the real time, None to use the real time.
+# Set by the season simulator to replay the bot's decisions on any day.
+_fixed_now: Union[datetime, None] = None
+
+
+def now(tz: Union[tzinfo, None] = None) -> datetime:
+    """Returns the current time, like datetime.now(tz), or the fixed time if one is set."""
+    if _fixed_now is None:
+        return datetime.now(tz)
+    if tz is None:
+        return _fixed_now
+    return _fixed_now.astimezone(tz)
+
+
+def today() -> date:
+    """Returns the current local date, like date.today(), or the date of the fixed time if one is set."""
+    return now().date()
+
+
+def set_now(time_: Union[datetime, None]) -> None:
+    """Fixes the time returned by now() to the given naive local time, or back to the real time if None."""
+    global _fixed_now
+    _fixed_now = time_
+
+
+def advance(delta: timedelta) -> None:
+    """Moves the fixed time forward by the given time. Only valid while a fixed time is set."""
+    if _fixed_now is None:
+        raise RuntimeError("clock.advance(): No fixed time is set.")
+    set_now(_fixed_now + delta)
+
+
+@contextmanager
+def fixed_time(time_: datetime) -> Iterator[None]:
+    """Context manager fixing the time to the given time, restoring the previous time on exit."""
+    previous = _fixed_now
+    set_now(time_)
+    try:
+        yield
+    finally:
+        set_now(previous)
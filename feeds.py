@@ -0,0 +1,218 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+import clock
+import metrics
+import reminders
+import schedule_index
+
+# Assumed session lengths, the schedule only has start times
+RACE_DURATION = timedelta(hours=2)
+SESSION_DURATION = timedelta(hours=1)
+
+# Max number of rendered calendar events to keep, a season has a few hundred sessions
+EVENT_CACHE_SIZE = 1024
+
+ICS_HEADER = [
+    "BEGIN:VCALENDAR",
+    "VERSION:2.0",
+    "PRODID:-//Rawe ceek bot//F1 and F2 schedule//EN",
+    "CALSCALE:GREGORIAN",
+    "METHOD:PUBLISH",
+    "X-WR-CALNAME:F1 og F2",
+]
+
+
+class Feed(NamedTuple):
+    """The rendered feeds of one data version, with the headers used for conditional requests. Each format has
+    its own ETag, since they are different representations."""
+
+    version: str
+    ics: bytes
+    json: bytes
+    ics_etag: str
+    json_etag: str
+    last_modified: datetime
+
+
+# The feeds of the current schedule index version, see get_feed()
+_feed: Union[Feed, None] = None
+_feed_lock = threading.Lock()
+
+
+def get_session_end(session: reminders.Session) -> datetime:
+    """Returns the assumed end time of a session."""
+    if session.name in ["Race", "Feature Race"]:
+        return session.start + RACE_DURATION
+    return session.start + SESSION_DURATION
+
+
+def get_session_uid(session: reminders.Session) -> str:
+    """Returns the calendar uid of a session. It doesnt include the start time, so calendar clients move
+    the existing event when a session is rescheduled instead of adding a new one."""
+    key = f"{session.series}:{session.event_name}:{session.name}"
+    return f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}@raweceek"
+
+
+def escape_ics_text(text: str) -> str:
+    """Escapes text for an ics property value."""
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+    )
+
+
+def fold_ics_line(line: str) -> str:
+    """Folds an ics line into lines of max 75 characters, continuation lines start with a space."""
+    if len(line) <= 75:
+        return line
+    parts = [line[:75]]
+    line = line[75:]
+    while line:
+        parts.append(" " + line[:74])
+        line = line[74:]
+    return "\r\n".join(parts)
+
+
+def format_ics_time(time_: datetime) -> str:
+    return time_.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+@lru_cache(maxsize=EVENT_CACHE_SIZE)
+def render_vevent_properties(session: reminders.Session) -> str:
+    """Returns the ics VEVENT of a session without its DTSTAMP. Cached by the session itself, so when the
+    calendar changes only the changed sessions are rendered again."""
+    lines = [
+        f"UID:{get_session_uid(session)}",
+        f"DTSTART:{format_ics_time(session.start)}",
+        f"DTEND:{format_ics_time(get_session_end(session))}",
+        f"SUMMARY:{escape_ics_text(f'{session.series} {session.name} - {session.event_name}')}",
+        f"CATEGORIES:{session.series}",
+        "END:VEVENT",
+    ]
+    return "\r\n".join(fold_ics_line(line) for line in lines)
+
+
+def render_vevent(session: reminders.Session, dtstamp: str) -> str:
+    """Returns the ics VEVENT of a session, 'dtstamp' is the formatted time the feed was built."""
+    return f"BEGIN:VEVENT\r\nDTSTAMP:{dtstamp}\r\n{render_vevent_properties(session)}"
+
+
+def get_timed_sessions(event: schedule_index.IndexedEvent) -> list[reminders.Session]:
+    """Returns the sessions of the event with a known start time, the feeds leave out the 'TBC' ones."""
+    return [session for session in event.sessions if not session.unknown]
+
+
+def render_ics(events: tuple[schedule_index.IndexedEvent, ...], built: datetime) -> bytes:
+    """Returns the iCalendar feed of all the sessions of the given events, with 'built' (when the feed was built
+    from the schedule index) as the DTSTAMP of the events."""
+    dtstamp = format_ics_time(built)
+    lines = ICS_HEADER.copy()
+    for event in events:
+        lines += [render_vevent(session, dtstamp) for session in get_timed_sessions(event)]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def render_json(events: tuple[schedule_index.IndexedEvent, ...], version: str) -> bytes:
+    """Returns the json feed of all the sessions of the given events, grouped by event."""
+    data = {
+        "version": version,
+        "events": [
+            {
+                "name": event.name,
+                "sunday": event.sunday.isoformat(),
+                "sessions": [
+                    {
+                        "series": session.series,
+                        "name": session.name,
+                        "start": session.start.isoformat(),
+                        "end": get_session_end(session).isoformat(),
+                    }
+                    for session in get_timed_sessions(event)
+                ],
+            }
+            for event in events
+        ],
+    }
+    return json.dumps(data, ensure_ascii=False, indent=1).encode("utf-8")
+
+
+def get_etag(body: bytes) -> str:
+    """Returns the quoted ETag of a feed body."""
+    return f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def get_feed() -> Union[Feed, None]:
+    """Returns the feeds of the current schedule index, or None if the index isn't built yet.
+    The feeds are only rendered again when the index data version changes."""
+    global _feed
+    version = schedule_index.get_version()
+    if version is None:
+        return None
+    with _feed_lock:
+        if _feed is None or _feed.version != version:
+            with metrics.timed("feed_render"):
+                events = schedule_index.get_events()
+                built = clock.now(timezone.utc).replace(microsecond=0)
+                ics = render_ics(events, built)
+                json_ = render_json(events, version)
+                _feed = Feed(version, ics, json_, get_etag(ics), get_etag(json_), built)
+        return _feed
+
+
+def is_not_modified(headers, feed: Feed, kind: str) -> bool:
+    """Returns True if the request headers show the client already has this version of the 'ics' or 'json' feed."""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        etag = getattr(feed, f"{kind}_etag")
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return feed.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def make_handler(kind: str):
+    """Returns an aiohttp handler serving the 'ics' or 'json' feed, with ETag and Last-Modified headers,
+    answering 304 Not Modified when the client already has the current version."""
+    from aiohttp import web
+
+    content_types = {"ics": "text/calendar", "json": "application/json"}
+
+    async def handler(request):
+        feed = get_feed()
+        if feed is None:
+            metrics.inc("feed_requests", feed=kind, status="503")
+            return web.Response(status=503, text="Schedule not loaded yet")
+
+        headers = {
+            "ETag": getattr(feed, f"{kind}_etag"),
+            "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+            "Cache-Control": "public, max-age=300",
+        }
+        if is_not_modified(request.headers, feed, kind):
+            metrics.inc("feed_requests", feed=kind, status="304")
+            return web.Response(status=304, headers=headers)
+
+        metrics.inc("feed_requests", feed=kind, status="200")
+        return web.Response(
+            body=getattr(feed, kind),
+            headers=headers,
+            content_type=content_types[kind],
+            charset="utf-8",
+        )
+
+    return handler
+
+
+def get_routes() -> dict:
+    """Returns the feed routes for metrics.start_http_server()."""
+    return {"/schedule.ics": make_handler("ics"), "/schedule.json": make_handler("json")}
@@ -0,0 +1,117 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Union
+from urllib.parse import urlparse
+
+import clock
+import metrics
+
+# Max number of concurrent http requests, shared by all the series providers
+MAX_CONNECTIONS = 8
+
+# Seconds before an http request times out
+REQUEST_TIMEOUT = 30
+
+# Seconds a fetched page is reused without asking the server again. Older pages are revalidated with
+# their ETag/Last-Modified, so an unchanged page costs a 304 instead of the whole body.
+DEFAULT_MAX_AGE = 60
+
+
+class Response(NamedTuple):
+    """A fetched page. 'from_cache' is True if the body came from the cache (fresh or revalidated)."""
+
+    status_code: int
+    content: bytes
+    from_cache: bool
+
+
+class CacheEntry(NamedTuple):
+    fetched: float
+    etag: Union[str, None]
+    last_modified: Union[str, None]
+    content: bytes
+
+
+# Shared http session and thread pool, created on first use, see get_session() and get_pool()
+_session = None
+_pool = None
+_init_lock = threading.Lock()
+
+# Fetched pages mapped by url
+_cache: dict[str, CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    """Returns the shared requests session, with a connection pool sized for MAX_CONNECTIONS."""
+    global _session
+    with _init_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_CONNECTIONS, pool_maxsize=MAX_CONNECTIONS)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """Returns the shared thread pool the requests are made in."""
+    global _pool
+    with _init_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_CONNECTIONS, thread_name_prefix="fetch")
+        return _pool
+
+
+def get(url: str, max_age: float = DEFAULT_MAX_AGE) -> Response:
+    """Fetches a page through the shared session and cache. Blocking.
+    A cached page younger than 'max_age' seconds is returned without a request, an older one is revalidated."""
+    host = urlparse(url).netloc
+    with _cache_lock:
+        cached = _cache.get(url)
+    if cached and clock.now().timestamp() - cached.fetched < max_age:
+        metrics.inc("cache_hits", cache="http")
+        return Response(200, cached.content, True)
+
+    headers = {}
+    if cached and cached.etag:
+        headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        headers["If-Modified-Since"] = cached.last_modified
+
+    with metrics.timed("http_fetch", host=host):
+        response = get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    metrics.inc("http_requests", host=host, status=response.status_code)
+    metrics.inc("http_bytes", len(response.content), host=host)
+
+    if response.status_code == 304 and cached:
+        metrics.inc("cache_hits", cache="http")
+        with _cache_lock:
+            _cache[url] = cached._replace(fetched=clock.now().timestamp())
+        return Response(200, cached.content, True)
+
+    metrics.inc("cache_misses", cache="http")
+    if 200 <= response.status_code < 300:
+        response_headers = getattr(response, "headers", None) or {}
+        with _cache_lock:
+            _cache[url] = CacheEntry(
+                clock.now().timestamp(),
+                response_headers.get("ETag"),
+                response_headers.get("Last-Modified"),
+                response.content,
+            )
+    return Response(response.status_code, response.content, False)
+
+
+def get_many(urls: list[str], max_age: float = DEFAULT_MAX_AGE) -> list[Response]:
+    """Fetches the pages concurrently in the shared thread pool, returns the responses in the same order.
+    Blocking. Raises the first request error, if any."""
+    return list(get_pool().map(lambda url: get(url, max_age), urls))
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
@@ -1,18 +1,20 @@
 import datetime
 import json
 import logging
+import time
 from typing import Union
 
-import requests
 from bs4 import BeautifulSoup
 
+import changes
+import fetch
+import metrics
 from util import (
     local_time_to_oslo,
     file_exists,
     update_f2cal_json,
     format_date,
     extract_json_data,
-    get_sunday_date_str,
     get_sunday_date_object,
     get_event_date_str,
     get_json_data,
@@ -34,10 +36,13 @@ def scrape_calendar(logger: Union[logging.Logger, None] = None) -> F2CalendarTyp
     race_ids_json_filename = "data/f2_race_ids.json"
     first_race_id = int(get_json_data("f2_first_raceid", file=race_ids_json_filename))
     last_race_id = int(get_json_data("f2_last_raceid", file=race_ids_json_filename))
-    for i in range(first_race_id, last_race_id + 1):
-        url = f"https://www.fiaformula2.com/Results?raceid={i}"
-        response = requests.get(url)
-
+    urls = [
+        f"https://www.fiaformula2.com/Results?raceid={i}"
+        for i in range(first_race_id, last_race_id + 1)
+    ]
+    # Fetch all the race pages concurrently through the shared http pool and cache
+    responses = fetch.get_many(urls)
+    for url, response in zip(urls, responses):
         # response is not ok -> skip this race event
         if not 200 <= response.status_code < 300:
             if logger:
@@ -46,6 +51,7 @@ def scrape_calendar(logger: Union[logging.Logger, None] = None) -> F2CalendarTyp
                 )
             continue
 
+        parse_start = time.perf_counter()
         soup = BeautifulSoup(response.content, "html.parser")
 
         try:
@@ -70,9 +76,9 @@ def scrape_calendar(logger: Union[logging.Logger, None] = None) -> F2CalendarTyp
                     continue
                 if len(race) > 0:
                     if len(race) == 3:
-                        time = race[2]
-                        if time != "TBC":
-                            start, stop = time.split("-")
+                        session_time = race[2]
+                        if session_time != "TBC":
+                            start, stop = session_time.split("-")
                             start = local_time_to_oslo(start, country)
                             stop = local_time_to_oslo(stop, country)
                             race[2] = f"{start}-{stop}"
@@ -87,6 +93,8 @@ def scrape_calendar(logger: Union[logging.Logger, None] = None) -> F2CalendarTyp
                         elif jrace[0] != "0":  # missing beginning zero
                             jrace = "0" + jrace
                     race[j] = jrace
+                # Sessions with a 'TBC' time are kept too, so the week embed and the schedule index show them
+                if len(race) == 3:
                     races.append(race)
 
             f2_events[raceday] = [round_number.strip(), country, circuit, date, races]
@@ -94,26 +102,37 @@ def scrape_calendar(logger: Union[logging.Logger, None] = None) -> F2CalendarTyp
         except AttributeError:  # catch exception for if race weekend has been cancelled
             continue
 
+        finally:
+            metrics.observe(
+                "stage_duration_seconds", time.perf_counter() - parse_start, stage="f2_parse"
+            )
+
     return f2_events
 
 
 def store_calendar_to_json(
-    calendar: F2CalendarType, json_file: str = "data/f2_calendar.json"
-) -> None:
+    calendar: F2CalendarType,
+    json_file: str = "data/f2_calendar.json",
+    logger: Union[logging.Logger, None] = None,
+) -> list[changes.SessionChange]:
     """Saves f2 calendar data taken from scrape_calendar() and saves it to a json file.
     Used to store old timing data since the timings dissapear on the f2 website as soon as the first weeks event starts.
+    The per session changes are published to the change subscribers (see changes.py) and returned.
     """
     if not file_exists(json_file):
         with open(json_file, "w") as outfile:
             json.dump(calendar, outfile, indent=3)
+        calendar_changes = changes.diff_calendar({}, calendar)
     else:
-        update_f2cal_json(calendar, json_file)
+        calendar_changes = update_f2cal_json(calendar, json_file)
+    changes.publish(calendar_changes, logger)
+    return calendar_changes
 
 
 def extract_days(
-    event: "fastf1.events.Event", f2_calendar: F2CalendarType
+    event: "season.EventRecord", f2_calendar: F2CalendarType
 ) -> Union[dict, dict[str, list[list[str]]]]:
-    """Extracts and sorts from dictionary the F2 sessions of given event as fastf1.Event object.
+    """Extracts and sorts from dictionary the F2 sessions of the week of the given f1 event record.
     Returns a dictionary mapping session days to session names and times.
     """
     event_date = get_event_date_str(event)
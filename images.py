@@ -0,0 +1,295 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from functools import lru_cache
+from typing import Awaitable, Callable, Union
+from urllib.parse import parse_qs, urlparse
+
+import discord
+
+import clock
+import metrics
+import state
+
+# Folder for the size-optimized image variants
+IMAGE_CACHE_FOLDER = "data/cache/images"
+
+# Largest width of the optimized images, discord embeds never show images much wider than this
+MAX_IMAGE_WIDTH = 800
+
+# Number of colors in the optimized (palette) png images
+IMAGE_COLORS = 128
+
+# Seconds before a discord cdn url expires that we stop reusing it and upload the image again
+URL_EXPIRY_MARGIN = 6 * 3600
+
+# Version of the drawing code of the generated images, bump it when changing how they look so the cached
+# images are rendered again
+RENDER_VERSION = 1
+
+# Colors and font of the generated images
+BACKGROUND_COLOR = (21, 21, 30)
+TEXT_COLOR = (255, 255, 255)
+ACCENT_COLOR = (225, 6, 0)
+MUTED_COLOR = (170, 170, 185)
+FONT_FILENAMES = {True: "DejaVuSans-Bold.ttf", False: "DejaVuSans.ttf"}
+
+# (time, title) of the sessions of a day, as shown in the schedule image
+DayRowsType = list[tuple[str, list[tuple[str, str]]]]
+
+
+def get_file_hash(filename: str) -> str:
+    """Returns a short hash of the content of a file."""
+    with open(filename, "rb") as infile:
+        return hashlib.sha256(infile.read()).hexdigest()[:16]
+
+
+def get_optimized_image(filename: str) -> str:
+    """Returns the filename of a size-optimized variant of the given image, which is created once and cached
+    in IMAGE_CACHE_FOLDER. Falls back to the original image if Pillow is not installed or the image
+    can't be optimized, or if the variant is not smaller than the original."""
+    try:
+        import PIL  # noqa
+    except ImportError:  # Pillow is optional
+        return filename
+    if os.path.dirname(filename) == IMAGE_CACHE_FOLDER:  # already optimized, e.g. a generated image
+        return filename
+
+    settings = f"{MAX_IMAGE_WIDTH}-{IMAGE_COLORS}"
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    optimized = f"{IMAGE_CACHE_FOLDER}/{stem}-{get_file_hash(filename)}-{settings}.png"
+    if os.path.exists(optimized):
+        return optimized
+
+    try:
+        save_optimized_png(load_image(filename), optimized)
+    except OSError:
+        return filename
+
+    if os.path.getsize(optimized) >= os.path.getsize(filename):
+        os.remove(optimized)
+        return filename
+    return optimized
+
+
+def load_image(filename: str) -> "Image.Image":
+    """Returns the image as RGB, scaled down to MAX_IMAGE_WIDTH if it is wider."""
+    from PIL import Image
+
+    with Image.open(filename) as image:
+        image = image.convert("RGB")
+    if image.width > MAX_IMAGE_WIDTH:
+        height = round(image.height * MAX_IMAGE_WIDTH / image.width)
+        image = image.resize((MAX_IMAGE_WIDTH, height), Image.LANCZOS)
+    return image
+
+
+def save_optimized_png(image: "Image.Image", filename: str) -> None:
+    """Saves the image as a palette png with IMAGE_COLORS colors. Writes to a temporary file of its own first, so
+    a half written image is never used from the cache and concurrent renders of the same image dont collide."""
+    folder = os.path.dirname(filename)
+    os.makedirs(folder, exist_ok=True)
+    handle, temp_file = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as outfile:
+            image.quantize(colors=IMAGE_COLORS).save(outfile, format="PNG", optimize=True)
+        os.replace(temp_file, filename)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+def get_generated_filename(kind: str, base_filename: str, content) -> str:
+    """Returns the cache filename of a generated image, keyed by everything it is drawn from, so each distinct
+    image is only rendered once and reused across weeks and channels."""
+    key_content = json.dumps(
+        [RENDER_VERSION, MAX_IMAGE_WIDTH, IMAGE_COLORS, get_file_hash(base_filename), content]
+    )
+    key = hashlib.sha256(key_content.encode("utf-8")).hexdigest()[:16]
+    return f"{IMAGE_CACHE_FOLDER}/{kind}-{key}.png"
+
+
+@lru_cache(maxsize=16)
+def get_font(size: int, bold: bool = True) -> "ImageFont.ImageFont":
+    """Returns the font of the generated images in the given pixel size, Pillow's default font if it isn't installed."""
+    from PIL import ImageFont
+
+    try:
+        return ImageFont.truetype(FONT_FILENAMES[bold], size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow before 10.1 has no sized default font
+            return ImageFont.load_default()
+
+
+def fit_text(draw: "ImageDraw.ImageDraw", text: str, font: "ImageFont.ImageFont", width: int) -> str:
+    """Returns the text shortened with '…' to fit in the given width."""
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def get_generated_image(
+    kind: str, base_filename: str, content, draw_image: Callable, logger: Union[logging.Logger, None] = None
+) -> str:
+    """Returns the cached generated image of the given kind and content, drawing it with draw_image(base image,
+    content) the first time. Falls back to the base image if Pillow is not installed or drawing fails."""
+    try:
+        import PIL  # noqa
+    except ImportError:  # Pillow is optional
+        return base_filename
+
+    filename = get_generated_filename(kind, base_filename, content)
+    if os.path.exists(filename):
+        metrics.inc("cache_hits", cache="generated_image")
+        return filename
+    metrics.inc("cache_misses", cache="generated_image")
+
+    try:
+        with metrics.timed("image_render", kind=kind):
+            save_optimized_png(draw_image(load_image(base_filename), content), filename)
+    except Exception as e:
+        if logger:
+            logger.error(f"images.get_generated_image(): Drawing the {kind} image failed: {type(e)}: {e}")
+        return base_filename
+    return filename
+
+
+def draw_countdown(image: "Image.Image", weeks: int) -> "Image.Image":
+    """Draws the number of weeks in the bottom right corner of the image, outlined so it reads on any image."""
+    from PIL import ImageDraw
+
+    draw = ImageDraw.Draw(image)
+    size = max(image.height // 3, 12)
+    font = get_font(size)
+    stroke = max(size // 16, 2)
+    margin = size // 5
+    left, top, right, bottom = draw.textbbox((0, 0), str(weeks), font=font, stroke_width=stroke)
+    position = (image.width - right - margin, image.height - bottom - margin)
+    draw.text(position, str(weeks), font=font, fill=TEXT_COLOR, stroke_width=stroke, stroke_fill=BACKGROUND_COLOR)
+    return image
+
+
+def draw_schedule(image: "Image.Image", days: DayRowsType) -> "Image.Image":
+    """Returns the image with a grid of the sessions below it: a column per day with each session's time and title."""
+    from PIL import Image, ImageDraw
+
+    unit = max(image.width // 40, 8)  # font size of the session titles, the rest is sized from it
+    padding = unit
+    columns = max(len(days), 1)
+    column_width = (image.width - padding) // columns
+    rows = max((len(sessions) for _, sessions in days), default=0)
+    row_height = unit * 3
+    header_height = unit * 2
+    height = image.height + padding * 2 + header_height + rows * row_height
+
+    grid = Image.new("RGB", (image.width, height), BACKGROUND_COLOR)
+    grid.paste(image, (0, 0))
+    draw = ImageDraw.Draw(grid)
+    day_font, time_font, title_font = get_font(unit + 2), get_font(unit), get_font(unit, bold=False)
+    text_width = column_width - padding
+    for column, (day, sessions) in enumerate(days):
+        x = padding + column * column_width
+        y = image.height + padding
+        draw.text((x, y), fit_text(draw, day.upper(), day_font, text_width), font=day_font, fill=ACCENT_COLOR)
+        y += header_height
+        for time, title in sessions:
+            draw.text((x, y), time, font=time_font, fill=TEXT_COLOR)
+            draw.text((x, y + unit + 2), fit_text(draw, title, title_font, text_width), font=title_font, fill=MUTED_COLOR)
+            y += row_height
+    return grid
+
+
+def render_countdown_image(base_filename: str, weeks: int, logger: Union[logging.Logger, None] = None) -> str:
+    """Returns an image file with the number of weeks until the next race week drawn on the given image.
+    Rendered once per distinct image and count and cached in IMAGE_CACHE_FOLDER. Blocking."""
+    return get_generated_image("countdown", base_filename, weeks, draw_countdown, logger)
+
+
+def render_schedule_image(
+    base_filename: str, days: DayRowsType, logger: Union[logging.Logger, None] = None
+) -> str:
+    """Returns an image file with the given race week sessions, as (day, [(time, title)]), in a grid below the given
+    image. Rendered once per distinct image and schedule and cached in IMAGE_CACHE_FOLDER. Blocking."""
+    return get_generated_image("schedule", base_filename, days, draw_schedule, logger)
+
+
+def get_url_expiry(url: str) -> Union[int, None]:
+    """Returns the unix expiry time of a discord cdn attachment url from its 'ex' query parameter
+    (hex timestamp). Returns None if the url has no expiry."""
+    ex = parse_qs(urlparse(url).query).get("ex")
+    if not ex:
+        return None
+    try:
+        return int(ex[0], 16)
+    except ValueError:
+        return None
+
+
+def get_cached_image_url(filename: str) -> Union[str, None]:
+    """Returns an already uploaded discord cdn url for the given image if one is stored and it is not
+    about to expire. Returns None if the image has to be uploaded."""
+    image_urls = state.load_state().get("image_urls", {})
+    url = image_urls.get(get_file_hash(filename))
+    if not url:
+        return None
+
+    expiry = get_url_expiry(url)
+    if expiry is not None and expiry - clock.now().timestamp() < URL_EXPIRY_MARGIN:
+        return None
+    return url
+
+
+def store_image_url(filename: str, url: str) -> None:
+    """Stores the discord cdn url of an uploaded image so later embeds can reuse it."""
+    bot_state = state.load_state()
+    bot_state.setdefault("image_urls", {})[get_file_hash(filename)] = url
+    state.save_state(bot_state)
+
+
+def get_uploaded_url(message: discord.Message) -> Union[str, None]:
+    """Returns the cdn url of the image uploaded with the given message, or None if it has no image."""
+    if message.embeds and message.embeds[0].image.url:
+        url = message.embeds[0].image.url
+        if not url.startswith("attachment://"):
+            return url
+    if message.attachments:
+        return message.attachments[0].url
+
+
+async def send_embed_with_image(
+    channel: discord.abc.Messageable,
+    embed: discord.Embed,
+    image_filename: str,
+    attachment_name: str,
+    send: Union[Callable[..., Awaitable[discord.Message]], None] = None,
+) -> discord.Message:
+    """Sends an embed with the given image. Reuses the cdn url of an earlier upload of the same image
+    if it is still valid, otherwise uploads the optimized variant of the image and stores its url.
+    Optional argument 'send' is the function used to send the message, defaults to channel.send."""
+    if send is None:
+        send = channel.send
+
+    url = get_cached_image_url(image_filename)
+    if url:
+        metrics.inc("cache_hits", cache="image_url")
+        embed.set_image(url=url)
+        return await send(embed=embed)
+    metrics.inc("cache_misses", cache="image_url")
+
+    # Load the image into memory, so the file can be sent again if the first attempt gets rate limited
+    with open(get_optimized_image(image_filename), "rb") as infile:
+        file = discord.File(io.BytesIO(infile.read()), filename=attachment_name)
+    embed.set_image(url=f"attachment://{attachment_name}")
+    message = await send(file=file, embed=embed)
+
+    uploaded_url = get_uploaded_url(message)
+    if uploaded_url:
+        store_image_url(image_filename, uploaded_url)
+    return message
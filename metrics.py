@@ -0,0 +1,186 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Union
+
+# Prefix of all exported metric names
+METRIC_PREFIX = "raweceek_"
+
+LabelsType = tuple[tuple[str, str], ...]
+
+_lock = threading.Lock()  # metrics are also recorded from executor threads
+_counters: dict[tuple[str, LabelsType], float] = {}
+_gauges: dict[tuple[str, LabelsType], float] = {}
+_summaries: dict[tuple[str, LabelsType], list[float]] = {}  # [count, sum, min, max, last]
+_collectors: list[Callable[[], None]] = []
+
+
+def _key(name: str, labels: dict[str, str]) -> tuple[str, LabelsType]:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    """Increases a counter, e.g. inc("http_requests", status="200")."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Sets a gauge to the given value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Records a value (e.g. a duration in seconds) in a summary with count, sum, min, max and last value."""
+    key = _key(name, labels)
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            _summaries[key] = [1, value, value, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = min(summary[2], value)
+            summary[3] = max(summary[3], value)
+            summary[4] = value
+
+
+@contextmanager
+def timed(stage: str, **labels) -> Iterator[None]:
+    """Context manager recording the duration of a pipeline stage in the 'stage_duration_seconds' summary.
+    Failed runs are counted in 'stage_errors'. Works in both regular and async functions."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc("stage_errors", stage=stage, **labels)
+        raise
+    finally:
+        observe("stage_duration_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+
+def get_summary(name: str, **labels) -> Union[list[float], None]:
+    """Returns [count, sum, min, max, last] of a summary, or None if nothing is recorded."""
+    with _lock:
+        summary = _summaries.get(_key(name, labels))
+        return list(summary) if summary else None
+
+
+def get_counter(name: str, **labels) -> float:
+    """Returns the value of a counter."""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def add_collector(collector: Callable[[], None]) -> None:
+    """Adds a function that is called before the metrics are rendered, to update gauges of things that
+    are cheaper to read on demand than to track continuously (e.g. cache sizes)."""
+    _collectors.append(collector)
+
+
+def collect() -> None:
+    """Calls all the collectors."""
+    for collector in _collectors:
+        collector()
+
+
+def reset() -> None:
+    """Removes all recorded metrics."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _summaries.clear()
+
+
+def _format_labels(labels: LabelsType) -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render_prometheus() -> str:
+    """Returns all metrics in the prometheus text exposition format."""
+    collect()
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = sorted(_gauges.items())
+        summaries = sorted(_summaries.items())
+
+    typed = set()
+    for (name, labels), value in counters:
+        metric = METRIC_PREFIX + name + "_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (name, labels), value in gauges:
+        metric = METRIC_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} gauge")
+            typed.add(metric)
+        lines.append(f"{metric}{_format_labels(labels)} {value}")
+    for (name, labels), (count, total, _, _, _) in summaries:
+        metric = METRIC_PREFIX + name
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} summary")
+            typed.add(metric)
+        lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+    # min, max and last values are exported as separate gauges, the summary type only allows count and sum
+    for index, stat in [(2, "min"), (3, "max"), (4, "last")]:
+        for (name, labels), summary in summaries:
+            metric = f"{METRIC_PREFIX}{name}_{stat}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {summary[index]}")
+    return "\n".join(lines) + "\n"
+
+
+def render_stats() -> str:
+    """Returns a short human readable summary of the stage timings, for the stats command."""
+    collect()
+    with _lock:
+        stages = [
+            (dict(labels).get("stage"), summary)
+            for (name, labels), summary in sorted(_summaries.items())
+            if name == "stage_duration_seconds"
+        ]
+    if not stages:
+        return "Ingen målinger enda."
+    lines = ["```", f"{'stage':<24}{'count':>7}{'avg ms':>10}{'max ms':>10}{'last ms':>10}"]
+    for stage, (count, total, _, maximum, last) in stages:
+        lines.append(
+            f"{stage:<24}{int(count):>7}{total / count * 1000:>10.1f}{maximum * 1000:>10.1f}{last * 1000:>10.1f}"
+        )
+    lines.append("")
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            if name.startswith("cache_"):
+                lines.append(f"{name} {dict(labels).get('cache')}: {int(value)}")
+    lines.append("```")
+    return "\n".join(lines)
+
+
+async def start_http_server(
+    host: str = "127.0.0.1", port: int = 9108, routes: Union[dict, None] = None
+) -> "aiohttp.web.AppRunner":
+    """Starts a local http server in the running event loop serving the metrics on '/metrics'.
+    'routes' can map extra paths to aiohttp handlers. Returns the runner, to stop it call runner.cleanup()."""
+    from aiohttp import web
+
+    async def metrics_handler(request):
+        return web.Response(
+            text=render_prometheus(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    for path, handler in (routes or {}).items():
+        app.router.add_get(path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
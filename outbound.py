@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Union
+
+import discord
+
+import metrics
+
+# Priorities for queued operations, lower runs first
+PRIORITY_INTERACTIVE = 0  # replies to commands
+PRIORITY_BACKGROUND = 10  # scheduled posts, edits and presence updates
+
+# discord.py already follows discord's rate limit headers per route and retries 429 responses itself, so the
+# queue only orders and coalesces the operations. Optional local limits (number of requests, per seconds) for
+# route types can be passed to OutboundQueue, routes without one are not limited.
+# Known limits are still worth passing: discord.py waits out a rate limit inside the operation, which would hold
+# an in flight slot and block operations on other routes meanwhile, while a locally limited job waits in the queue.
+DEFAULT_ROUTE_LIMITS = {"send": (5, 5.0)}  # discord allows 5 messages per 5 seconds per channel
+
+
+class RouteBucket:
+    """Token bucket for one discord route, e.g. sending messages in one channel. Without a limit it only
+    keeps the operations of the route in order."""
+
+    __slots__ = ("limit", "period", "tokens", "updated", "busy")
+
+    def __init__(self, limit: Union[int, None], period: float, now: float):
+        self.limit = limit
+        self.period = period
+        self.tokens = float(limit or 0)
+        self.updated = now
+        self.busy = False  # only one operation per route is in flight at a time
+
+    def refill(self, now: float) -> None:
+        """Adds the tokens regained since the last refill."""
+        if self.limit is None:
+            return
+        self.tokens = min(
+            self.limit, self.tokens + (now - self.updated) * self.limit / self.period
+        )
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Returns seconds until an operation can run on this route, zero if it can run now."""
+        if self.limit is None:
+            return 0.0
+        self.refill(now)
+        if self.tokens < 1:
+            return (1 - self.tokens) * self.period / self.limit
+        return 0.0
+
+    def take(self) -> None:
+        """Uses one token."""
+        if self.limit is not None:
+            self.tokens -= 1
+
+
+class OutboundJob:
+    """A queued discord operation. 'futures' are resolved with the result of the operation, there are
+    more than one if superseded operations were coalesced into this one."""
+
+    __slots__ = ("priority", "seq", "route", "operation", "coalesce_key", "futures", "superseded")
+
+    def __init__(self, priority, seq, route, operation, coalesce_key, futures):
+        self.priority = priority
+        self.seq = seq
+        self.route = route
+        self.operation = operation
+        self.coalesce_key = coalesce_key
+        self.futures = futures
+        self.superseded = False
+
+
+def get_route_type(route: str) -> str:
+    """Returns the type of a route string formatted like 'send:<channel id>', e.g. 'send'."""
+    return route.split(":")[0]
+
+
+class OutboundQueue:
+    """Central queue for all outbound discord operations. Operations run in priority order, one at a time
+    per route so one busy channel doesnt hold back the others, optionally limited by 'route_limits'
+    (see above). 'clock' returns the seconds the local limits are measured in. 'reserved_interactive' of the
+    'max_in_flight' slots are kept for interactive operations, so command replies never wait for background work.
+    Queued operations with the same coalesce key are superseded by the last one submitted, e.g. two
+    presence updates or two edits of the same message only send the last one."""
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        logger: Union[logging.Logger, None] = None,
+        route_limits: Union[dict[str, tuple[int, float]], None] = None,
+        clock: Callable[[], float] = time.monotonic,
+        reserved_interactive: int = 1,
+    ):
+        self.max_in_flight = max_in_flight
+        self.reserved_interactive = reserved_interactive
+        self.logger = logger
+        self.route_limits = route_limits or {}
+        self.clock = clock
+        self._jobs = []
+        self._pending_by_key = {}
+        self._buckets = {}
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+
+    def pending(self) -> int:
+        """Returns the number of queued operations that havent started, not counting superseded ones."""
+        return sum(1 for job in self._jobs if not job.superseded)
+
+    def running(self) -> int:
+        """Returns the number of operations in flight."""
+        return self._in_flight
+
+    def _get_bucket(self, route: str) -> RouteBucket:
+        bucket = self._buckets.get(route)
+        if bucket is None:
+            limit, period = self.route_limits.get(get_route_type(route), (None, 0.0))
+            bucket = self._buckets[route] = RouteBucket(limit, period, self.clock())
+        return bucket
+
+    def _ensure_started(self) -> None:
+        """Starts the dispatcher task on first use, so the queue can be created before the event loop runs."""
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_event_loop().create_task(self._dispatch())
+
+    def submit_nowait(
+        self,
+        route: str,
+        operation: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_BACKGROUND,
+        coalesce_key: Union[str, None] = None,
+    ) -> asyncio.Future:
+        """Queues an operation and returns a future for its result without waiting for it.
+        'operation' is a function returning the coroutine to run, e.g. 'lambda: channel.send(...)'."""
+        self._ensure_started()
+        future = asyncio.get_event_loop().create_future()
+        futures = [future]
+
+        if coalesce_key is not None:
+            old_job = self._pending_by_key.get(coalesce_key)
+            if old_job is not None:
+                # The old operation is superseded, its waiters get the result of the new one
+                old_job.superseded = True
+                futures = old_job.futures + futures
+                priority = min(priority, old_job.priority)
+
+        job = OutboundJob(
+            priority, next(self._seq), route, operation, coalesce_key, futures
+        )
+        if coalesce_key is not None:
+            self._pending_by_key[coalesce_key] = job
+        self._jobs.append(job)
+        if len(futures) > 1:
+            metrics.inc("discord_api_coalesced", route=get_route_type(route))
+        self._wakeup.set()
+        return future
+
+    async def submit(
+        self,
+        route: str,
+        operation: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_BACKGROUND,
+        coalesce_key: Union[str, None] = None,
+    ) -> Any:
+        """Queues an operation and waits for its result. See submit_nowait()."""
+        return await self.submit_nowait(route, operation, priority, coalesce_key)
+
+    def _pop_ready_job(self, now: float, background: bool = True) -> tuple[Union[OutboundJob, None], float]:
+        """Removes and returns the highest priority job whose route is free, only an interactive one unless
+        'background', and the seconds until the next blocked job can run (only used when no job is ready)."""
+        self._jobs = [job for job in self._jobs if not job.superseded]
+        ready = None
+        next_wait = float("inf")
+        for job in self._jobs:
+            if not background and job.priority > PRIORITY_INTERACTIVE:
+                continue
+            bucket = self._get_bucket(job.route)
+            if bucket.busy:
+                continue
+            wait = bucket.wait_time(now)
+            if wait > 0:
+                next_wait = min(next_wait, wait)
+            elif ready is None or (job.priority, job.seq) < (ready.priority, ready.seq):
+                ready = job
+        if ready is not None:
+            self._jobs.remove(ready)
+            if self._pending_by_key.get(ready.coalesce_key) is ready:
+                del self._pending_by_key[ready.coalesce_key]
+        return ready, next_wait
+
+    async def _dispatch(self) -> None:
+        """Runs queued jobs as their routes allow it, forever."""
+        while True:
+            self._wakeup.clear()
+            job, next_wait = None, None
+            if self._in_flight < self.max_in_flight:
+                background = self._in_flight < self.max_in_flight - self.reserved_interactive
+                job, next_wait = self._pop_ready_job(self.clock(), background)
+
+            if job is None:
+                timeout = next_wait if next_wait not in (None, float("inf")) else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            bucket = self._get_bucket(job.route)
+            bucket.take()
+            bucket.busy = True
+            self._in_flight += 1
+            asyncio.get_event_loop().create_task(self._run(job, bucket))
+
+    async def _run(self, job: OutboundJob, bucket: RouteBucket) -> None:
+        """Runs one job and resolves its futures. Rate limited requests were already retried by discord.py,
+        so errors are passed on to the waiters."""
+        route_type = get_route_type(job.route)
+        try:
+            with metrics.timed("discord_api", route=route_type):
+                result = await job.operation()
+        except discord.HTTPException as e:
+            metrics.inc("discord_api_errors", route=route_type, status=e.status)
+            if self.logger and e.status == 429:
+                self.logger.warning(f"OutboundQueue: Still rate limited on route '{job.route}' after retrying.")
+            self._set_exception(job, e)
+        except Exception as e:
+            self._set_exception(job, e)
+        else:
+            for future in job.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            bucket.busy = False
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    @staticmethod
+    def _set_exception(job: OutboundJob, exception: Exception) -> None:
+        for future in job.futures:
+            if not future.done():
+                future.set_exception(exception)
+        # Mark the exception as retrieved if nobody waits for it (e.g. presence updates)
+        for future in job.futures:
+            if not future.cancelled():
+                future.exception()
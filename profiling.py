@@ -0,0 +1,79 @@
+import cProfile
+import io
+import os
+import pstats
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Union
+
+import clock
+import providers
+import subscriptions
+import util
+
+# Folder the profile stats files are saved in
+PROFILES_FOLDER = "data/profiles"
+
+# Number of functions listed in the profile report
+TOP_FUNCTIONS = 25
+
+
+def dry_run_refresh(date_: datetime.date) -> None:
+    """Runs the same data path as a status refresh: fetches the schedules of all the series providers, merges
+    the f2 calendar into a temporary copy of the stored calendar and renders the week embed texts for all
+    subscriptions, with fastf1 lookups. Nothing is stored and nothing is sent to discord."""
+    import formula1 as f1
+
+    fetched = {provider.key: provider.fetch() for provider in providers.get_providers()}
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, "f2_calendar.json")
+        if "f2" in fetched and util.file_exists("data/f2_calendar.json"):
+            shutil.copy("data/f2_calendar.json", filename)
+            util.update_f2cal_json(fetched["f2"], filename)
+
+    if f1.is_f1_race_week(date_):
+        render_keys = {
+            subscriptions.get_render_key(subscription)
+            for subscription in subscriptions.get_enabled_subscriptions().values()
+        }
+        for language, series in render_keys:
+            f1.get_all_week_info(date_, language=language, series=series)
+    else:
+        f1.until_next_race_week(date_)
+        f1.get_next_week_event(date_)
+
+
+def profile_refresh(
+    date_: Union[datetime.date, None] = None, sort: str = "cumulative"
+) -> tuple[str, str]:
+    """Runs dry_run_refresh() under cProfile. Saves the stats to a '.prof' file in PROFILES_FOLDER (open it
+    with e.g. snakeviz or pstats) and returns its filename and a text report of the top hot functions."""
+    if date_ is None:
+        date_ = clock.today()
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        dry_run_refresh(date_)
+    finally:
+        profiler.disable()
+
+    os.makedirs(PROFILES_FOLDER, exist_ok=True)
+    stats_filename = f"{PROFILES_FOLDER}/refresh_{clock.now().strftime('%Y%m%d_%H%M%S')}.prof"
+    profiler.dump_stats(stats_filename)
+
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.strip_dirs().sort_stats(sort).print_stats(TOP_FUNCTIONS)
+    return stats_filename, report.getvalue()
+
+
+def get_short_report(report: str, max_length: int = 1900) -> str:
+    """Returns the function table of a pstats report cut to fit in a discord message."""
+    start = report.find("ncalls")
+    if start != -1:
+        report = report[start:]
+    if len(report) > max_length:
+        report = report[:max_length].rsplit("\n", 1)[0]
+    return report
@@ -0,0 +1,218 @@
+import calendar
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple, Union
+
+import pytz
+
+import clock
+import reminders
+import season
+import util
+
+
+class DaySession(NamedTuple):
+    """A session as shown in the week embed: the english week day, the time in Oslo time ('HH:MM',
+    'HH:MM-HH:MM', or 'TBC'/'N/A' if unknown) and the discord formatted title."""
+
+    day: str
+    time: str
+    title: str
+
+
+class SeriesProvider:
+    """A racing series the bot shows sessions of. A provider fetches the series schedule, normalises its
+    sessions and says if a week is a race week for the series.
+    To add a series subclass this, register() an instance and add its key to subscriptions.SUPPORTED_SERIES.
+    The race weeks are the f1 race weeks, the other series' sessions are shown in the f1 week they are in."""
+
+    # Key used in the subscriptions, e.g. 'f1'
+    key = ""
+    # Series name used in the session titles, e.g. 'F1'
+    name = ""
+
+    def needs_fetch(self, now: datetime) -> bool:
+        """Returns True if the schedule should be fetched from upstream now."""
+        return True
+
+    def fetch(self, logger: Union[logging.Logger, None] = None) -> Any:
+        """Fetches the schedule from upstream and returns it for store(). Blocking, it is run in a thread
+        concurrently with the other providers, so it shouldnt change any shared state."""
+        raise NotImplementedError
+
+    def store(self, data: Any, now: datetime, logger: Union[logging.Logger, None] = None) -> None:
+        """Stores the fetched schedule. Called in the event loop after fetch()."""
+
+    def is_race_week(self, date_: datetime.date) -> bool:
+        """Returns True if the series races in the week of the given date."""
+        raise NotImplementedError
+
+    def get_sessions(self, event: season.EventRecord, include_unknown: bool = False) -> list[reminders.Session]:
+        """Returns the sessions of the series in the week of the given f1 event with known start times, and with
+        'include_unknown' also the ones whose times arent known yet (see reminders.Session)."""
+        raise NotImplementedError
+
+    def get_day_sessions(self, event: season.EventRecord) -> list[DaySession]:
+        """Returns the sessions of the series in the week of the given f1 event as shown in the week embed."""
+        raise NotImplementedError
+
+
+class F1Provider(SeriesProvider):
+    """Formula 1, from fastf1."""
+
+    key = "f1"
+    name = "F1"
+
+    def needs_fetch(self, now: datetime) -> bool:
+        import refresh
+
+        return refresh.needs_f1_fetch(now)
+
+    def fetch(self, logger: Union[logging.Logger, None] = None) -> tuple[season.EventRecord, ...]:
+        # This years schedule as compact records, the lookups after this are local
+        return season.build_season(clock.today().year)
+
+    def store(
+        self, data: tuple[season.EventRecord, ...], now: datetime, logger: Union[logging.Logger, None] = None
+    ) -> None:
+        season.set_season(now.year, data)
+
+    def is_race_week(self, date_: datetime.date) -> bool:
+        import formula1 as f1
+
+        return f1.is_f1_race_week(date_)
+
+    def get_sessions(self, event: season.EventRecord, include_unknown: bool = False) -> list[reminders.Session]:
+        """Returns all the non-practice F1 sessions of the given event, their times are always known."""
+        return [
+            reminders.Session(session.start, self.name, session.name, event.name)
+            for session in event.sessions
+        ]
+
+    def get_day_sessions(self, event: season.EventRecord) -> list[DaySession]:
+        oslo = pytz.timezone("Europe/Oslo")
+        sessions = []
+        for session in event.sessions:
+            title = "**F1 Feature Race**" if session.name == "Race" else f"F1 {session.name}"
+            time = session.start.astimezone(oslo).strftime("%H:%M")
+            sessions.append(DaySession(session.day, time, title))
+        return sessions
+
+
+class F2Provider(SeriesProvider):
+    """Formula 2, scraped from fiaformula2.com into 'data/f2_calendar.json'."""
+
+    key = "f2"
+    name = "F2"
+
+    def needs_fetch(self, now: datetime) -> bool:
+        import refresh
+
+        return refresh.needs_scrape(now)
+
+    def fetch(self, logger: Union[logging.Logger, None] = None) -> util.F2CalendarType:
+        import formula2 as f2
+
+        return f2.scrape_calendar(logger)
+
+    def store(
+        self, data: util.F2CalendarType, now: datetime, logger: Union[logging.Logger, None] = None
+    ) -> None:
+        import formula2 as f2
+        import refresh
+
+        # Publishes any calendar changes, see changes.py
+        f2.store_calendar_to_json(data, logger=logger)
+        refresh.mark_scraped(now)
+
+    def is_race_week(self, date_: datetime.date) -> bool:
+        import formula2 as f2
+
+        return f2.is_f2_race_week(date_)
+
+    def get_days(self, event: season.EventRecord) -> dict[str, list[list[str]]]:
+        """Returns the f2 sessions of the week of the given event mapped by day, {} if f2 doesnt race then."""
+        import formula2 as f2
+
+        return f2.extract_days(event, util.extract_json_data()) or {}
+
+    def get_sessions(self, event: season.EventRecord, include_unknown: bool = False) -> list[reminders.Session]:
+        """Returns all the F2 sessions of the given event that have a known start time. Sessions still
+        'TBC' or 'N/A' are left out until the calendar is updated with their times, unless 'include_unknown'."""
+        sunday = util.get_event_date_object(event)
+        oslo = pytz.timezone("Europe/Oslo")
+        day_names = list(calendar.day_name)
+        sessions = []
+        for day_name, day_sessions in self.get_days(event).items():
+            if day_name not in day_names:
+                continue
+            day = sunday - timedelta(days=6 - day_names.index(day_name))
+            for name, time in day_sessions:
+                if time in ["TBC", "N/A"]:
+                    if include_unknown:
+                        start = oslo.localize(datetime(day.year, day.month, day.day)).astimezone(timezone.utc)
+                        sessions.append(reminders.Session(start, self.name, name, event.name, time))
+                    continue
+                hour, minute = time.split("-")[0].split(":")
+                start = oslo.localize(
+                    datetime(day.year, day.month, day.day, int(hour), int(minute))
+                ).astimezone(timezone.utc)
+                sessions.append(reminders.Session(start, self.name, name, event.name))
+        return sessions
+
+    def get_day_sessions(self, event: season.EventRecord) -> list[DaySession]:
+        if not self.is_race_week(str(util.get_event_date_object(event))):
+            return []
+        f2_days = self.get_days(event)
+
+        # If this triggers, then the f2 event has started and the calendar
+        # has no timing data for the event, so we just return n/a timings
+        if f2_days and ("Sunday" not in f2_days and "Saturday" not in f2_days):
+            f2_days = {  # default dict with n/a times
+                "Friday": [["Qualifying Session", "N/A"]],
+                "Saturday": [["Sprint Race", "N/A"]],
+                "Sunday": [["Feature Race", "N/A"]],
+            }
+
+        sessions = []
+        for day, day_sessions in f2_days.items():
+            for name, time in day_sessions:
+                if name == "Feature Race":
+                    title = "**F2 Feature Race**"
+                elif name == "Qualifying Session":
+                    title = "F2 Qualifying"
+                else:
+                    title = f"F2 {name}"
+                sessions.append(DaySession(day, time, title))
+        return sessions
+
+
+# The registered providers mapped by key, in the order their sessions are listed
+PROVIDERS: dict[str, SeriesProvider] = {}
+
+
+def register(provider: SeriesProvider) -> None:
+    """Registers a series provider."""
+    PROVIDERS[provider.key] = provider
+
+
+def get_providers(keys: Union[list[str], tuple[str, ...], None] = None) -> list[SeriesProvider]:
+    """Returns the registered providers with the given keys, or all of them."""
+    return [provider for key, provider in PROVIDERS.items() if keys is None or key in keys]
+
+
+def get_week_sessions(
+    event: season.EventRecord,
+    keys: Union[list[str], tuple[str, ...], None] = None,
+    include_unknown: bool = False,
+) -> list[reminders.Session]:
+    """Returns the sessions of all the given providers in the week of the given f1 event, sorted by start time.
+    With 'include_unknown' also the sessions whose times arent known yet, first on their day."""
+    sessions = []
+    for provider in get_providers(keys):
+        sessions += provider.get_sessions(event, include_unknown)
+    return sorted(sessions)
+
+
+register(F1Provider())
+register(F2Provider())
@@ -0,0 +1,129 @@
+import json
+from datetime import datetime, timedelta
+from typing import Union
+
+import season
+import state
+import util
+
+# Hours between F2 scrapes during a race week while some session times are still unknown
+RACE_WEEK_PENDING_REFRESH_HOURS = 3
+
+# Days between F2 scrapes when no upcoming event is waiting for its session times
+IDLE_SCRAPE_DAYS = 7
+
+# Days ahead an F2 event has to be for its missing session times to be scraped daily
+UPCOMING_EVENT_DAYS = 7
+
+
+def get_f2_event_status(f2_event: Union[list, None]) -> str:
+    """Returns the timing status of an f2 calendar event: 'none' if there is no event, 'pending' if
+    the session times are missing or some are still 'TBC'/'N/A', or 'final' if all times are known."""
+    if not f2_event:
+        return "none"
+    sessions = f2_event[-1]
+    if not sessions:
+        return "pending"
+    for session in sessions:
+        if len(session) < 3 or session[-1] in ["TBC", "N/A"]:
+            return "pending"
+    return "final"
+
+
+def get_week_f2_event(
+    date_: datetime.date, f2_calendar: util.F2CalendarType
+) -> Union[list, None]:
+    """Returns the stored f2 calendar event of the week of the given date, or None if there is none."""
+    sunday = util.get_sunday_date_object(date_)
+    saturday = sunday - timedelta(days=1)
+    return f2_calendar.get(util.format_date(sunday)) or f2_calendar.get(
+        util.format_date(saturday)
+    )
+
+
+def load_f2_calendar() -> util.F2CalendarType:
+    """Returns the stored f2 calendar, or an empty calendar if it hasnt been stored yet."""
+    if not util.file_exists("data/f2_calendar.json"):
+        return {}
+    try:
+        return util.extract_json_data()
+    except json.JSONDecodeError:
+        return {}
+
+
+def get_last_scrape() -> Union[datetime, None]:
+    """Returns when the f2 calendar was last scraped, or None if it never was."""
+    last_scrape = state.load_state().get("last_scrape")
+    if last_scrape:
+        return datetime.fromisoformat(last_scrape)
+
+
+def mark_scraped(now: datetime) -> None:
+    """Stores the time of an f2 calendar scrape."""
+    bot_state = state.load_state()
+    bot_state["last_scrape"] = now.isoformat()
+    state.save_state(bot_state)
+
+
+def needs_scrape(now: datetime, f2_calendar: Union[util.F2CalendarType, None] = None) -> bool:
+    """Returns True if the f2 calendar should be scraped now, decided from the stored calendar:
+    during a race week while any session time is still unknown; daily when next week's event has no times
+    yet; otherwise only once every IDLE_SCRAPE_DAYS days."""
+    if f2_calendar is None:
+        f2_calendar = load_f2_calendar()
+    last_scrape = get_last_scrape()
+    if not f2_calendar or last_scrape is None:
+        return True
+
+    today = now.date()
+    week_status = get_f2_event_status(get_week_f2_event(today, f2_calendar))
+    if week_status == "pending":
+        return now - last_scrape >= timedelta(hours=RACE_WEEK_PENDING_REFRESH_HOURS)
+    if week_status == "final":
+        return False
+
+    next_week_event = get_week_f2_event(
+        today + timedelta(days=UPCOMING_EVENT_DAYS), f2_calendar
+    )
+    if get_f2_event_status(next_week_event) == "pending":
+        return now - last_scrape >= timedelta(days=1)
+    return now - last_scrape >= timedelta(days=IDLE_SCRAPE_DAYS)
+
+
+def needs_f1_fetch(now: datetime) -> bool:
+    """Returns True if the f1 schedule should be fetched from fastf1 now, decided from the loaded season:
+    daily during a race week or the week before one, so moved sessions are picked up; otherwise only once
+    every IDLE_SCRAPE_DAYS days."""
+    fetched = season.get_fetch_time(now.year)
+    if fetched is None:
+        return True
+
+    sunday = util.get_sunday_date_object(now.date())
+    next_sunday = util.get_sunday_date_object(now.date() + timedelta(days=UPCOMING_EVENT_DAYS))
+    if season.get_week_event(sunday) or season.get_week_event(next_sunday):
+        return now - fetched >= timedelta(days=1)
+    return now - fetched >= timedelta(days=IDLE_SCRAPE_DAYS)
+
+
+def get_next_refresh_time(
+    now: datetime,
+    scheduled_hour: int,
+    scheduled_minute: int,
+    f2_calendar: Union[util.F2CalendarType, None] = None,
+) -> datetime:
+    """Returns when the next status refresh should run. This is the daily scheduled time, or sooner during
+    a race week while some f2 session times are still unknown."""
+    scheduled_time = now.replace(
+        hour=scheduled_hour, minute=scheduled_minute, second=0, microsecond=0
+    )
+    if scheduled_time <= now:
+        scheduled_time += timedelta(days=1)
+
+    if f2_calendar is None:
+        f2_calendar = load_f2_calendar()
+    week_status = get_f2_event_status(get_week_f2_event(now.date(), f2_calendar))
+    if week_status == "pending":
+        return min(
+            scheduled_time, now + timedelta(hours=RACE_WEEK_PENDING_REFRESH_HOURS)
+        )
+    return scheduled_time
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, NamedTuple, Union
+
+import pytz
+
+import clock
+import state
+
+# How many days fired reminders are remembered in the bot state, to not fire them again after a restart
+FIRED_REMINDERS_KEEP_DAYS = 14
+
+
+class Session(NamedTuple):
+    """A single F1 or F2 session with its start time in UTC. 'unknown' is 'TBC' or 'N/A' for a session
+    whose time isnt known yet, its 'start' is then the start of its day in Oslo time."""
+
+    start: datetime
+    series: str
+    name: str
+    event_name: str
+    unknown: str = ""
+
+    @property
+    def key(self) -> str:
+        """Unique key of the session at its current start time. If the start time changes the key changes too,
+        so the moved session gets a new reminder."""
+        return f"{self.series}:{self.event_name}:{self.name}:{self.start.isoformat()}"
+
+
+def get_week_sessions(date_: datetime.date) -> list[Session]:
+    """Returns all the sessions of all the series with known start times in the week of the given date,
+    sorted by start time. Returns an empty list if there is no race that week."""
+    import formula1 as f1
+    import providers
+
+    event = f1.get_week_event(date_)
+    if event is None:
+        return []
+    return providers.get_week_sessions(event)
+
+
+def get_reminder_text(session: Session) -> str:
+    """Returns the reminder message for a session, using discord's relative timestamp formatting."""
+    if session.name in ["Race", "Feature Race"]:
+        title = f"**{session.series} Feature Race**"
+    elif session.name == "Qualifying Session":
+        title = f"{session.series} Qualifying"
+    else:
+        title = f"{session.series} {session.name}"
+    timestamp = int(session.start.timestamp())
+    oslo_time = session.start.astimezone(pytz.timezone("Europe/Oslo")).strftime("%H:%M")
+    return f"{title} starter <t:{timestamp}:R> (kl. {oslo_time})."
+
+
+def get_fired_reminders() -> dict[str, str]:
+    """Returns the keys of already fired reminders mapped to when they fired (ISO format)."""
+    return state.load_state().get("fired_reminders", {})
+
+
+def mark_reminder_fired(key: str, now: datetime) -> None:
+    """Stores the reminder as fired, and forgets reminders fired too long ago."""
+    bot_state = state.load_state()
+    fired = bot_state.setdefault("fired_reminders", {})
+    fired[key] = now.isoformat()
+    oldest = now - timedelta(days=FIRED_REMINDERS_KEEP_DAYS)
+    bot_state["fired_reminders"] = {
+        key: fired_at
+        for key, fired_at in fired.items()
+        if datetime.fromisoformat(fired_at) > oldest
+    }
+    state.save_state(bot_state)
+
+
+class ReminderScheduler:
+    """Fires reminders a given number of minutes before each session. The reminders are kept in a heap
+    ordered by fire time, and the scheduler sleeps until the next one is due instead of polling.
+    Loading a new list of sessions wakes the scheduler so it can reschedule."""
+
+    def __init__(
+        self,
+        send_reminder: Callable[[Session], Awaitable[None]],
+        minutes_before: int = 30,
+        logger: Union[logging.Logger, None] = None,
+    ):
+        self.send_reminder = send_reminder
+        self.minutes_before = minutes_before
+        self.logger = logger
+        self._heap = []
+        self._wakeup = None
+
+    def load(self, sessions: list[Session]) -> None:
+        """Replaces the scheduled reminders with reminders for the given sessions. Sessions already
+        started, without a known time or with an already fired reminder are skipped."""
+        now = clock.now(timezone.utc)
+        fired = get_fired_reminders()
+        before = timedelta(minutes=self.minutes_before)
+        self._heap = [
+            (session.start - before, session.key, session)
+            for session in sessions
+            if session.start > now and not session.unknown and session.key not in fired
+        ]
+        heapq.heapify(self._heap)
+        if self.logger:
+            self.logger.info(f"ReminderScheduler: {len(self._heap)} reminders scheduled")
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self) -> None:
+        """Fires the reminders as they become due, forever."""
+        self._wakeup = asyncio.Event()
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            fire_time, key, session = self._heap[0]
+            now = clock.now(timezone.utc)
+            if fire_time > now:
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), (fire_time - now).total_seconds()
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                continue  # the heap may have been reloaded meanwhile, check again
+
+            heapq.heappop(self._heap)
+            # Mark as fired before sending, so a restart mid-send never sends it twice
+            mark_reminder_fired(key, now)
+            try:
+                await self.send_reminder(session)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(
+                        f"ReminderScheduler: Sending reminder '{key}' failed: {type(e)}: {e}"
+                    )
@@ -0,0 +1,220 @@
+import hashlib
+import json
+from datetime import date, datetime, timezone
+from functools import lru_cache
+from typing import NamedTuple, Union
+
+import pytz
+
+import clock
+import providers
+import reminders
+import season
+import util
+
+# Max number of rendered query replies to keep
+QUERY_CACHE_SIZE = 256
+
+# Session names users can ask for, mapped to the session names used in the schedule
+SESSION_ALIASES = {
+    "race": ["Race", "Feature Race"],
+    "løp": ["Race", "Feature Race"],
+    "feature": ["Race", "Feature Race"],
+    "sprint": ["Sprint", "Sprint Race"],
+    "qualifying": ["Qualifying", "Qualifying Session"],
+    "kvalifisering": ["Qualifying", "Qualifying Session"],
+    "quali": ["Qualifying", "Qualifying Session"],
+    "sprint qualifying": ["Sprint Qualifying", "Sprint Shootout"],
+    "sprint shootout": ["Sprint Qualifying", "Sprint Shootout"],
+}
+
+
+class IndexedEvent(NamedTuple):
+    """A race weekend in the schedule index, with all its F1 and F2 sessions sorted by start time. Sessions whose
+    times arent known yet are included with their 'TBC'/'N/A' marker, like the week embed shows them."""
+
+    name: str
+    sunday: datetime.date
+    sessions: tuple[reminders.Session, ...]
+
+
+# The current index and its data version, replaced by rebuild()
+_events: tuple[IndexedEvent, ...] = ()
+_version: Union[str, None] = None
+
+
+def get_version() -> Union[str, None]:
+    """Returns the data version of the current index, None if it isn't built yet."""
+    return _version
+
+
+def get_events() -> tuple[IndexedEvent, ...]:
+    """Returns the indexed events of the current index, sorted by date."""
+    return _events
+
+
+def build_events(year: int) -> tuple[IndexedEvent, ...]:
+    """Builds the indexed events of the f1 season of the given year, with the sessions of all the series providers."""
+    return tuple(
+        IndexedEvent(
+            event.name,
+            util.get_event_date_object(event),
+            tuple(providers.get_week_sessions(event, include_unknown=True)),
+        )
+        for event in season.get_season(year)
+    )
+
+
+def rebuild(year: Union[int, None] = None) -> None:
+    """Rebuilds the schedule index from the f1 schedule and the stored f2 calendar. Blocking, so it should
+    be run in a thread. The data version only changes if the schedule data changed, so cached replies
+    stay valid otherwise."""
+    global _events, _version
+    if year is None:
+        year = clock.today().year
+    events = build_events(year)
+    content = json.dumps(serialize_events(events))
+    version = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    _events, _version = events, version
+
+
+def serialize_events(events: tuple[IndexedEvent, ...]) -> list:
+    """Returns the indexed events as plain json lists, see load()."""
+    return [(event.name, str(event.sunday), [tuple(map(str, s)) for s in event.sessions]) for event in events]
+
+
+def load(data: list, version: str) -> None:
+    """Replaces the index with events serialized by serialize_events(), e.g. read from the shared cache by a
+    shard process that doesnt fetch the schedule itself (see shared_cache.py)."""
+    global _events, _version
+    _events = tuple(
+        IndexedEvent(
+            name,
+            date.fromisoformat(sunday),
+            tuple(
+                reminders.Session(datetime.fromisoformat(start), series, session_name, event_name, unknown)
+                for start, series, session_name, event_name, unknown in sessions
+            ),
+        )
+        for name, sunday, sessions in data
+    )
+    _version = version
+
+
+def find_week_event(date_: datetime.date) -> Union[IndexedEvent, None]:
+    """Returns the indexed event of the week of the given date, or None."""
+    sunday = util.get_sunday_date_object(date_)
+    for event in _events:
+        if event.sunday == sunday:
+            return event
+
+
+def find_next_event(date_: datetime.date, series: Union[str, None] = None) -> Union[IndexedEvent, None]:
+    """Returns the first indexed event from the week of the given date, optionally only events with sessions
+    of the given series ('F1' or 'F2')."""
+    sunday = util.get_sunday_date_object(date_)
+    for event in _events:
+        if event.sunday < sunday:
+            continue
+        if series is None or any(session.series == series for session in event.sessions):
+            return event
+
+
+def get_event_days(
+    event: IndexedEvent, series: Union[list[str], None] = None
+) -> list[tuple[str, list[tuple[str, reminders.Session]]]]:
+    """Returns the sessions of an event grouped by day in Oslo time, as (english day name, [(time 'HH:MM', session)]),
+    optionally only the sessions of the given series (e.g. ['F1', 'F2']). The time is 'TBC'/'N/A' if it isnt known."""
+    oslo = pytz.timezone("Europe/Oslo")
+    days = []
+    for session in event.sessions:
+        if series is not None and session.series not in series:
+            continue
+        start = session.start.astimezone(oslo)
+        day_name = start.strftime("%A")
+        if not days or days[-1][0] != day_name:
+            days.append((day_name, []))
+        days[-1][1].append((session.unknown or start.strftime("%H:%M"), session))
+    return days
+
+
+def render_event(event: IndexedEvent, series: Union[str, None] = None) -> str:
+    """Returns a discord formatted reply listing the sessions of an event by day, in Oslo time."""
+    output = f"**{event.name.upper()}**\n"
+    days = get_event_days(event, None if series is None else [series])
+    for day_name, sessions in days:
+        output += f"__{util.day_to_norwegian(day_name)}__\n"
+        for time, session in sessions:
+            output += f"{session.series} {session.name}: {time}\n"
+    if not days:
+        output += "Ingen tider enda.\n"
+    return output
+
+
+def render_session(name: str, now: datetime) -> str:
+    """Returns a reply with the next F1 and F2 sessions with the given name from now."""
+    names = SESSION_ALIASES.get(name.lower(), [name])
+    names = [n.lower() for n in names]
+    oslo = pytz.timezone("Europe/Oslo")
+    lines = []
+    for series in ["F1", "F2"]:
+        for event in _events:
+            session = next(
+                (
+                    s
+                    for s in event.sessions
+                    if s.series == series and s.name.lower() in names and s.start > now
+                ),
+                None,
+            )
+            if session:
+                start = session.start.astimezone(oslo)
+                day_name = util.day_to_norwegian(start.strftime("%A"))
+                lines.append(
+                    f"{series} {session.name} ({event.name}): {day_name} {start.day}. "
+                    f"{util.month_to_norwegian(start.strftime('%B'), caps=False)} kl. "
+                    f"{session.unknown or start.strftime('%H:%M')}"
+                )
+                break
+    if not lines:
+        return f"Fant ingen kommende '{name}'."
+    return "\n".join(lines)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def render_query(kind: str, argument: str, version: str, today: datetime.date) -> str:
+    """Returns the rendered reply for a query. Cached by query, data version and date, so each reply is
+    only rendered once as long as the data doesnt change.
+    'kind' is one of 'next', 'week', 'session' or 'f2'."""
+    if kind == "next":
+        event = find_next_event(today)
+        return render_event(event) if event else "Ingen flere løp denne sesongen."
+    if kind == "week":
+        try:
+            date_ = util.get_date_object(argument) if argument else today
+        except ValueError:
+            return f"Ugyldig dato '{argument}', bruk formatet 'yyyy-mm-dd'."
+        event = find_week_event(date_)
+        return render_event(event) if event else f"Ingen løp uken {util.get_sunday_date_str(date_)}."
+    if kind == "f2":
+        event = find_next_event(today, series="F2")
+        return render_event(event, series="F2") if event else "Ingen flere F2 løp denne sesongen."
+    if kind == "session":
+        # Only depends on the date through 'now', sessions that started today are still listed until tomorrow
+        now = datetime(today.year, today.month, today.day, tzinfo=timezone.utc)
+        return render_session(argument, now)
+    raise ValueError(f"schedule_index.render_query(): unknown query kind '{kind}'")
+
+
+def query(kind: str, argument: str = "", today: Union[datetime.date, None] = None) -> Union[str, None]:
+    """Returns the reply for a schedule query, or None if the index isn't built yet."""
+    if _version is None:
+        return None
+    if today is None:
+        today = clock.today()
+    return render_query(kind, argument.strip(), _version, today)
+
+
+def get_cache_info() -> tuple:
+    """Returns the hit/miss info of the rendered reply cache."""
+    return render_query.cache_info()
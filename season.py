@@ -0,0 +1,118 @@
+import calendar
+import threading
+from datetime import date, datetime, timezone
+from typing import Union
+
+import clock
+import metrics
+
+
+class SessionRecord:
+    """A non-practice f1 session: its name, start time in UTC, and week day (in english) at the circuit."""
+
+    __slots__ = ("name", "start", "day")
+
+    def __init__(self, name: str, start: datetime, day: str):
+        self.name = name
+        self.start = start
+        self.day = day
+
+    def __repr__(self) -> str:
+        return f"SessionRecord({self.name!r}, {self.start.isoformat()}, {self.day!r})"
+
+
+class EventRecord:
+    """An f1 race weekend: round number, event name, race date and its non-practice sessions.
+    Holds only plain python values, so no pandas objects are kept alive between refreshes."""
+
+    __slots__ = ("round_number", "name", "date", "sessions")
+
+    def __init__(self, round_number: int, name: str, date_: date, sessions: tuple[SessionRecord, ...]):
+        self.round_number = round_number
+        self.name = name
+        self.date = date_
+        self.sessions = sessions
+
+    def __repr__(self) -> str:
+        return f"EventRecord({self.round_number}, {self.name!r}, {self.date})"
+
+
+# The loaded seasons mapped by year, see get_season()
+_seasons: dict[int, tuple[EventRecord, ...]] = {}
+# When the loaded seasons were fetched from fastf1, mapped by year, see get_fetch_time()
+_fetched: dict[int, datetime] = {}
+_lock = threading.Lock()
+
+
+def build_season(year: int) -> tuple[EventRecord, ...]:
+    """Fetches the f1 schedule of the given year from fastf1 and converts it into event records.
+    Blocking. The fastf1 schedule dataframe is dropped when this returns."""
+    import fastf1
+
+    with metrics.timed("fastf1_schedule", call="get_event_schedule"):
+        schedule = fastf1.get_event_schedule(year, include_testing=False)
+
+    events = []
+    for row in schedule.to_dict("records"):
+        sessions = []
+        for i in range(1, 6):
+            name = row.get(f"Session{i}")
+            start = row.get(f"Session{i}DateUtc")
+            local_start = row.get(f"Session{i}Date")
+            if not name or start is None or str(start) == "NaT" or "Practice" in name:
+                continue
+            if local_start is None or str(local_start) == "NaT":
+                local_start = start
+            sessions.append(
+                SessionRecord(
+                    str(name),
+                    start.to_pydatetime().replace(tzinfo=timezone.utc),
+                    calendar.day_name[local_start.weekday()],
+                )
+            )
+        events.append(
+            EventRecord(
+                int(row["RoundNumber"]),
+                str(row["EventName"]),
+                row["EventDate"].date(),
+                tuple(sessions),
+            )
+        )
+    return tuple(events)
+
+
+def set_season(year: int, events: tuple[EventRecord, ...]) -> None:
+    """Replaces the loaded season of the given year, e.g. with a newly fetched one."""
+    with _lock:
+        _seasons[year] = events
+        _fetched[year] = clock.now()
+
+
+def get_fetch_time(year: int) -> Union[datetime, None]:
+    """Returns when the season of the given year was fetched, or None if it isnt loaded."""
+    with _lock:
+        return _fetched.get(year)
+
+
+def get_season(year: int) -> tuple[EventRecord, ...]:
+    """Returns the event records of the f1 season of the given year, loading it the first time."""
+    with _lock:
+        events = _seasons.get(year)
+    if events is None:
+        events = build_season(year)
+        set_season(year, events)
+    return events
+
+
+def get_week_event(date_: date) -> Union[EventRecord, None]:
+    """Returns the event with the race on the saturday or sunday of the given sunday's week, or None."""
+    for event in get_season(date_.year):
+        if 0 <= (date_ - event.date).days <= 1:
+            return event
+
+
+def get_remaining_events(date_: Union[date, datetime]) -> list[EventRecord]:
+    """Returns the events of the season of the given date with the race on or after the given date."""
+    if isinstance(date_, datetime):
+        date_ = date_.date()
+    return [event for event in get_season(date_.year) if event.date >= date_]
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Union
+
+import discord
+
+import clock
+import state
+import subscriptions
+
+# Week models written by the refresher process and read by the shard processes of a sharded deployment,
+# see 'Sharded deployment' in the README
+SHARED_CACHE_FILENAME = "data/shared/week_model.json"
+
+# Seconds between a shard process checking the shared cache for a new week model
+POLL_SECONDS = 30
+
+# The last read model and the modification time of the file it was read from, see read_model()
+_cached: tuple[Union[int, None], Union[dict, None]] = (None, None)
+
+
+def build_model(
+    date_: datetime.date,
+    race_week: bool,
+    presence: str,
+    embeds: dict[tuple, Union[discord.Embed, None]],
+    index: list,
+    index_version: Union[str, None],
+) -> dict:
+    """Returns the week model of the given date: the week embeds mapped by render key (see bot.get_week_embeds()),
+    the status text and the serialized schedule index. The version only changes if the content changed."""
+    model = {
+        "date": str(date_),
+        "week": state.get_iso_week(date_),
+        "race_week": race_week,
+        "presence": presence,
+        "embeds": [
+            {"language": language, "series": list(series), "title": embed.title, "description": embed.description}
+            for (language, series), embed in embeds.items()
+            if embed
+        ],
+        "index_version": index_version,
+        "index": index,
+    }
+    content = json.dumps(model, sort_keys=True)
+    model["version"] = hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+    model["generated"] = clock.now().isoformat(timespec="seconds")
+    return model
+
+
+def write_model(model: dict, file: str = SHARED_CACHE_FILENAME) -> bool:
+    """Writes the week model for the shard processes. Writes to a temporary file first and then replaces the old
+    one, so a shard never reads a half written model. Returns False without writing if the stored model
+    has the same version."""
+    current = read_model(file)
+    if current is not None and current["version"] == model["version"]:
+        return False
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    temp_file = f"{file}.{os.getpid()}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as outfile:
+        json.dump(model, outfile, ensure_ascii=False)
+    os.replace(temp_file, file)
+    return True
+
+
+def read_model(file: str = SHARED_CACHE_FILENAME) -> Union[dict, None]:
+    """Returns the week model written by the refresher, None if there is none yet. The file is only parsed
+    again when it was replaced."""
+    global _cached
+    try:
+        mtime = os.stat(file).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if _cached[0] == mtime:
+        return _cached[1]
+    with open(file, "r", encoding="utf-8") as infile:
+        try:
+            model = json.load(infile)
+        except json.JSONDecodeError:
+            return None
+    _cached = (mtime, model)
+    return model
+
+
+def get_embeds(model: dict) -> dict[tuple, discord.Embed]:
+    """Returns the week embeds of the model mapped by render key, with the same image as bot.get_week_embeds()."""
+    embeds = {}
+    for rendered in model["embeds"]:
+        key = subscriptions.get_render_key({"language": rendered["language"], "series": rendered["series"]})
+        embed = discord.Embed(title=rendered["title"], description=rendered["description"])
+        embed.set_image(url="attachment://race.png" if model["race_week"] else "attachment://norace.png")
+        embeds[key] = embed
+    return embeds
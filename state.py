@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Union
+
+import discord
+
+from util import file_exists
+
+# Json file storing what the bot has posted, so it doesnt have to search the channel history for it.
+# Each shard process has its own file, see set_state_filename()
+STATE_FILENAME = "data/bot_state.json"
+
+
+def set_state_filename(file: str) -> None:
+    """Sets the state file used when no file is given, e.g. 'data/bot_state_shard1.json' for a shard process."""
+    global STATE_FILENAME
+    STATE_FILENAME = file
+
+
+def load_state(file: Union[str, None] = None) -> dict:
+    """Returns the stored bot state dictionary. Returns an empty dictionary if the file doesnt exist
+    or is empty/corrupt."""
+    file = file or STATE_FILENAME
+    if not file_exists(file):
+        return {}
+    with open(file, "r") as infile:
+        try:
+            return json.load(infile)
+        except json.JSONDecodeError:  # Empty or half written file
+            return {}
+
+
+def save_state(state: dict, file: Union[str, None] = None) -> None:
+    """Saves the bot state dictionary. Writes to a temporary file first and then replaces the old one,
+    so a crash mid-write never leaves a corrupt state file."""
+    file = file or STATE_FILENAME
+    temp_file = file + ".tmp"
+    with open(temp_file, "w") as outfile:
+        json.dump(state, outfile, indent=3)
+    os.replace(temp_file, file)
+
+
+def get_iso_week(date_: datetime.date) -> str:
+    """Returns the ISO week of the given date formatted like '2024-W09'."""
+    year, week, _ = date_.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def get_embed_hash(embed: discord.Embed) -> str:
+    """Returns a hash of the text content of an embed, used to check if an edit would change anything.
+    The image is left out since the same image can be shown through different urls."""
+    content = f"{embed.title}\n{embed.description}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_posted_message(
+    channel_id: Union[int, str], file: Union[str, None] = None
+) -> Union[dict, None]:
+    """Returns the stored info for the last weekly embed posted in the given channel as a dictionary with
+    the keys 'message_id', 'channel_id', 'week', 'content_hash' and 'image_hash' (missing for messages stored
+    before it was added). Returns None if nothing is stored."""
+    return load_state(file).get("posted_messages", {}).get(str(channel_id))
+
+
+def set_posted_message(
+    channel_id: Union[int, str],
+    message_id: Union[int, str],
+    week: str,
+    content_hash: str,
+    file: Union[str, None] = None,
+    image_hash: Union[str, None] = None,
+) -> None:
+    """Stores the info for the weekly embed posted in the given channel. 'image_hash' is the file hash of the
+    image shown in the embed (see images.get_file_hash())."""
+    state = load_state(file)
+    state.setdefault("posted_messages", {})[str(channel_id)] = {
+        "message_id": str(message_id),
+        "channel_id": str(channel_id),
+        "week": week,
+        "content_hash": content_hash,
+        "image_hash": image_hash,
+    }
+    save_state(state, file)
+
+
+def clear_posted_message(channel_id: Union[int, str], file: Union[str, None] = None) -> None:
+    """Removes the stored weekly embed info for the given channel, e.g. if the message was deleted."""
+    state = load_state(file)
+    if state.get("posted_messages", {}).pop(str(channel_id), None) is not None:
+        save_state(state, file)
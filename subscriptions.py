@@ -0,0 +1,86 @@
+import json
+from typing import Union
+
+from util import file_exists, get_json_data
+
+# Json file with all the channels the bot posts the weekly embed in
+SUBSCRIPTIONS_FILENAME = "data/subscriptions.json"
+
+# Series the bot can show in the weekly embed
+SUPPORTED_SERIES = ["f1", "f2"]
+
+# Languages of the weekly embed and its generated image, the first is the default
+SUPPORTED_LANGUAGES = ["norwegian", "english"]
+
+SubscriptionType = dict[str, Union[str, bool, list[str]]]
+
+
+def get_default_subscription() -> SubscriptionType:
+    """Returns the subscription settings for a channel with the values from 'discord_data.json'."""
+    return {
+        "language": SUPPORTED_LANGUAGES[0],
+        "race_week_emoji": get_json_data("race_week_emoji"),
+        "no_race_week_emoji": get_json_data("no_race_week_emoji"),
+        "race_week_image": get_json_data("race_week_image"),
+        "no_race_week_image": get_json_data("no_race_week_image"),
+        "series": list(SUPPORTED_SERIES),
+        "generated_images": True,
+        "enabled": True,
+    }
+
+
+def load_subscriptions(file: str = SUBSCRIPTIONS_FILENAME) -> dict[str, SubscriptionType]:
+    """Returns a dictionary mapping channel ids (as strings) to their subscription settings.
+    Missing settings are filled in from the defaults. If the file doesnt exist, the single
+    'channel_id' from 'discord_data.json' is used as the only subscription."""
+    default = get_default_subscription()
+    if not file_exists(file):
+        return {str(get_json_data("channel_id")): default}
+
+    with open(file, "r") as infile:
+        data = json.load(infile)
+
+    subscriptions = {}
+    for channel_id, settings in data.items():
+        subscription = dict(default)
+        subscription.update(settings)
+        subscription["series"] = [
+            series for series in subscription["series"] if series in SUPPORTED_SERIES
+        ]
+        if subscription["language"].lower() not in SUPPORTED_LANGUAGES:
+            subscription["language"] = SUPPORTED_LANGUAGES[0]
+        subscriptions[str(channel_id)] = subscription
+    return subscriptions
+
+
+def get_enabled_subscriptions(
+    file: str = SUBSCRIPTIONS_FILENAME,
+) -> dict[str, SubscriptionType]:
+    """Returns only the enabled subscriptions, mapped by channel id."""
+    return {
+        channel_id: subscription
+        for channel_id, subscription in load_subscriptions(file).items()
+        if subscription["enabled"]
+    }
+
+
+def save_subscription(
+    channel_id: Union[int, str],
+    settings: SubscriptionType,
+    file: str = SUBSCRIPTIONS_FILENAME,
+) -> None:
+    """Adds or updates the subscription settings for a channel. Only the given settings are stored,
+    the rest fall back to the defaults."""
+    data = {}
+    if file_exists(file):
+        with open(file, "r") as infile:
+            data = json.load(infile)
+    data.setdefault(str(channel_id), {}).update(settings)
+    with open(file, "w") as outfile:
+        json.dump(data, outfile, indent=3)
+
+
+def get_render_key(subscription: SubscriptionType) -> tuple[str, tuple[str, ...]]:
+    """Returns the key of what has to be rendered for a subscription. Channels with the same key
+    share the same embed title and description, so it only has to be computed once."""
+    return subscription["language"].lower(), tuple(sorted(subscription["series"]))
@@ -0,0 +1,89 @@
+"""Tests of merging a scraped F2 calendar event into the stored one, and the per session changes between them.
+
+Run from the repo root:
+    python3 -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import changes  # noqa: E402
+import util  # noqa: E402
+
+
+def make_event(*sessions: list) -> list:
+    """Returns an f2 calendar event like the stored ones, with the given [name, day, time] sessions."""
+    return ["Round 1", "Bahrain", "Sakhir", "29-02 March 2024", [list(session) for session in sessions]]
+
+
+class MergeEventTest(unittest.TestCase):
+    def test_tbc_resolved(self):
+        old = make_event(["Sprint Race", "Friday", "TBC"], ["Feature Race", "Saturday", "11:30-12:30"])
+        new = make_event(["Sprint Race", "Friday", "15:15-16:00"], ["Feature Race", "Saturday", "11:30-12:30"])
+
+        merged = util.merge_f2_event(old, new)
+
+        self.assertEqual(merged, new)
+        self.assertEqual(
+            changes.diff_event("02 March", old, merged),
+            [changes.SessionChange("02 March", "Sprint Race", "resolved", ("Friday", "TBC"), ("Friday", "15:15-16:00"))],
+        )
+
+    def test_known_time_not_replaced_by_tbc(self):
+        old = make_event(["Sprint Race", "Friday", "15:15-16:00"], ["Feature Race", "Saturday", "11:30-12:30"])
+        new = make_event(["Sprint Race", "Friday", "TBC"], ["Feature Race", "Saturday", "11:30-12:30"])
+
+        merged = util.merge_f2_event(old, new)
+
+        self.assertEqual(merged, old)
+        self.assertEqual(changes.diff_event("02 March", old, merged), [])
+
+    def test_moved_session(self):
+        old = make_event(["Sprint Race", "Friday", "15:15-16:00"])
+        new = make_event(["Sprint Race", "Saturday", "10:00-10:45"])
+
+        merged = util.merge_f2_event(old, new)
+
+        self.assertEqual(
+            changes.diff_event("02 March", old, merged),
+            [
+                changes.SessionChange(
+                    "02 March", "Sprint Race", "moved", ("Friday", "15:15-16:00"), ("Saturday", "10:00-10:45")
+                )
+            ],
+        )
+
+    def test_scrape_without_timings_keeps_stored(self):
+        old = make_event(["Sprint Race", "Friday", "15:15-16:00"])
+        new = make_event()
+
+        self.assertEqual(util.merge_f2_event(old, new), old)
+
+    def test_removed_session(self):
+        old = make_event(["Sprint Race", "Friday", "15:15-16:00"], ["Feature Race", "Saturday", "11:30-12:30"])
+        new = make_event(["Feature Race", "Saturday", "11:30-12:30"])
+
+        # The merge keeps the stored sessions a scrape no longer has, after the scraped ones
+        self.assertEqual(
+            util.merge_f2_event(old, new),
+            make_event(["Feature Race", "Saturday", "11:30-12:30"], ["Sprint Race", "Friday", "15:15-16:00"]),
+        )
+        self.assertEqual(
+            changes.diff_event("02 March", old, new),
+            [changes.SessionChange("02 March", "Sprint Race", "removed", ("Friday", "15:15-16:00"), None)],
+        )
+
+    def test_added_event(self):
+        new = make_event(["Feature Race", "Saturday", "11:30-12:30"])
+
+        self.assertEqual(util.merge_f2_event(None, new), new)
+        self.assertEqual(
+            changes.diff_event("02 March", None, new),
+            [changes.SessionChange("02 March", "Feature Race", "added", None, ("Saturday", "11:30-12:30"))],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
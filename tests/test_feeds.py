@@ -0,0 +1,124 @@
+"""Tests of the calendar feeds' conditional requests: per format ETags and 304 Not Modified answers.
+
+Run from the repo root:
+    python3 -m pytest tests
+"""
+import os
+import sys
+import unittest
+from datetime import date, datetime, timezone
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp.test_utils import make_mocked_request  # noqa: E402
+
+import clock  # noqa: E402
+import feeds  # noqa: E402
+import reminders  # noqa: E402
+import schedule_index  # noqa: E402
+
+BUILT = datetime(2024, 2, 27, 10, 0, tzinfo=timezone.utc)
+
+EVENTS = (
+    schedule_index.IndexedEvent(
+        "Bahrain Grand Prix",
+        date(2024, 3, 3),
+        (
+            reminders.Session(datetime(2024, 3, 2, 15, 0, tzinfo=timezone.utc), "F1", "Race", "Bahrain Grand Prix"),
+            reminders.Session(
+                datetime(2024, 3, 1, 23, 0, tzinfo=timezone.utc), "F2", "Sprint Race", "Bahrain Grand Prix", "TBC"
+            ),
+        ),
+    ),
+)
+
+
+class FeedTest(unittest.TestCase):
+    def setUp(self):
+        for name, value in [("_events", EVENTS), ("_version", "v1")]:
+            patcher = mock.patch.object(schedule_index, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(feeds, "_feed", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_feed(self) -> feeds.Feed:
+        with clock.fixed_time(BUILT):
+            return feeds.get_feed()
+
+    def test_etag_per_format(self):
+        feed = self.get_feed()
+        self.assertEqual(feed.ics_etag, feeds.get_etag(feed.ics))
+        self.assertEqual(feed.json_etag, feeds.get_etag(feed.json))
+        self.assertNotEqual(feed.ics_etag, feed.json_etag)
+
+    def test_tbc_sessions_left_out(self):
+        feed = self.get_feed()
+        self.assertIn(b"Race - Bahrain Grand Prix", feed.ics)
+        self.assertNotIn(b"Sprint Race", feed.ics)
+        self.assertNotIn(b"Sprint Race", feed.json)
+
+    def test_not_rendered_again_for_same_version(self):
+        feed = self.get_feed()
+        self.assertIs(self.get_feed(), feed)
+        with mock.patch.object(schedule_index, "_version", "v2"):
+            self.assertIsNot(self.get_feed(), feed)
+
+    def test_if_none_match(self):
+        feed = self.get_feed()
+        self.assertTrue(feeds.is_not_modified({"If-None-Match": feed.ics_etag}, feed, "ics"))
+        self.assertTrue(feeds.is_not_modified({"If-None-Match": f'"other", {feed.ics_etag}'}, feed, "ics"))
+        self.assertTrue(feeds.is_not_modified({"If-None-Match": "*"}, feed, "ics"))
+        self.assertFalse(feeds.is_not_modified({"If-None-Match": feed.json_etag}, feed, "ics"))
+        self.assertFalse(feeds.is_not_modified({"If-None-Match": '"other"'}, feed, "json"))
+
+    def test_if_modified_since(self):
+        feed = self.get_feed()
+        self.assertTrue(feeds.is_not_modified({"If-Modified-Since": "Tue, 27 Feb 2024 10:00:00 GMT"}, feed, "ics"))
+        self.assertFalse(feeds.is_not_modified({"If-Modified-Since": "Tue, 27 Feb 2024 09:59:59 GMT"}, feed, "ics"))
+        self.assertFalse(feeds.is_not_modified({"If-Modified-Since": "not a date"}, feed, "ics"))
+
+    def test_if_none_match_wins_over_if_modified_since(self):
+        feed = self.get_feed()
+        headers = {"If-None-Match": '"other"', "If-Modified-Since": "Tue, 27 Feb 2024 10:00:00 GMT"}
+        self.assertFalse(feeds.is_not_modified(headers, feed, "ics"))
+
+
+class FeedHandlerTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        with mock.patch.object(schedule_index, "_events", EVENTS), mock.patch.object(schedule_index, "_version", "v1"):
+            with mock.patch.object(feeds, "_feed", None), clock.fixed_time(BUILT):
+                self.feed = feeds.get_feed()
+        patcher = mock.patch.object(feeds, "get_feed", return_value=self.feed)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def request(self, kind: str, headers: dict):
+        return await feeds.make_handler(kind)(make_mocked_request("GET", f"/schedule.{kind}", headers=headers))
+
+    async def test_full_response(self):
+        response = await self.request("json", {})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.headers["ETag"], self.feed.json_etag)
+        self.assertEqual(response.headers["Last-Modified"], "Tue, 27 Feb 2024 10:00:00 GMT")
+        self.assertEqual(response.body, self.feed.json)
+
+    async def test_not_modified(self):
+        response = await self.request("ics", {"If-None-Match": self.feed.ics_etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.headers["ETag"], self.feed.ics_etag)
+
+    async def test_other_format_etag_not_matched(self):
+        response = await self.request("ics", {"If-None-Match": self.feed.json_etag})
+        self.assertEqual(response.status, 200)
+
+    async def test_not_loaded(self):
+        with mock.patch.object(feeds, "get_feed", return_value=None):
+            response = await self.request("ics", {})
+        self.assertEqual(response.status, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+"""Tests of the F2 scraper against results pages like fiaformula2.com's, built with the benchmark fixtures.
+
+Run from the repo root:
+    python3 -m pytest tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import fixtures  # noqa: E402
+import formula2 as f2  # noqa: E402
+
+
+class ScrapeCalendarTest(unittest.TestCase):
+    def setUp(self):
+        # The scraper reads the f2 race ids from the data folder, relative to the repo root
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(fixtures.REPO_ROOT)
+
+    def scrape(self, *f2_events: list) -> f2.F2CalendarType:
+        """Runs scrape_calendar() with the pages of the given f2 events served instead of the website."""
+        responses = [fixtures.FakeResponse(200, fixtures.get_f2_page(event).encode()) for event in f2_events]
+        with mock.patch.object(f2.fetch, "get_many", return_value=responses):
+            return f2.scrape_calendar()
+
+    def test_times_converted_to_oslo(self):
+        calendar = self.scrape(
+            ["Round 1", "Bahrain", "Sakhir", "29-02 March 2024", [["Feature Race", "Saturday", "11:30-12:30"]]]
+        )
+        self.assertEqual(list(calendar), ["02 March"])
+        round_number, country, circuit, _, sessions = calendar["02 March"]
+        self.assertEqual((round_number, country, circuit), ("Round 1", "Bahrain", "Sakhir"))
+        self.assertEqual(sessions, [["Feature Race", "Saturday", "09:30-10:30"]])
+
+    def test_tbc_sessions_kept(self):
+        calendar = self.scrape(
+            ["Round 2", "Saudi Arabia", "Jeddah", "07-09 March 2024", [["Sprint Race", "Friday", "TBC"]]]
+        )
+        self.assertEqual(calendar["09 March"][4], [["Sprint Race", "Friday", "TBC"]])
+
+    def test_every_fixture_page_parsed(self):
+        pages = fixtures.load_f2_pages()
+        responses = [fixtures.FakeResponse(200, pages[race_id]) for race_id in sorted(pages)]
+        with mock.patch.object(f2.fetch, "get_many", return_value=responses):
+            calendar = f2.scrape_calendar()
+        self.assertEqual(len(calendar), len(pages))
+        self.assertTrue(any(event[4] for event in calendar.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""Tests of the outbound discord operation queue: coalescing and priority order.
+
+Run from the repo root:
+    python3 -m pytest tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbound  # noqa: E402
+
+
+class OutboundQueueTest(unittest.IsolatedAsyncioTestCase):
+    def make_queue(self, **kwargs) -> outbound.OutboundQueue:
+        """Returns a queue whose dispatcher is stopped when the test ends."""
+        queue = outbound.OutboundQueue(**kwargs)
+
+        async def stop():
+            if queue._dispatcher is not None:
+                queue._dispatcher.cancel()
+
+        self.addAsyncCleanup(stop)
+        return queue
+
+    def record(self, calls: list, name: str):
+        """Returns an operation appending its name to 'calls' and returning it."""
+
+        async def operation():
+            calls.append(name)
+            return name
+
+        return lambda: operation()
+
+    async def test_coalesced_into_last(self):
+        queue = self.make_queue()
+        calls = []
+        first = queue.submit_nowait("presence", self.record(calls, "first"), coalesce_key="presence")
+        second = queue.submit_nowait("presence", self.record(calls, "second"), coalesce_key="presence")
+        self.assertEqual(queue.pending(), 1)
+
+        self.assertEqual(await asyncio.gather(first, second), ["second", "second"])
+        self.assertEqual(calls, ["second"])
+        self.assertEqual((queue.pending(), queue.running()), (0, 0))
+
+    async def test_coalesced_keeps_highest_priority(self):
+        queue = self.make_queue(max_in_flight=1, reserved_interactive=0)
+        calls = []
+        jobs = [
+            queue.submit_nowait("send:1", self.record(calls, "other")),
+            queue.submit_nowait("edit:2", self.record(calls, "old"), outbound.PRIORITY_INTERACTIVE, "edit:2"),
+            queue.submit_nowait("edit:2", self.record(calls, "new"), coalesce_key="edit:2"),
+        ]
+        await asyncio.gather(*jobs)
+
+        self.assertEqual(calls, ["new", "other"])
+
+    async def test_interactive_before_background(self):
+        queue = self.make_queue(max_in_flight=1, reserved_interactive=0)
+        calls = []
+        jobs = [
+            queue.submit_nowait("send:1", self.record(calls, "post 1")),
+            queue.submit_nowait("send:2", self.record(calls, "post 2")),
+            queue.submit_nowait("send:3", self.record(calls, "reply"), outbound.PRIORITY_INTERACTIVE),
+            queue.submit_nowait("send:4", self.record(calls, "post 3")),
+        ]
+        await asyncio.gather(*jobs)
+
+        self.assertEqual(calls, ["reply", "post 1", "post 2", "post 3"])
+
+    async def test_reserved_slot_for_interactive(self):
+        queue = self.make_queue(max_in_flight=2, reserved_interactive=1)
+        calls = []
+        release = asyncio.Event()
+
+        def blocking(name: str):
+            async def operation():
+                await release.wait()
+                calls.append(name)
+
+            return operation
+
+        background = [
+            queue.submit_nowait("send:1", blocking("post 1")),
+            queue.submit_nowait("send:2", blocking("post 2")),
+        ]
+        await asyncio.sleep(0.01)
+
+        # The second post waits for the only background slot, the reply submitted later gets the reserved one
+        await asyncio.wait_for(
+            queue.submit("send:3", self.record(calls, "reply"), outbound.PRIORITY_INTERACTIVE), 1.0
+        )
+        self.assertEqual(calls, ["reply"])
+        release.set()
+        await asyncio.gather(*background)
+        self.assertEqual(calls, ["reply", "post 1", "post 2"])
+
+    async def test_error_passed_to_waiters(self):
+        queue = self.make_queue()
+
+        async def failing():
+            raise ValueError("failed")
+
+        with self.assertRaises(ValueError):
+            await queue.submit("send:1", failing)
+
+
+if __name__ == "__main__":
+    unittest.main()
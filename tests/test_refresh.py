@@ -0,0 +1,106 @@
+"""Tests of when the status is refreshed and the F1 and F2 schedules are fetched, decided from the stored schedules.
+
+Run from the repo root:
+    python3 -m pytest tests
+"""
+import os
+import sys
+import unittest
+from datetime import date, datetime, timedelta
+from typing import Union
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import refresh  # noqa: E402
+import season  # noqa: E402
+
+# Tuesday of the race week of the "02 March" event
+NOW = datetime(2024, 2, 27, 10, 0)
+
+FINAL_EVENT = ["Round 1", "Bahrain", "Sakhir", "29-02 March 2024", [["Feature Race", "Saturday", "11:30-12:30"]]]
+PENDING_EVENT = ["Round 1", "Bahrain", "Sakhir", "29-02 March 2024", [["Feature Race", "Saturday", "TBC"]]]
+
+
+class NextRefreshTimeTest(unittest.TestCase):
+    def test_scheduled_time_today(self):
+        next_time = refresh.get_next_refresh_time(NOW, 12, 30, {"02 March": FINAL_EVENT})
+        self.assertEqual(next_time, datetime(2024, 2, 27, 12, 30))
+
+    def test_scheduled_time_passed(self):
+        next_time = refresh.get_next_refresh_time(NOW, 8, 0, {"02 March": FINAL_EVENT})
+        self.assertEqual(next_time, datetime(2024, 2, 28, 8, 0))
+
+    def test_pending_race_week_refreshes_sooner(self):
+        next_time = refresh.get_next_refresh_time(NOW, 8, 0, {"02 March": PENDING_EVENT})
+        self.assertEqual(next_time, NOW + timedelta(hours=refresh.RACE_WEEK_PENDING_REFRESH_HOURS))
+
+    def test_pending_race_week_keeps_sooner_scheduled_time(self):
+        next_time = refresh.get_next_refresh_time(NOW, 11, 0, {"02 March": PENDING_EVENT})
+        self.assertEqual(next_time, datetime(2024, 2, 27, 11, 0))
+
+    def test_no_race_week(self):
+        next_time = refresh.get_next_refresh_time(NOW, 8, 0, {"09 March": PENDING_EVENT})
+        self.assertEqual(next_time, datetime(2024, 2, 28, 8, 0))
+
+
+class NeedsScrapeTest(unittest.TestCase):
+    def needs_scrape(self, f2_calendar: dict, last_scrape: datetime, now: datetime = NOW) -> bool:
+        """Returns needs_scrape() with the given time of the last scrape instead of the stored one."""
+        with mock.patch.object(refresh, "get_last_scrape", return_value=last_scrape):
+            return refresh.needs_scrape(now, f2_calendar)
+
+    def test_never_scraped(self):
+        self.assertTrue(self.needs_scrape({"02 March": FINAL_EVENT}, None))
+
+    def test_empty_calendar(self):
+        self.assertTrue(self.needs_scrape({}, NOW))
+
+    def test_pending_race_week(self):
+        hours = refresh.RACE_WEEK_PENDING_REFRESH_HOURS
+        calendar = {"02 March": PENDING_EVENT}
+        self.assertFalse(self.needs_scrape(calendar, NOW - timedelta(hours=hours - 1)))
+        self.assertTrue(self.needs_scrape(calendar, NOW - timedelta(hours=hours)))
+
+    def test_final_race_week(self):
+        self.assertFalse(self.needs_scrape({"02 March": FINAL_EVENT}, NOW - timedelta(days=30)))
+
+    def test_pending_event_next_week(self):
+        calendar = {"09 March": PENDING_EVENT}
+        self.assertFalse(self.needs_scrape(calendar, NOW - timedelta(hours=23)))
+        self.assertTrue(self.needs_scrape(calendar, NOW - timedelta(days=1)))
+
+    def test_idle(self):
+        days = refresh.IDLE_SCRAPE_DAYS
+        calendar = {"23 March": PENDING_EVENT, "09 March": FINAL_EVENT}
+        self.assertFalse(self.needs_scrape(calendar, NOW - timedelta(days=days - 1)))
+        self.assertTrue(self.needs_scrape(calendar, NOW - timedelta(days=days)))
+
+
+class NeedsF1FetchTest(unittest.TestCase):
+    def needs_fetch(self, race_date: date, fetched: Union[datetime, None]) -> bool:
+        """Returns needs_f1_fetch() with a loaded season of one event racing on the given date."""
+        events = (season.EventRecord(1, "Bahrain Grand Prix", race_date, ()),)
+        fetch_times = {} if fetched is None else {2024: fetched}
+        with mock.patch.object(season, "_seasons", {2024: events}), mock.patch.object(season, "_fetched", fetch_times):
+            return refresh.needs_f1_fetch(NOW)
+
+    def test_not_loaded(self):
+        self.assertTrue(self.needs_fetch(date(2024, 3, 2), None))
+
+    def test_race_week(self):
+        self.assertFalse(self.needs_fetch(date(2024, 3, 2), NOW - timedelta(hours=23)))
+        self.assertTrue(self.needs_fetch(date(2024, 3, 2), NOW - timedelta(days=1)))
+
+    def test_race_next_week(self):
+        self.assertFalse(self.needs_fetch(date(2024, 3, 9), NOW - timedelta(hours=23)))
+        self.assertTrue(self.needs_fetch(date(2024, 3, 9), NOW - timedelta(days=1)))
+
+    def test_idle(self):
+        days = refresh.IDLE_SCRAPE_DAYS
+        self.assertFalse(self.needs_fetch(date(2024, 3, 24), NOW - timedelta(days=days - 1)))
+        self.assertTrue(self.needs_fetch(date(2024, 3, 24), NOW - timedelta(days=days)))
+
+
+if __name__ == "__main__":
+    unittest.main()
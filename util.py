@@ -3,11 +3,17 @@ import os
 from datetime import date, datetime, timedelta
 from typing import Union
 
-import fastf1
 import pytz
 
+import changes
+import clock
+import metrics
+
 F2CalendarType = dict[str, list[Union[str, list[str]]]]
 
+# The days f2 sessions can be on
+F2_SESSION_DAYS = ["Thursday", "Friday", "Saturday", "Sunday"]
+
 
 def get_json_data(key: str, file: str = "data/discord_data.json") -> str:
     """Extracts string value from given datakey from a given .json filename. Defaults to discord_data.json"""
@@ -176,7 +182,7 @@ def day_to_norwegian(day: str) -> str:
     no_days = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag", "Lørdag", "Søndag"]
     en_days = [
         "monday",
-        "tuesay",
+        "tuesday",
         "wednesday",
         "thursday",
         "friday",
@@ -190,7 +196,7 @@ def day_to_english(day: str) -> str:
     """Translates day name from norwegian to english, no case-sensitive input."""
     en_days = [
         "Monday",
-        "Tuesay",
+        "Tuesday",
         "Wednesday",
         "Thursday",
         "Friday",
@@ -218,7 +224,7 @@ def get_date_object(date_: str) -> datetime.date:
     if "-" in date_:
         year, monthi, day = date_.split("-")
     else:
-        year = date.today().year
+        year = clock.today().year
         day, month = date_.split(" ")
         monthi = month_name_to_index(month)
     return date(int(year), int(monthi), int(day))
@@ -229,16 +235,15 @@ def timezone_to_oslo(time: "pandas.Timestamp") -> str:
     return str(time.astimezone("Europe/Oslo").time().isoformat(timespec="minutes"))
 
 
-def get_event_date_str(event: fastf1.events.Event) -> str:
-    """Gets event date string and cuts away the time info from a fast.f1.events.Events object.
-    Formatted like '07 May'"""
-    return format_date(str(event["EventDate"]).split(" ")[0])
+def get_event_date_str(event: "season.EventRecord") -> str:
+    """Gets the event date string of an event record. Formatted like '07 May'"""
+    return format_date(str(event.date))
 
 
-def get_event_date_object(event: Union[str, fastf1.events.Event]) -> datetime.date:
+def get_event_date_object(event: Union[str, "season.EventRecord"]) -> datetime.date:
     """Get the sunday event date as datetime.date object."""
     if not isinstance(event, str):
-        event = str(event["EventDate"]).split(" ")[0]
+        event = str(event.date)
     date_ = get_sunday_date_object(event)
     return date_
 
@@ -322,9 +327,9 @@ def get_country_code(country_name: str) -> Union[str, None]:
 
 def get_number_remaining_events(date_: datetime.date) -> int:
     """Returns int of how many remaining f1 events there are from a given date."""
-    dt = datetime.combine(date_, datetime.min.time())
-    remaining_schedule = fastf1.get_events_remaining(dt, include_testing=False)
-    return len(remaining_schedule)
+    import season
+
+    return len(season.get_remaining_events(date_))
 
 
 def file_exists(filename: str) -> bool:
@@ -339,7 +344,7 @@ def file_exists(filename: str) -> bool:
 
 def get_default_archive_filename(filename: str, folder: str = "archived_data") -> str:
     """Returns an archive filename for a given json filename, defaults into folder 'archived_data'."""
-    year = date.today().year - 1
+    year = clock.today().year - 1
     temp = filename.replace(".json", "")
     return f"{folder}/archived_{temp}_{year}.json"
 
@@ -363,43 +368,66 @@ def archive_json(filename: str, archive_filename: str = None) -> None:
         json.dump({}, new_file, indent=3)
 
 
-def update_f2cal_json(json_dict: dict, filename: str) -> None:
-    """Updates an existing f2 calendar json file with new keys-value pairs,
-    also updates old keys' values if they dont contain timing info."""
+def has_f2_timing_info(f2_event: Union[list, None]) -> bool:
+    """Returns True if the f2 calendar event has sessions with days (not an empty or malformed value)."""
+    if not f2_event or not f2_event[-1]:
+        return False
+    try:
+        return f2_event[-1][0][1] in F2_SESSION_DAYS
+    except (IndexError, TypeError):
+        return False
+
+
+def merge_f2_event(old_event: Union[list, None], new_event: list) -> list:
+    """Returns the merged value of a stored and a newly scraped f2 calendar event.
+    The stored value is replaced if it has no timing info. If the scraped value has no timing info (the
+    website removes the timings when the event starts) the stored one is kept. Otherwise the sessions are
+    merged one by one, so a moved session or a resolved 'TBC' time is picked up, but a known time is never
+    replaced by an unknown one."""
+    if not has_f2_timing_info(old_event):
+        return new_event
+    if not has_f2_timing_info(new_event):
+        return old_event
+
+    sessions = {session[0]: session for session in old_event[-1]}
+    for session in new_event[-1]:
+        old_session = sessions.get(session[0])
+        known = session[1] in F2_SESSION_DAYS and session[-1] not in changes.UNKNOWN_TIMES
+        if known or old_session is None:
+            sessions[session[0]] = session
+
+    # Scraped session order first, then any stored sessions the scrape no longer has
+    names = [session[0] for session in new_event[-1]]
+    names += [name for name in sessions if name not in names]
+    return new_event[:-1] + [[sessions[name] for name in names]]
+
+
+def update_f2cal_json(json_dict: dict, filename: str) -> list[changes.SessionChange]:
+    """Updates an existing f2 calendar json file with the newly scraped calendar, merging each event
+    with merge_f2_event(). Returns the per session changes of the stored calendar."""
     if not file_exists(filename):
-        return
+        return []
+    with metrics.timed("calendar_merge"):
+        return _update_f2cal_json(json_dict, filename)
+
+
+def _update_f2cal_json(json_dict: dict, filename: str) -> list[changes.SessionChange]:
+    """See update_f2cal_json()."""
     with open(filename, "r") as infile:
         try:
             old_data = json.load(infile)
-            for key, val in json_dict.items():
-                # last element in the old value is empty (list) or the key is new:
-                elem = old_data.get(key)
-                if not elem:
-                    empty_cond = True
-                else:
-                    empty_cond = not bool(elem[-1])
-
-                # if either a new key or existing key with empty timing info:
-                if empty_cond:
-                    old_data[key] = val  # then replace old value with new updated value
-
-                # or if existing key with non-empty timing info
-                elif not empty_cond:
-                    # but is missing the actual timing info (to prevent indexing errors):
-                    if old_data[key][-1][0][1] not in [
-                        "Thursday",
-                        "Friday",
-                        "Saturday",
-                        "Sunday",
-                    ]:
-                        old_data[key] = val
-
         except json.JSONDecodeError:  # Empty file
             old_data = {}
-            old_data.update(json_dict)
+
+    calendar_changes = []
+    for key, val in json_dict.items():
+        merged = merge_f2_event(old_data.get(key), val)
+        calendar_changes += changes.diff_event(key, old_data.get(key), merged)
+        old_data[key] = merged
 
     with open(filename, "w") as outfile:
         json.dump(old_data, outfile, indent=3)
+    return calendar_changes
 
 
 def extract_json_data(json_file: str = "data/f2_calendar.json") -> F2CalendarType:
@@ -415,13 +443,31 @@ def get_hours_between_datetimes(datetime1, datetime2):
 
 def get_hours_until_next_scheduled_hour(scheduled_hour: int) -> float:
     """Returns the hours until the next given scheduled hour."""
-    now = datetime.now()
+    now = clock.now()
     scheduled_datetime = datetime(now.year, now.month, now.day, scheduled_hour, 0, 0)
     if get_hours_between_datetimes(now, scheduled_datetime) > 24:
         scheduled_datetime += timedelta(days=1)
     return get_hours_between_datetimes(now, scheduled_datetime)
 
 
+def get_missing_startup_data() -> list[str]:
+    """Returns a list of the required json files or values that are missing, without asking the user anything.
+    An empty list means the bot can start."""
+    required = {
+        "data/discord_data.json": ["bot_token", "bot_id", "channel_id"],
+        "data/f2_race_ids.json": ["f2_first_raceid", "f2_last_raceid"],
+    }
+    missing = []
+    for file, keys in required.items():
+        if not file_exists(file):
+            missing.append(file)
+            continue
+        with open(file, "r") as infile:
+            data = json.load(infile)
+        missing += [f"{file}: '{key}'" for key in keys if not data.get(key)]
+    return missing
+
+
 async def startup_check() -> None:
     """Checks if the 'discord_data' and 'f2_race_ids' json files exists, asks the user if they want to create them.
     If they exists, then it also checks if all the keys are present."""
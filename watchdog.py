@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Union
+
+import metrics
+
+
+class LoopWatchdog:
+    """Measures the lag of an asyncio event loop and finds what blocks it.
+
+    A task on the loop wakes up every 'interval' seconds and records how late it woke up (the loop lag).
+    A separate thread checks that those wake ups keep coming. If the loop has been stalled for more
+    than 'threshold' seconds, the thread captures the stack of the loop thread, which shows the blocking
+    call while it is still running, and logs it once per stall."""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        threshold: float = 0.5,
+        logger: Union[logging.Logger, None] = None,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.logger = logger
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._task = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Starts watching the running event loop. Must be called from the loop, does nothing if already started."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_event_loop().create_task(self._monitor())
+        self._thread = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops watching."""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _monitor(self) -> None:
+        """Runs on the loop, records the loop lag every interval."""
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self._heartbeat = time.monotonic()
+            metrics.observe("loop_lag_seconds", lag)
+            metrics.set_gauge("loop_lag_current_seconds", lag)
+
+    def _watch(self) -> None:
+        """Runs in its own thread, reports the stack of the loop thread when the loop is stalled."""
+        reported_heartbeat = None
+        while not self._stopped.wait(self.threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.threshold or heartbeat == reported_heartbeat:
+                continue
+
+            # Report each stall once, the heartbeat changes when the loop runs again
+            reported_heartbeat = heartbeat
+            metrics.inc("loop_stalls")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no stack>"
+            if self.logger:
+                self.logger.warning(
+                    f"Event loop blocked for over {stalled:.2f} seconds, blocking call stack:\n{stack}",
+                    extra={"loop_stalled_seconds": round(stalled, 3), "stack": stack},
+                )